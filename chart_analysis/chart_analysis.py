@@ -2,10 +2,14 @@
 谱面分析工具：对 charts/ 目录下的谱面进行统计与可视化分析。
 """
 
+import argparse
+import hashlib
 import json
-import re
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, Iterable, List, Tuple, Optional
 import sys
 
 # 字体放大倍率
@@ -26,10 +30,10 @@ def fs_smaller(base: float, delta: int = 4) -> int:
 TICKS_PER_BEAT = 4
 
 
-def ticks_to_seconds(ticks: float, bpm: float) -> float:
-    """将谱面时间刻度转换为秒"""
+def ticks_to_seconds(ticks, bpm: float):
+    """将谱面时间刻度转换为秒（ticks 可为标量或 NumPy 数组）"""
     if not bpm:
-        return 0.0
+        return ticks * 0.0
     return ticks / TICKS_PER_BEAT * 60.0 / bpm
 
 
@@ -43,7 +47,9 @@ NOTE_TYPE_LABELS = {
 
 # 添加父目录到路径，以便导入 chart_engine
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from chart_engine.chart_engine import chart_check
+from chart_engine.chart_engine import load_checked_chart
+from chart_engine.chart_parser import NOTE_TYPE_NAMES, TYPE_HOLD_START, Chart
+from chart_engine.difficulty import difficulty_curve
 
 try:
     import matplotlib
@@ -66,101 +72,53 @@ OUTPUT_DIR = Path(__file__).parent / "outputs"
 OUTPUT_DIR.mkdir(exist_ok=True)
 
 
-class ChartParser:
-    """谱面解析器"""
-    
-    def __init__(self, chart_path: Path):
-        self.chart_path = chart_path
-        self.bpm = None
-        self.notes: List[Tuple[int, str, int]] = []  # (time, type, track)
-        self.duration = 0
-        
-    def parse(self) -> bool:
-        """解析谱面文件，返回是否成功"""
-        try:
-            with open(self.chart_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            # 解析 BPM
-            if not lines or not lines[0].startswith('bpm='):
-                print(f"错误: {self.chart_path} 缺少 BPM 行")
-                return False
-            
-            bpm_match = re.match(r'bpm=(\d+)', lines[0].strip())
-            if not bpm_match:
-                print(f"错误: {self.chart_path} BPM 格式错误")
-                return False
-            self.bpm = int(bpm_match.group(1))
-            
-            # 解析音符
-            for line in lines[1:]:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # 匹配格式: (time,type,track)
-                match = re.match(r'\((\d+),(\w+),(\d+)\)', line)
-                if match:
-                    time = int(match.group(1))
-                    note_type = match.group(2)
-                    track = int(match.group(3))
-                    self.notes.append((time, note_type, track))
-                    self.duration = max(self.duration, time)
-            
-            return True
-        except Exception as e:
-            print(f"解析 {self.chart_path} 时出错: {e}")
-            return False
-
-
 class ChartAnalyzer:
     """谱面分析器"""
     
-    def __init__(self, chart_name: str, parser: ChartParser):
+    def __init__(self, chart_name: str, chart: Chart):
         self.chart_name = chart_name
-        self.parser = parser
+        self.chart = chart
         self.stats = {}
         
     def analyze(self):
         """执行统计分析"""
-        notes = self.parser.notes
-        bpm = self.parser.bpm
-        duration = self.parser.duration
+        chart = self.chart
+        bpm = chart.bpm
+        duration = chart.duration
+        times, types, tracks = chart_columns(chart)
         
         # 总音符数（只统计 tap 和 hold_start，不重复计算 hold_mid）
-        tap_count = sum(1 for _, nt, _ in notes if nt == 'tap')
-        hold_start_count = sum(1 for _, nt, _ in notes if nt == 'hold_start')
+        tap_count = chart.count('tap')
+        hold_start_count = chart.count('hold_start')
         total_note_count = tap_count + hold_start_count
         
-        # 类型分布
-        type_distribution = {}
-        for _, note_type, _ in notes:
-            type_distribution[note_type] = type_distribution.get(note_type, 0) + 1
+        # 类型分布（按首次出现顺序）
+        type_distribution = {
+            NOTE_TYPE_NAMES[int(code)]: count
+            for code, count in _first_seen_counts(types)
+        }
         
-        # 计算密度曲线（按时间窗口统计）
+        # 计算密度曲线（按时间窗口统计，稠密数组：下标 i 对应窗口起点 i * window_size）
         window_size = max(100, duration // 100)  # 时间窗口大小
-        density_curve = self._calculate_density_curve(notes, duration, window_size)
+        density_curve = self._calculate_density_curve(times, types, duration, window_size)
         
-        # 密度统计
-        if density_curve:
-            density_peak = max(density_curve.values())
-            density_avg = sum(density_curve.values()) / len(density_curve)
+        # 密度统计（只计有音符的窗口）
+        occupied = density_curve[density_curve > 0]
+        if occupied.size:
+            density_peak = int(occupied.max())
+            density_avg = float(occupied.sum()) / occupied.size
         else:
             density_peak = 0
             density_avg = 0
         
         # 轨道分布（使用字符串键以保持一致性）
-        track_distribution = {}
-        for _, _, track in notes:
-            track_key = str(track)
-            track_distribution[track_key] = track_distribution.get(track_key, 0) + 1
+        track_distribution = {str(int(track)): count for track, count in _first_seen_counts(tracks)}
         
         # 时间分布（用于直方图，只统计 tap 和 hold_start）
-        time_distribution = [time for time, note_type, _ in notes 
-                           if note_type in ['tap', 'hold_start']]
+        time_distribution = times[types <= TYPE_HOLD_START]
         
         # 计算难度曲线（基于密度和音符类型复杂度）
-        difficulty_curve = self._calculate_difficulty_curve(notes, duration, window_size)
+        difficulty_curve = self._calculate_difficulty_curve(times, types, tracks, duration, window_size)
         
         self.stats = {
             'title': self.chart_name,
@@ -178,47 +136,33 @@ class ChartAnalyzer:
             'difficulty_curve': difficulty_curve
         }
         
-    def _calculate_density_curve(self, notes: List[Tuple[int, str, int]], 
-                                  duration: int, window_size: int) -> Dict[int, int]:
-        """计算密度曲线：每个时间窗口内的音符数量"""
-        density = {}
-        for time, note_type, _ in notes:
-            # 只统计 tap 和 hold_start
-            if note_type in ['tap', 'hold_start']:
-                window = (time // window_size) * window_size
-                density[window] = density.get(window, 0) + 1
-        return density
-    
-    def _calculate_difficulty_curve(self, notes: List[Tuple[int, str, int]], 
-                                     duration: int, window_size: int) -> Dict[int, float]:
-        """计算难度曲线：综合考虑密度、音符类型复杂度、轨道分布"""
-        difficulty = {}
-        
-        # 音符类型权重：tap=1, hold_start=1.5, hold_mid=0.3
-        type_weights = {'tap': 1.0, 'hold_start': 1.5, 'hold_mid': 0.3, 'hold_end': 0.5}
-        
-        for time, note_type, track in notes:
-            window = (time // window_size) * window_size
-            weight = type_weights.get(note_type, 1.0)
-            
-            if window not in difficulty:
-                difficulty[window] = {'count': 0, 'weighted_sum': 0.0, 'tracks': set()}
-            
-            difficulty[window]['count'] += 1
-            difficulty[window]['weighted_sum'] += weight
-            difficulty[window]['tracks'].add(track)
-        
-        # 计算最终难度分数：加权和 * 轨道复杂度因子
-        difficulty_scores = {}
-        for window, data in difficulty.items():
-            # 轨道复杂度：多轨道同时出现增加难度
-            track_complexity = 1.0 + 0.2 * (len(data['tracks']) - 1)
-            # 密度因子：音符越多，难度增长越快（非线性）
-            density_factor = 1.0 + 0.1 * (data['count'] - 1)
-            # 最终难度 = 加权和 * 轨道复杂度 * 密度因子
-            difficulty_scores[window] = data['weighted_sum'] * track_complexity * density_factor
-        
-        return difficulty_scores
+    def _calculate_density_curve(self, times: np.ndarray, types: np.ndarray,
+                                  duration: int, window_size: int) -> np.ndarray:
+        """计算密度曲线：每个时间窗口内的音符数量（只统计 tap 和 hold_start）"""
+        num_windows = duration // window_size + 1
+        windows = times[types <= TYPE_HOLD_START] // window_size
+        return np.bincount(windows, minlength=num_windows)
+    
+    def _calculate_difficulty_curve(self, times: np.ndarray, types: np.ndarray, tracks: np.ndarray,
+                                     duration: int, window_size: int) -> np.ndarray:
+        """计算难度曲线：模型见 chart_engine/difficulty.py（与按难度合成谱面共用）"""
+        return difficulty_curve(times, types, tracks, duration, window_size)
+
+
+def chart_columns(chart: Chart) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """以 NumPy 数组视图返回谱面的 time / type / track 三列（不复制数据）"""
+    return (
+        np.frombuffer(chart.times, dtype=np.int32),
+        np.frombuffer(chart.types, dtype=np.uint8),
+        np.frombuffer(chart.tracks, dtype=np.uint8),
+    )
+
+
+def _first_seen_counts(column: np.ndarray) -> List[Tuple[int, int]]:
+    """统计列中各取值的数量，按首次出现顺序返回 [(值, 数量)]"""
+    values, first_index, counts = np.unique(column, return_index=True, return_counts=True)
+    order = np.argsort(first_index)
+    return [(int(values[i]), int(counts[i])) for i in order]
 
 
 class ChartVisualizer:
@@ -373,7 +317,7 @@ class ChartVisualizer:
         """生成密度曲线图"""
         density_curve = self.stats['density_curve']
         
-        if not density_curve:
+        if not np.any(density_curve):
             fig, ax = plt.subplots(figsize=(9, 6))  # 3:2 比例，适配前端
             ax.text(0.5, 0.5, '暂无数据', ha='center', va='center', fontsize=fs(16))
             ax.set_title('物量密度曲线', fontsize=fs(14), fontweight='bold')
@@ -383,13 +327,14 @@ class ChartVisualizer:
             plt.close()
             return
         
-        times = sorted(density_curve.keys())
-        densities = [density_curve[t] for t in times]
+        # 只绘制有音符的窗口
         bpm = self.stats.get('bpm', 0) or 0
         window_size = max(100, self.stats.get('duration', 0) // 100)
+        times = np.flatnonzero(density_curve) * window_size
+        densities = density_curve[density_curve > 0]
         window_seconds = ticks_to_seconds(window_size, bpm)
-        times_sec = [ticks_to_seconds(t, bpm) for t in times]
-        densities_per_sec = [d / window_seconds if window_seconds else 0 for d in densities]
+        times_sec = ticks_to_seconds(times, bpm)
+        densities_per_sec = densities / window_seconds if window_seconds else np.zeros(len(densities))
         
         fig, ax = plt.subplots(figsize=(9, 6), facecolor='white')  # 3:2 比例，适配前端
         ax.plot(times_sec, densities_per_sec, linewidth=2.5, color='#2E86AB', marker='o', markersize=3, alpha=0.8)
@@ -472,7 +417,7 @@ class ChartVisualizer:
         time_dist = self.stats['time_distribution']
         bpm = self.stats.get('bpm', 0) or 0
         
-        if not time_dist:
+        if not len(time_dist):
             fig, ax = plt.subplots(figsize=(9, 6))  # 3:2 比例，适配前端
             ax.text(0.5, 0.5, '暂无数据', ha='center', va='center', fontsize=fs(16))
             ax.set_title('物量时间分布', fontsize=fs(16), fontweight='bold', pad=20)
@@ -485,7 +430,7 @@ class ChartVisualizer:
         duration = self.stats['duration']
         # 根据时长动态调整 bins 数量
         num_bins = min(50, max(20, duration // 50))
-        time_dist_sec = [ticks_to_seconds(t, bpm) for t in time_dist]
+        time_dist_sec = ticks_to_seconds(time_dist, bpm)
         
         fig, ax = plt.subplots(figsize=(9, 6), facecolor='white')  # 3:2 比例，适配前端
         
@@ -525,7 +470,7 @@ class ChartVisualizer:
         difficulty_curve = self.stats['difficulty_curve']
         bpm = self.stats.get('bpm', 0) or 0
         
-        if not difficulty_curve:
+        if not np.any(difficulty_curve):
             fig, ax = plt.subplots(figsize=(9, 6))  # 3:2 比例，适配前端
             ax.text(0.5, 0.5, '暂无数据', ha='center', va='center', fontsize=fs(16))
             ax.set_title('难度曲线', fontsize=fs(16), fontweight='bold', pad=20)
@@ -534,13 +479,15 @@ class ChartVisualizer:
             plt.close()
             return
         
-        times = sorted(difficulty_curve.keys())
-        times_sec = [ticks_to_seconds(t, bpm) for t in times]
-        difficulties = [difficulty_curve[t] for t in times]
+        # 只绘制有音符的窗口
+        window_size = max(100, self.stats.get('duration', 0) // 100)
+        times = np.flatnonzero(difficulty_curve) * window_size
+        times_sec = ticks_to_seconds(times, bpm)
+        difficulties = difficulty_curve[difficulty_curve > 0]
         
         # 计算平均难度和峰值
-        avg_difficulty = np.mean(difficulties) if difficulties else 0
-        peak_difficulty = max(difficulties) if difficulties else 0
+        avg_difficulty = np.mean(difficulties)
+        peak_difficulty = difficulties.max()
         
         fig, ax = plt.subplots(figsize=(9, 6), facecolor='white')  # 3:2 比例，适配前端
         
@@ -553,7 +500,7 @@ class ChartVisualizer:
                    label=f'平均值: {avg_difficulty:.2f}', alpha=0.7)
         
         # 标记峰值
-        peak_idx = difficulties.index(peak_difficulty)
+        peak_idx = int(np.argmax(difficulties))
         peak_time = times_sec[peak_idx]
         ax.plot(peak_time, peak_difficulty, 'ro', markersize=10, label=f'峰值: {peak_difficulty:.2f}')
         ax.annotate(
@@ -586,8 +533,72 @@ class ChartVisualizer:
         plt.close()
 
 
-def process_chart(chart_name: str) -> bool:
-    """处理单个谱面：解析、分析、生成图表和 summary"""
+# 每个谱面的图表输出：(文件后缀, ChartVisualizer 方法名)
+CHART_FIGURES = [
+    ('_note_count.png', 'generate_note_count_chart'),
+    ('_note_density.png', 'generate_note_density_chart'),
+    ('_density_curve.png', 'generate_density_curve_chart'),
+    ('_track_distribution.png', 'generate_track_distribution_chart'),
+    ('_time_distribution.png', 'generate_time_distribution_chart'),
+    ('_difficulty_curve.png', 'generate_difficulty_curve_chart'),
+]
+SUMMARY_SUFFIX = '_summary.json'
+MANIFEST_PATH = OUTPUT_DIR / "manifest.json"
+PROTOCOL_PATH = OUTPUT_DIR / "protocol.json"
+
+
+def _file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+# 分析代码版本：本文件及其依赖的谱面解析 / 难度模型源码的哈希（固定顺序拼接各文件摘要），
+# 任一文件改动后所有谱面的输出均视为过期
+ANALYSIS_CODE_FILES = (
+    Path(__file__),
+    Path(__file__).parent.parent / "chart_engine" / "difficulty.py",
+    Path(__file__).parent.parent / "chart_engine" / "chart_parser.py",
+)
+ANALYSIS_CODE_VERSION = hashlib.sha256(
+    "\n".join(_file_sha256(path) for path in ANALYSIS_CODE_FILES).encode("ascii")
+).hexdigest()[:16]
+
+
+def load_manifest() -> Dict[str, dict]:
+    """读取 manifest.json，返回 {谱面名: 条目}；不存在或损坏时返回空字典"""
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return dict(manifest.get('charts', {}))
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def save_manifest(entries: Dict[str, dict]):
+    """保存 manifest.json（谱面名排序，便于比对）"""
+    manifest = {
+        "version": 1,
+        "note": "增量分析清单：记录谱面 TXT 内容哈希与分析代码版本",
+        "charts": {name: entries[name] for name in sorted(entries)},
+    }
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+
+def stale_outputs(chart_name: str, entry: Optional[dict], source_hash: str) -> List[str]:
+    """返回需要重新生成的输出后缀；谱面内容或分析代码变化时全部过期，否则只补缺失文件"""
+    suffixes = [suffix for suffix, _ in CHART_FIGURES] + [SUMMARY_SUFFIX]
+    if (not entry or entry.get('source_hash') != source_hash
+            or entry.get('analysis_code') != ANALYSIS_CODE_VERSION):
+        return suffixes
+    return [suffix for suffix in suffixes if not (OUTPUT_DIR / f"{chart_name}{suffix}").exists()]
+
+
+def process_chart(chart_name: str, manifest: Optional[Dict[str, dict]] = None,
+                  force: bool = False) -> bool:
+    """处理单个谱面：解析、分析，只重新生成过期的图表和 summary
+    
+    manifest 为 {谱面名: 条目}，处理成功后原地更新对应条目；未传入时读写 manifest.json。
+    """
     chart_dir = CHARTS_DIR / chart_name
     chart_file = chart_dir / f"{chart_name}.txt"
     
@@ -595,63 +606,134 @@ def process_chart(chart_name: str) -> bool:
         print(f"警告: 谱面文件不存在: {chart_file}")
         return False
     
-    # 校验谱面
-    if not chart_check(chart_name):
-        print(f"警告: 谱面校验失败: {chart_name}")
-        return False
+    standalone = manifest is None
+    if standalone:
+        manifest = load_manifest()
+    
+    source_hash = _file_sha256(chart_file)
+    entry = None if force else manifest.get(chart_name)
+    stale = stale_outputs(chart_name, entry, source_hash)
+    if not stale:
+        print(f"[SKIP] 输出已是最新: {chart_name}")
+        return True
     
-    # 解析
-    parser = ChartParser(chart_file)
-    if not parser.parse():
-        print(f"错误: 解析失败: {chart_name}")
+    # 解析并校验谱面（只读取一次）
+    chart = load_checked_chart(chart_name, chart_file)
+    if chart is None:
+        print(f"警告: 谱面校验失败: {chart_name}")
+        manifest.pop(chart_name, None)
+        if standalone:
+            save_manifest(manifest)
         return False
     
     # 分析
-    analyzer = ChartAnalyzer(chart_name, parser)
+    analyzer = ChartAnalyzer(chart_name, chart)
     analyzer.analyze()
     
-    # 可视化
+    # 可视化：只生成过期的图表
     visualizer = ChartVisualizer(chart_name, analyzer)
-    
-    # 生成图表
-    note_count_path = OUTPUT_DIR / f"{chart_name}_note_count.png"
-    note_density_path = OUTPUT_DIR / f"{chart_name}_note_density.png"
-    density_curve_path = OUTPUT_DIR / f"{chart_name}_density_curve.png"
-    track_dist_path = OUTPUT_DIR / f"{chart_name}_track_distribution.png"
-    time_dist_path = OUTPUT_DIR / f"{chart_name}_time_distribution.png"
-    difficulty_curve_path = OUTPUT_DIR / f"{chart_name}_difficulty_curve.png"
-    
-    visualizer.generate_note_count_chart(note_count_path)
-    visualizer.generate_note_density_chart(note_density_path)
-    visualizer.generate_density_curve_chart(density_curve_path)
-    visualizer.generate_track_distribution_chart(track_dist_path)
-    visualizer.generate_time_distribution_chart(time_dist_path)
-    visualizer.generate_difficulty_curve_chart(difficulty_curve_path)
+    for suffix, method_name in CHART_FIGURES:
+        if suffix in stale:
+            getattr(visualizer, method_name)(OUTPUT_DIR / f"{chart_name}{suffix}")
     
     # 生成 summary.json（移除大型数据以减小文件大小）
-    summary_data = {k: v for k, v in analyzer.stats.items() 
-                   if k not in ['density_curve', 'difficulty_curve', 'time_distribution']}
-    summary_path = OUTPUT_DIR / f"{chart_name}_summary.json"
-    with open(summary_path, 'w', encoding='utf-8') as f:
-        json.dump(summary_data, f, indent=2, ensure_ascii=False)
+    if SUMMARY_SUFFIX in stale:
+        summary_data = {k: v for k, v in analyzer.stats.items() 
+                       if k not in ['density_curve', 'difficulty_curve', 'time_distribution']}
+        summary_path = OUTPUT_DIR / f"{chart_name}{SUMMARY_SUFFIX}"
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary_data, f, indent=2, ensure_ascii=False)
+    
+    manifest[chart_name] = {
+        "source_hash": source_hash,
+        "analysis_code": ANALYSIS_CODE_VERSION,
+        "outputs": [f"{chart_name}{suffix}" for suffix, _ in CHART_FIGURES] + [f"{chart_name}{SUMMARY_SUFFIX}"],
+    }
+    if standalone:
+        save_manifest(manifest)
     
-    print(f"[OK] 完成分析: {chart_name}")
+    print(f"[OK] 完成分析: {chart_name}（重新生成 {len(stale)} 个输出）")
     return True
 
 
-def generate_protocol():
-    """生成 protocol.json 文件"""
-    protocol = {
-        "version": 1,
-        "note": "谱面分析协议：包含所有曲目的图表与数据文件路径",
-        "charts": []
-    }
+def _build_protocol_entry(chart_name: str) -> dict:
+    """根据输出目录中的文件构造单个谱面的 protocol 条目"""
+    chart_dir = CHARTS_DIR / chart_name
+    
+    # 检查输出文件是否存在
+    files = []
+    for pattern, _ in CHART_FIGURES:
+        file_path = OUTPUT_DIR / f"{chart_name}{pattern}"
+        if file_path.exists():
+            files.append(f"{chart_name}{pattern}")
+    
+    summary_file = f"{chart_name}{SUMMARY_SUFFIX}"
+    summary_path = OUTPUT_DIR / summary_file
+    
+    # 内容哈希：前端以 ?v=<哈希> 请求，server 对匹配的版本返回长期缓存头
+    versions = {name: _file_sha256(OUTPUT_DIR / name)[:12]
+                for name in files + ([summary_file] if summary_path.exists() else [])}
+    
+    if summary_path.exists():
+        # 读取 summary 获取额外信息
+        try:
+            with open(summary_path, 'r', encoding='utf-8') as f:
+                summary_data = json.load(f)
+            chart_entry = {
+                "name": chart_name,
+                "files": files,
+                "summary": summary_file,
+                "versions": versions,
+                "bpm": summary_data.get('bpm'),
+                "duration": summary_data.get('duration'),
+                "folder": chart_name
+            }
+            # 检查是否有音频文件
+            audio_file = chart_dir / f"{chart_name}.mp3"
+            if audio_file.exists():
+                chart_entry["audio"] = f"{chart_name}.mp3"
+        except:
+            chart_entry = {
+                "name": chart_name,
+                "files": files,
+                "summary": summary_file,
+                "versions": versions
+            }
+    else:
+        chart_entry = {
+            "name": chart_name,
+            "files": files,
+            "summary": summary_file,
+            "versions": versions
+        }
+    return chart_entry
+
+
+def generate_protocol(changed: Optional[Iterable[str]] = None):
+    """生成 protocol.json 文件
     
+    changed 为本次重新分析过的谱面；传入时仅重建这些条目，其余沿用已有 protocol.json。
+    """
     # 扫描 charts 目录
     if not CHARTS_DIR.exists():
         print(f"错误: charts 目录不存在: {CHARTS_DIR}")
         return
     
+    previous: Dict[str, dict] = {}
+    if changed is not None:
+        try:
+            with open(PROTOCOL_PATH, 'r', encoding='utf-8') as f:
+                previous = {c['name']: c for c in json.load(f).get('charts', [])}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            changed = None
+    changed_set = set(changed) if changed is not None else None
+    
+    protocol = {
+        "version": 1,
+        "note": "谱面分析协议：包含所有曲目的图表与数据文件路径",
+        "charts": []
+    }
+    rebuilt = 0
     for chart_dir in sorted(CHARTS_DIR.iterdir()):
         if not chart_dir.is_dir() or chart_dir.name == '__pycache__':
             continue
@@ -662,66 +744,88 @@ def generate_protocol():
         if not chart_file.exists():
             continue
         
-        # 检查输出文件是否存在
-        files = []
-        patterns = [
-            '_note_count.png',
-            '_note_density.png',
-            '_density_curve.png',
-            '_track_distribution.png',
-            '_time_distribution.png',
-            '_difficulty_curve.png'
-        ]
-        for pattern in patterns:
-            file_path = OUTPUT_DIR / f"{chart_name}{pattern}"
-            if file_path.exists():
-                files.append(f"{chart_name}{pattern}")
-        
-        summary_file = f"{chart_name}_summary.json"
-        summary_path = OUTPUT_DIR / summary_file
-        
-        if summary_path.exists():
-            # 读取 summary 获取额外信息
-            try:
-                with open(summary_path, 'r', encoding='utf-8') as f:
-                    summary_data = json.load(f)
-                chart_entry = {
-                    "name": chart_name,
-                    "files": files,
-                    "summary": summary_file,
-                    "bpm": summary_data.get('bpm'),
-                    "duration": summary_data.get('duration'),
-                    "folder": chart_name
-                }
-                # 检查是否有音频文件
-                audio_file = chart_dir / f"{chart_name}.mp3"
-                if audio_file.exists():
-                    chart_entry["audio"] = f"{chart_name}.mp3"
-            except:
-                chart_entry = {
-                    "name": chart_name,
-                    "files": files,
-                    "summary": summary_file
-                }
+        if changed_set is not None and chart_name not in changed_set and chart_name in previous:
+            protocol["charts"].append(previous[chart_name])
         else:
-            chart_entry = {
-                "name": chart_name,
-                "files": files,
-                "summary": summary_file
-            }
-        
-        protocol["charts"].append(chart_entry)
+            protocol["charts"].append(_build_protocol_entry(chart_name))
+            rebuilt += 1
+    
+    if changed_set is not None and rebuilt == 0 and len(previous) == len(protocol["charts"]):
+        print(f"[SKIP] 协议文件无变化: {PROTOCOL_PATH}")
+        return
     
     # 保存 protocol.json
-    protocol_path = OUTPUT_DIR / "protocol.json"
-    with open(protocol_path, 'w', encoding='utf-8') as f:
+    with open(PROTOCOL_PATH, 'w', encoding='utf-8') as f:
         json.dump(protocol, f, indent=2, ensure_ascii=False)
     
-    print(f"[OK] 生成协议文件: {protocol_path}")
+    print(f"[OK] 生成协议文件: {PROTOCOL_PATH}")
 
 
-def main():
-    """主函数：扫描 charts 目录，处理所有谱面"""
+def _process_chart_isolated(chart_name: str, entry: Optional[dict],
+                            force: bool) -> Tuple[bool, Optional[str], Optional[dict]]:
+    """在独立的 try 中处理单个谱面，异常转为失败结果，避免影响其他谱面
+    
+    返回 (是否成功, 异常信息, 新的 manifest 条目)，由主进程统一写回 manifest。
+    """
+    manifest = {chart_name: entry} if entry else {}
+    try:
+        ok = process_chart(chart_name, manifest, force=force)
+        return ok, None, manifest.get(chart_name)
+    except Exception:
+        return False, traceback.format_exc(), None
+
+
+def _run_charts(chart_names: List[str], manifest: Dict[str, dict], jobs: int,
+                force: bool = False,
+                on_result: Optional[Callable[[str, Tuple[bool, Optional[str], Optional[dict]]], None]] = None,
+                mp_context=None,
+                ) -> Dict[str, Tuple[bool, Optional[str], Optional[dict]]]:
+    """依次或通过进程池处理谱面，返回 {谱面名: (是否成功, 异常信息, manifest 条目)}
+    
+    on_result 在每个谱面完成时（按完成顺序）被调用，用于实时汇报进度。
+    mp_context 为进程池使用的 multiprocessing 上下文（多线程的调用方应传入 spawn，避免 fork 时复制锁状态）。
+    """
+    results: Dict[str, Tuple[bool, Optional[str], Optional[dict]]] = {}
+    if jobs <= 1 or len(chart_names) <= 1:
+        for chart_name in chart_names:
+            results[chart_name] = _process_chart_isolated(chart_name, manifest.get(chart_name), force)
+            if on_result:
+                on_result(chart_name, results[chart_name])
+            print()
+        return results
+    
+    with ProcessPoolExecutor(max_workers=min(jobs, len(chart_names)), mp_context=mp_context) as executor:
+        futures = {
+            executor.submit(_process_chart_isolated, name, manifest.get(name), force): name
+            for name in chart_names
+        }
+        for future in as_completed(futures):
+            chart_name = futures[future]
+            try:
+                results[chart_name] = future.result()
+            except Exception as exc:  # 子进程异常退出等
+                results[chart_name] = (False, f"{type(exc).__name__}: {exc}", None)
+            if on_result:
+                on_result(chart_name, results[chart_name])
+    return results
+
+
+ProgressCallback = Callable[[str, dict], None]
+
+
+def run_analysis(jobs: int = 1, force: bool = False, only: Optional[Iterable[str]] = None,
+                 progress: Optional[ProgressCallback] = None, mp_context=None) -> Tuple[int, int]:
+    """扫描 charts 目录并分析谱面，返回 (成功数, 参与分析的谱面数)
+    
+    only 指定时只分析其中列出的谱面，其余谱面的 manifest/protocol 条目保持不变。
+    
+    progress(event, data) 用于向调用方（如 server 中常驻的分析 worker）推送进度，事件依次为：
+    start {total, pending} -> chart {name, ok, skipped}（每个谱面一次）-> protocol {} -> done {success, total}
+    """
+    def emit(event: str, **data):
+        if progress:
+            progress(event, data)
+    
     print("开始谱面分析...")
     print(f"谱面目录: {CHARTS_DIR}")
     print(f"输出目录: {OUTPUT_DIR}")
@@ -729,7 +833,7 @@ def main():
     
     if not CHARTS_DIR.exists():
         print(f"错误: charts 目录不存在: {CHARTS_DIR}")
-        return
+        return 0, 0
     
     # 扫描并处理所有谱面
     chart_names = []
@@ -745,24 +849,75 @@ def main():
     
     if not chart_names:
         print("未找到任何谱面文件")
-        return
+        return 0, 0
+    
+    # manifest 按全部现存谱面裁剪，only 只缩小本次处理范围
+    manifest = {name: entry for name, entry in load_manifest().items() if name in chart_names}
+    if only is not None:
+        selected = set(only)
+        chart_names = [name for name in chart_names if name in selected]
+        if not chart_names:
+            print(f"未找到指定谱面: {', '.join(sorted(selected))}")
+            return 0, 0
     
     print(f"找到 {len(chart_names)} 个谱面: {', '.join(chart_names)}")
-    print()
     
-    # 处理每个谱面
-    success_count = 0
+    # 根据 manifest 筛选需要重新分析的谱面（内容哈希或分析代码版本变化、输出缺失）
+    if force:
+        pending = list(chart_names)
+    else:
+        pending = [name for name in chart_names
+                   if stale_outputs(name, manifest.get(name), _file_sha256(CHARTS_DIR / name / f"{name}.txt"))]
+    print(f"需要重新分析: {len(pending)} 个，跳过未变化: {len(chart_names) - len(pending)} 个")
+    if jobs > 1 and len(pending) > 1:
+        print(f"并行进程数: {jobs}")
+    print()
+    emit('start', total=len(chart_names), pending=len(pending))
     for chart_name in chart_names:
-        if process_chart(chart_name):
+        if chart_name not in pending:
+            emit('chart', name=chart_name, ok=True, skipped=True)
+    
+    # 处理每个谱面（结果按谱面名顺序汇总，与完成先后无关）
+    results = _run_charts(
+        pending, manifest, jobs, force=force,
+        on_result=lambda name, result: emit('chart', name=name, ok=result[0], skipped=False),
+        mp_context=mp_context)
+    success_count = len(chart_names) - len(pending)
+    for chart_name in pending:
+        ok, error, entry = results[chart_name]
+        if entry is not None:
+            manifest[chart_name] = entry
+        else:
+            manifest.pop(chart_name, None)
+        if ok:
             success_count += 1
-        print()
+        elif error:
+            print(f"错误: 处理 {chart_name} 时出现异常:\n{error}")
+    save_manifest(manifest)
     
     print(f"处理完成: {success_count}/{len(chart_names)} 个谱面成功")
     
-    # 生成 protocol.json
-    generate_protocol()
+    # 生成 protocol.json（只重建本次处理过的条目；按 charts 目录排序，输出与并行顺序无关）
+    generate_protocol(changed=None if force and only is None else pending)
+    emit('protocol')
     print()
     print("所有分析完成！")
+    emit('done', success=success_count, total=len(chart_names))
+    return success_count, len(chart_names)
+
+
+def main(argv: Optional[List[str]] = None):
+    """主函数：扫描 charts 目录，处理所有谱面"""
+    arg_parser = argparse.ArgumentParser(description="谱面统计与可视化分析")
+    arg_parser.add_argument(
+        "--jobs", "-j", type=int, default=1,
+        help="并行处理谱面的进程数（默认 1；0 表示使用全部 CPU 核心）")
+    arg_parser.add_argument(
+        "--force", action="store_true",
+        help="忽略 manifest.json，重新生成所有谱面的输出")
+    args = arg_parser.parse_args(argv)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    run_analysis(jobs=jobs, force=args.force)
 
 
 if __name__ == "__main__":
@@ -1,19 +1,50 @@
 from __future__ import annotations
 
+import argparse
+import contextlib
+import hashlib
+import io
+import itertools
+import json
 import os
 import random
 import re
+import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+try:
+    from chart_engine.chart_parser import (
+        NOTE_TYPE_NAMES,
+        TYPE_HOLD_MID,
+        TYPE_HOLD_START,
+        TYPE_TAP,
+        Chart,
+        ChartCacheWriter,
+        ChartFormatError,
+        chart_cache_path,
+        load_chart,
+        read_chart_cache,
+    )
+except ImportError:  # 直接以脚本运行 chart_engine/chart_engine.py
+    from chart_parser import (
+        NOTE_TYPE_NAMES,
+        TYPE_HOLD_MID,
+        TYPE_HOLD_START,
+        TYPE_TAP,
+        Chart,
+        ChartCacheWriter,
+        ChartFormatError,
+        chart_cache_path,
+        load_chart,
+        read_chart_cache,
+    )
 
 
 # ==== chart_check (from chart_engine/check.py) ====
-_EVENT_PATTERN = re.compile(r"^\(\s*([^,]+)\s*,\s*([^,]+)\s*,\s*([^)]+)\s*\)$")
-_ALLOWED_TYPES = {"tap", "hold_start", "hold_mid"}
-_ALLOWED_TRACES = {"0", "1"}
-
-
 def _resolve_chart_path(chart_name: str, chart_path: Optional[Path]) -> Path:
     if chart_path is not None:
         return chart_path
@@ -21,111 +52,129 @@ def _resolve_chart_path(chart_name: str, chart_path: Optional[Path]) -> Path:
     return base_dir / "charts" / chart_name / f"{chart_name}.txt"
 
 
-def chart_check(chart_name: str, chart_path: Optional[Path] = None) -> bool:
-    target_path = _resolve_chart_path(chart_name, chart_path)
-    if not target_path.exists():
-        print(f"[chart_check] 文件不存在: {target_path}")
-        return False
-
-    try:
-        lines = target_path.read_text(encoding="utf-8").splitlines()
-    except Exception as exc:  # pragma: no cover
-        print(f"[chart_check] 读取文件失败: {target_path} ({exc})")
-        return False
-
-    if not lines:
-        print("[chart_check] 文件为空")
-        return False
-
-    header = lines[0].strip()
-    if not header.startswith("bpm="):
-        print("[chart_check] 第一行必须为 bpm=<整数>")
-        return False
-
-    bpm_value = header.split("=", 1)[1]
-    if not bpm_value.isdigit():
-        print("[chart_check] BPM 必须为整数")
-        return False
-
+def check_chart(chart: Chart, tag: str = "chart_check") -> bool:
+    """在已解析的 Chart 上做时序与长条规则校验；失败时打印原因（行号 = 事件序号 + 2）。"""
     last_time: Optional[int] = None
-    last_by_trace: Dict[str, Optional[Tuple[int, str]]] = {
-        "0": None, "1": None}
-
-    for idx, raw_line in enumerate(lines[1:], start=2):
-        line = raw_line.strip()
-        if not line:
-            break
-
-        match = _EVENT_PATTERN.match(line)
-        if not match:
-            print(f"[chart_check] 第 {idx} 行格式错误，应为 (time,type,trace): {line}")
-            return False
-
-        time_str, evt_type, trace_str = match.groups()
-        time_str = time_str.strip()
-        evt_type = evt_type.strip()
-        trace_str = trace_str.strip()
-
-        if evt_type not in _ALLOWED_TYPES:
-            print(f"[chart_check] 第 {idx} 行 type 非法: {evt_type}")
-            return False
-
-        if trace_str not in _ALLOWED_TRACES:
-            print(f"[chart_check] 第 {idx} 行 trace 仅允许 0/1: {trace_str}")
-            return False
-
-        if not time_str.lstrip("-").isdigit():
-            print(f"[chart_check] 第 {idx} 行 time 必须为整数: {time_str}")
-            return False
-
-        time_val = int(time_str)
-        if time_val < 0:
-            print(f"[chart_check] 第 {idx} 行 time 不得为负: {time_val}")
-            return False
+    last_by_trace: Dict[int, Optional[Tuple[int, int]]] = {0: None, 1: None}
 
+    for pos, (time_val, evt_type, trace) in enumerate(zip(chart.times, chart.types, chart.tracks)):
+        idx = pos + 2
         if last_time is not None and time_val < last_time:
             print(
-                f"[chart_check] 时间需整体单调不减：第 {idx} 行 {time_val} < 上一行 {last_time}")
+                f"[{tag}] 时间需整体单调不减：第 {idx} 行 {time_val} < 上一行 {last_time}")
             return False
         last_time = time_val
 
-        prev = last_by_trace[trace_str]
+        prev = last_by_trace[trace]
         if prev is not None:
             prev_time, prev_type = prev
             if prev_time >= time_val:
                 print(
-                    f"[chart_check] 同轨时间需严格递增：轨道 {trace_str} 第 {idx} 行 {time_val} <= 上一事件 {prev_time}")
+                    f"[{tag}] 同轨时间需严格递增：轨道 {trace} 第 {idx} 行 {time_val} <= 上一事件 {prev_time}")
                 return False
 
-            if evt_type == "hold_mid":
-                if prev_type not in {"hold_start", "hold_mid"} or prev_time != time_val - 1:
+            if evt_type == TYPE_HOLD_MID:
+                if prev_type not in (TYPE_HOLD_START, TYPE_HOLD_MID) or prev_time != time_val - 1:
                     print(
-                        f"[chart_check] hold_mid 需紧接前一拍同轨 hold_start/hold_mid：第 {idx} 行")
+                        f"[{tag}] hold_mid 需紧接前一拍同轨 hold_start/hold_mid：第 {idx} 行")
                     return False
             else:
-                if prev_type == "hold_start":
+                if prev_type == TYPE_HOLD_START:
                     print(
-                        f"[chart_check] hold_start 后必须跟随连续 hold_mid：轨道 {trace_str} 第 {idx} 行")
+                        f"[{tag}] hold_start 后必须跟随连续 hold_mid：轨道 {trace} 第 {idx} 行")
                     return False
         else:
-            if evt_type == "hold_mid":
-                print(f"[chart_check] hold_mid 前必须有 hold_start：第 {idx} 行")
+            if evt_type == TYPE_HOLD_MID:
+                print(f"[{tag}] hold_mid 前必须有 hold_start：第 {idx} 行")
                 return False
 
-        last_by_trace[trace_str] = (time_val, evt_type)
+        last_by_trace[trace] = (time_val, evt_type)
 
     for trace, prev in last_by_trace.items():
-        if prev is not None and prev[1] == "hold_start":
-            print(f"[chart_check] 轨道 {trace} 的 hold_start 未闭合")
+        if prev is not None and prev[1] == TYPE_HOLD_START:
+            print(f"[{tag}] 轨道 {trace} 的 hold_start 未闭合")
             return False
 
     return True
 
 
+def load_checked_chart(chart_name: str, chart_path: Optional[Path] = None,
+                       tag: str = "chart_check") -> Optional[Chart]:
+    """读取并解析一次谱面，校验通过返回 Chart，否则打印原因并返回 None。"""
+    target_path = _resolve_chart_path(chart_name, chart_path)
+    if not target_path.exists():
+        print(f"[{tag}] 文件不存在: {target_path}")
+        return None
+
+    try:
+        chart = load_chart(target_path)
+    except ChartFormatError as exc:
+        print(f"[{tag}] {exc}")
+        return None
+    except Exception as exc:  # pragma: no cover
+        print(f"[{tag}] 读取文件失败: {target_path} ({exc})")
+        return None
+
+    if not check_chart(chart, tag):
+        return None
+    return chart
+
+
+def chart_check(chart_name: str, chart_path: Optional[Path] = None) -> bool:
+    return load_checked_chart(chart_name, chart_path) is not None
+
+
 TICKS_PER_BEAT = 4
 
 
 # ==== generate_random_chart (from chart_engine/random_gen.py) ====
+# 批量生成器：classic 为本节的逐事件生成，numpy / difficulty 见 random_np.py / difficulty.py
+# 输出格式：txt 为谱面文本；chartbin 只写列式二进制（可直接 read_chart_cache）；both 同时写两者
+RANDOM_CHART_GENERATORS = ("classic", "numpy", "difficulty")
+RANDOM_CHART_OUTPUTS = ("txt", "chartbin", "both")
+_WRITE_BUFFER_SIZE = 1 << 20
+
+
+def iter_random_chart_events(total_ticks: int, target_notes: int, gap_min: int, gap_max: int,
+                             rng=random) -> Iterator[Tuple[int, int, int]]:
+    """逐个产出随机谱面事件 (time, type, track)，不在内存中保留整张谱面。
+
+    trace 1 / 2 为轨道 0 / 1 的单轨音符，3 为双轨；单轨长条首尾有概率附带另一轨的 tap。
+    """
+    n = 0
+    note_count = 0
+    note_limit = target_notes * 1.1
+    while n < total_ticks and note_count < note_limit:
+        x = rng.randint(gap_min, gap_max)
+        type_val = rng.randint(1, 100)
+        trace = rng.randint(1, 3)
+        tick = n + x
+
+        if type_val <= 80:
+            # tap
+            if trace != 2:
+                yield tick, TYPE_TAP, 0
+            if trace != 1:
+                yield tick, TYPE_TAP, 1
+            note_count += 2 if trace == 3 else 1
+            n = tick
+        else:
+            length = rng.randint(3, 8)
+            head = rng.randint(1, 20)
+            tail = rng.randint(1, 10)
+            for m in range(length):
+                note_type = TYPE_HOLD_START if m == 0 else TYPE_HOLD_MID
+                if trace != 2:
+                    yield tick + m, note_type, 0
+                if trace != 1:
+                    yield tick + m, note_type, 1
+                note_count += 2 if trace == 3 else 1
+                if trace != 3 and ((m == 0 and head == 1) or (m == length - 1 and tail == 1)):
+                    yield tick + m, TYPE_TAP, 1 if trace == 1 else 0
+                    note_count += 1
+            n = tick + (length - 1)
+
+
 def generate_random_chart(
     output_dir,
     name="Random",
@@ -135,7 +184,11 @@ def generate_random_chart(
     bpm_range=(150, 250),
     length_range=(120, 180),
     note_range=(1000, 1500),
+    output_format="txt",
 ):
+    if output_format not in RANDOM_CHART_OUTPUTS:
+        print(f"错误：未知的输出格式 {output_format}（可选 {', '.join(RANDOM_CHART_OUTPUTS)}）")
+        return None
     if seed is not None:
         random.seed(seed)
 
@@ -151,215 +204,516 @@ def generate_random_chart(
     gap_max = avg_gap + 2
 
     output_path = Path(output_dir) / f"{name}.txt"
+    cache_path = chart_cache_path(output_path)
     try:
         output_path.parent.mkdir(parents=True, exist_ok=True)
     except Exception as exc:
         print(f"错误：无法创建目录 {output_path.parent}: {exc}")
         return None
 
-    lines = [f"bpm={output_bpm}"]
-    n = 0
+    # 边生成边写：文本走大缓冲写入，二进制走 ChartCacheWriter，内存占用与谱面长度无关
+    events = iter_random_chart_events(total_ticks, target_notes, gap_min, gap_max)
     note_count = 0
-    while n < total_ticks and note_count < target_notes * 1.1:
-        x = random.randint(gap_min, gap_max)
-        type_val = random.randint(1, 100)
-        trace = random.randint(1, 3)
-
-        if type_val <= 80:
-            # tap
-            if trace == 1:
-                lines.append(f"({n+x},tap,0)")
-                note_count += 1
-            elif trace == 2:
-                lines.append(f"({n+x},tap,1)")
-                note_count += 1
-            elif trace == 3:
-                lines.append(f"({n+x},tap,0)")
-                lines.append(f"({n+x},tap,1)")
-                note_count += 2
-            n = n + x
-        else:
-            length = random.randint(3, 8)
-            head = random.randint(1, 20)
-            tail = random.randint(1, 10)
-            for m in range(length):
-                tick = n + x + m
-                if m == 0:
-                    if trace == 1:
-                        lines.append(f"({tick},hold_start,0)")
-                        note_count += 1
-                        if head == 1:
-                            lines.append(f"({tick},tap,1)")
-                            note_count += 1
-                    elif trace == 2:
-                        lines.append(f"({tick},hold_start,1)")
-                        note_count += 1
-                        if head == 1:
-                            lines.append(f"({tick},tap,0)")
-                            note_count += 1
-                    elif trace == 3:
-                        lines.append(f"({tick},hold_start,0)")
-                        lines.append(f"({tick},hold_start,1)")
-                        note_count += 2
-                elif m == length - 1:
-                    if trace == 1:
-                        lines.append(f"({tick},hold_mid,0)")
-                        note_count += 1
-                        if tail == 1:
-                            lines.append(f"({tick},tap,1)")
-                            note_count += 1
-                    elif trace == 2:
-                        lines.append(f"({tick},hold_mid,1)")
-                        note_count += 1
-                        if tail == 1:
-                            lines.append(f"({tick},tap,0)")
-                            note_count += 1
-                    elif trace == 3:
-                        lines.append(f"({tick},hold_mid,0)")
-                        lines.append(f"({tick},hold_mid,1)")
-                        note_count += 2
-                else:
-                    if trace == 1:
-                        lines.append(f"({tick},hold_mid,0)")
-                        note_count += 1
-                    elif trace == 2:
-                        lines.append(f"({tick},hold_mid,1)")
-                        note_count += 1
-                    elif trace == 3:
-                        lines.append(f"({tick},hold_mid,0)")
-                        lines.append(f"({tick},hold_mid,1)")
-                        note_count += 2
-            n = n + x + (length - 1)
-
+    text_file = None
+    cache_writer = None
     try:
-        with open(output_path, "w", encoding="utf-8") as f:
-            for line in lines:
-                f.write(line + "\n")
+        if output_format != "chartbin":
+            text_file = open(output_path, "w", encoding="utf-8", buffering=_WRITE_BUFFER_SIZE)
+            text_file.write(f"bpm={output_bpm}\n")
+        if output_format != "txt":
+            cache_writer = ChartCacheWriter(cache_path, output_bpm)
+        for time_val, note_type, track in events:
+            if text_file is not None:
+                text_file.write(f"({time_val},{NOTE_TYPE_NAMES[note_type]},{track})\n")
+            if cache_writer is not None:
+                cache_writer.append(time_val, note_type, track)
+            note_count += 1
+        if text_file is not None:
+            text_file.close()
+        if cache_writer is not None:
+            # TXT 先关闭，保证缓存文件不比 TXT 旧
+            cache_writer.close()
     except Exception as exc:
+        if text_file is not None:
+            text_file.close()
+        if cache_writer is not None:
+            cache_writer.discard()
         print(f"错误：无法写入文件 {output_path}: {exc}")
         return None
 
     print(f"[generate_random_chart] bpm={output_bpm}, len={output_len}s, target={target_notes}, actual={note_count}")
-    return output_path
+    return cache_path if output_format == "chartbin" else output_path
+
+
+# ==== 批量随机谱面 ====
+BATCH_MANIFEST_NAME = "manifest.json"
+
+
+def derive_chart_seed(base_seed: int, index: int) -> int:
+    """由总种子和序号派生单张谱面的种子（与进程分配无关，可单独复现）。"""
+    digest = hashlib.sha256(f"{base_seed}:{index}".encode("ascii")).digest()
+    return int.from_bytes(digest[:8], "little") >> 1
+
+
+def summarize_chart(chart: Chart) -> Dict[str, object]:
+    """谱面的基础统计：物量、各类型数量、时长与平均密度。"""
+    duration_ticks = chart.duration
+    duration_seconds = duration_ticks * 60 / (chart.bpm * TICKS_PER_BEAT) if chart.bpm else 0.0
+    return {
+        "bpm": chart.bpm,
+        "notes": len(chart),
+        "taps": chart.count("tap"),
+        "hold_starts": chart.count("hold_start"),
+        "hold_mids": chart.count("hold_mid"),
+        "duration_ticks": duration_ticks,
+        "duration_seconds": round(duration_seconds, 3),
+        "notes_per_second": round(len(chart) / duration_seconds, 3) if duration_seconds else 0.0,
+    }
+
+
+def _batch_generator(name: str) -> Callable:
+    """按名称取生成函数；numpy / difficulty 依赖 NumPy，按需导入。"""
+    if name == "numpy":
+        try:
+            from chart_engine.random_np import generate_random_chart_np
+        except ImportError:  # 直接以脚本运行 chart_engine/chart_engine.py
+            from random_np import generate_random_chart_np
+        return generate_random_chart_np
+    if name == "difficulty":
+        try:
+            from chart_engine.difficulty import generate_difficulty_chart
+        except ImportError:  # 直接以脚本运行 chart_engine/chart_engine.py
+            from difficulty import generate_difficulty_chart
+        return generate_difficulty_chart
+    return generate_random_chart
+
+
+def _generate_batch_chart(task: Dict[str, object]) -> Dict[str, object]:
+    """进程池任务：生成、校验并统计一张谱面，谱面写入 <output_dir>/<name>/。"""
+    name = task["name"]
+    entry: Dict[str, object] = {"index": task["index"], "name": name, "seed": task["seed"], "valid": False}
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        generator = _batch_generator(task["generator"])
+        path = generator(
+            Path(task["output_dir"]) / name, name=name, seed=task["seed"],
+            output_format=task["output_format"], **task["generator_kwargs"])
+        chart = None
+        if path is not None and task["output_format"] == "chartbin":
+            chart = read_chart_cache(path, source_path=path)
+            if chart is not None and not check_chart(chart, tag="generate_random_charts"):
+                chart = None
+        elif path is not None:
+            chart = load_checked_chart(name, path, tag="generate_random_charts")
+    if path is not None:
+        entry["path"] = str(path)
+    if chart is None:
+        entry["message"] = (log.getvalue().strip().splitlines() or ["生成失败"])[-1]
+        return entry
+    entry["valid"] = True
+    entry.update(summarize_chart(chart))
+    return entry
+
+
+def _failed_batch_entry(task: Dict[str, object], exc: BaseException) -> Dict[str, object]:
+    """生成过程抛出异常（含子进程异常退出）的谱面，记为与校验失败相同结构的无效条目。"""
+    return {"index": task["index"], "name": task["name"], "seed": task["seed"], "valid": False,
+            "message": f"{type(exc).__name__}: {exc}"}
+
+
+def generate_random_charts(count: int, output_dir, seed: Optional[int] = None, jobs: int = 0,
+                           prefix: str = "Random", output_format: str = "txt", generator: str = "classic",
+                           progress: Optional[Callable[[int, int, Dict[str, object]], None]] = None,
+                           **generator_kwargs) -> Dict[str, object]:
+    """在进程池中批量生成 count 张随机谱面，逐张校验与统计，并写出 manifest.json。
+
+    第 i 张谱面名为 <prefix>_<i>，种子为 derive_chart_seed(seed, i)；seed 为空时取 time.time_ns()。
+    generator 选择生成函数（见 RANDOM_CHART_GENERATORS），generator_kwargs 原样透传：
+    classic 为 generate_random_chart（bpm_range / length_range / note_range 等），
+    numpy 为 random_np.generate_random_chart_np（另支持 notes / density_profile），
+    difficulty 为 difficulty.generate_difficulty_chart（like / ramp / tolerance）。
+    """
+    if output_format not in RANDOM_CHART_OUTPUTS:
+        raise ValueError(f"未知的输出格式: {output_format}")
+    if generator not in RANDOM_CHART_GENERATORS:
+        raise ValueError(f"未知的生成器: {generator}")
+    base_seed = seed if seed is not None else time.time_ns()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    width = len(str(max(count - 1, 0)))
+    tasks = [
+        {
+            "index": idx,
+            "name": f"{prefix}_{idx:0{width}d}",
+            "seed": derive_chart_seed(base_seed, idx),
+            "output_dir": str(output_dir),
+            "output_format": output_format,
+            "generator": generator,
+            "generator_kwargs": generator_kwargs,
+        }
+        for idx in range(count)
+    ]
+
+    entries: List[Dict[str, object]] = []
+    workers = jobs if jobs > 0 else (os.cpu_count() or 1)
+    start = time.perf_counter()
+    if workers == 1 or count <= 1:
+        for task in tasks:
+            try:
+                entries.append(_generate_batch_chart(task))
+            except Exception as exc:
+                entries.append(_failed_batch_entry(task, exc))
+            if progress is not None:
+                progress(len(entries), count, entries[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, count)) as pool:
+            futures = {pool.submit(_generate_batch_chart, task): task for task in tasks}
+            for future in as_completed(futures):
+                try:
+                    entries.append(future.result())
+                except Exception as exc:
+                    entries.append(_failed_batch_entry(futures[future], exc))
+                if progress is not None:
+                    progress(len(entries), count, entries[-1])
+    elapsed = time.perf_counter() - start
+
+    entries.sort(key=lambda entry: entry["index"])
+    valid = [entry for entry in entries if entry["valid"]]
+    manifest = {
+        "base_seed": base_seed,
+        "count": count,
+        "valid": len(valid),
+        "output_format": output_format,
+        "generator": generator,
+        "generator_kwargs": {key: list(val) if isinstance(val, tuple) else val for key, val in generator_kwargs.items()},
+        "elapsed_seconds": round(elapsed, 3),
+        "totals": {
+            "notes": sum(entry["notes"] for entry in valid),
+            "duration_ticks": sum(entry["duration_ticks"] for entry in valid),
+        },
+        "charts": entries,
+    }
+    (output_dir / BATCH_MANIFEST_NAME).write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    return manifest
 
 
 # ==== process_chart (adapted from chart_engine/rom_gen.py) ====
-def process_chart(chart_name: str, output_filename: str = "ROM.v") -> bool:
+# ROM 深度（tick 数）须为 2 的幂，地址位宽 = log2(深度)；默认 4096 / 12bit 与原工程一致。
+# 深度超过单个 bank 时按 ROM_BANK_DEPTH 切分为多个存储体，由地址高位选择。
+ROM_DEFAULT_DEPTH = 4096
+ROM_BANK_DEPTH = 4096
+
+
+def resolve_rom_depth(max_time: int, rom_depth=None) -> Optional[int]:
+    """确定 ROM 深度：None 为默认 4096，"auto" 取覆盖 max_time 的最小 2 的幂（不小于默认值）。"""
+    if rom_depth is None:
+        rom_depth = ROM_DEFAULT_DEPTH
+    elif rom_depth == "auto":
+        rom_depth = max(ROM_DEFAULT_DEPTH, 1 << max_time.bit_length())
+    try:
+        rom_depth = int(rom_depth)
+    except (TypeError, ValueError):
+        print(f"[process_chart] ROM 深度无效: {rom_depth}")
+        return None
+    if rom_depth < 2 or rom_depth & (rom_depth - 1):
+        print(f"[process_chart] ROM 深度必须为 2 的幂: {rom_depth}")
+        return None
+    if max_time >= rom_depth:
+        print(f"[process_chart] 谱面时间超过 ROM 深度: max_time={max_time}, rom_depth={rom_depth}（可用 auto）")
+        return None
+    return rom_depth
+
+
+def build_rom(chart: Chart, rom_len: int = 4096) -> Optional[bytearray]:
+    """将 Chart 编码为 ROM 数据：每个 tick 4bit，高 2bit 为轨道 1（noteup），低 2bit 为轨道 0。"""
+    rom = bytearray(rom_len)
+    for time_val, val, trace in zip(chart.times, chart.types, chart.tracks):
+        if time_val >= rom_len:
+            print(
+                f"[process_chart] time 索引越界: time={time_val}, rom_len={rom_len}")
+            return None
+        if trace == 1:
+            rom[time_val] = (rom[time_val] & 0b0011) | (val << 2)
+        else:
+            rom[time_val] = (rom[time_val] & 0b1100) | val
+    return rom
+
+
+# ROM 输出格式：inline 为逐地址 ROM[idx] = 4'b....; 的 initial 块；
+# readmemh 为紧凑的 .mem 数据文件（每行一个十六进制字）+ 固定的 ROM.v 包装，用 $readmemh 加载；
+# rle 为游程压缩记录 + verilog/ROM_RLE_Decoder.v 顺序解码（ROM 额外需要 clk/rst_n）
+ROM_FORMATS = ("inline", "readmemh", "rle")
+_HEX_DIGITS = bytes.maketrans(bytes(range(16)), b"0123456789abcdef")
+
+
+def split_rom_banks(rom: bytearray, bank_depth: int = ROM_BANK_DEPTH) -> List[bytearray]:
+    """按 bank_depth 切分 ROM；深度不超过一个 bank 时只有一个存储体。"""
+    if len(rom) <= bank_depth:
+        return [rom]
+    return [rom[start:start + bank_depth] for start in range(0, len(rom), bank_depth)]
+
+
+def _rom_bank_name(bank_idx: int, bank_count: int) -> str:
+    return "ROM" if bank_count == 1 else f"ROM_BANK{bank_idx}"
+
+
+def _rom_module_header(rom_len: int, bank_count: int = 1, declarations=()):
+    addr_width = rom_len.bit_length() - 1
+    bank_len = rom_len // bank_count
+    lines = [
+        "module ROM (",
+        f"    input [{addr_width - 1}:0] addr,",
+        "    output reg [1:0] noteup,",
+        "    output reg [1:0] notedown",
+        ");",
+        "",
+        *declarations,
+    ]
+    for bank_idx in range(bank_count):
+        lines.append(f"reg [3:0] {_rom_bank_name(bank_idx, bank_count)} [0:{bank_len - 1}];")
+    if bank_count > 1:
+        bank_width = bank_count.bit_length() - 1
+        offset_width = bank_len.bit_length() - 1
+        lines.extend([
+            f"wire [{bank_width - 1}:0] bank = addr[{addr_width - 1}:{offset_width}];",
+            f"wire [{offset_width - 1}:0] offset = addr[{offset_width - 1}:0];",
+        ])
+    lines.append("")
+    return lines
+
+
+def _rom_module_footer(bank_count: int = 1):
+    if bank_count == 1:
+        body = ["    {noteup, notedown} = ROM[addr];"]
+    else:
+        bank_width = bank_count.bit_length() - 1
+        body = ["    case (bank)"]
+        for bank_idx in range(bank_count):
+            body.append(f"        {bank_width}'d{bank_idx}: {{noteup, notedown}} = ROM_BANK{bank_idx}[offset];")
+        body.extend([
+            "        default: {noteup, notedown} = 4'b0000;",
+            "    endcase",
+        ])
+    return ["", "always @(*) begin", *body, "end", "", "endmodule", ""]
+
+
+def encode_rom_hex(rom: bytearray) -> bytes:
+    """将 ROM 编码为 $readmemh 数据：每个字一位十六进制 + 换行，整体按字节切片拼接，不逐行构造字符串。"""
+    out = bytearray(b"\n" * (2 * len(rom)))
+    out[0::2] = rom.translate(_HEX_DIGITS)
+    return bytes(out)
+
+
+def write_rom_inline(rom: bytearray, verilog_path: Path, bank_depth: int = ROM_BANK_DEPTH):
+    banks = split_rom_banks(rom, bank_depth)
+    lines_out = _rom_module_header(len(rom), len(banks)) + ["initial begin"]
+    for bank_idx, bank in enumerate(banks):
+        bank_name = _rom_bank_name(bank_idx, len(banks))
+        for idx, val in enumerate(bank):
+            lines_out.append(f"\t{bank_name}[{idx}] = 4'b{val:04b};")
+    lines_out.append("end")
+    lines_out.extend(_rom_module_footer(len(banks)))
+    verilog_path.write_text("\n".join(lines_out), encoding="utf-8")
+
+
+def write_rom_readmemh(rom: bytearray, verilog_path: Path, bank_depth: int = ROM_BANK_DEPTH) -> List[Path]:
+    """写出 <输出名>.mem（多 bank 时为 <输出名>_bank<i>.mem）与加载它们的 ROM.v 包装，返回 .mem 路径列表。
+
+    MEM_FILE 默认相对 quartus/ 工程目录；仿真时可用 defparam 或 -P 覆盖。
+    """
+    banks = split_rom_banks(rom, bank_depth)
+    if len(banks) == 1:
+        mem_paths = [verilog_path.with_suffix(".mem")]
+        params = ["MEM_FILE"]
+    else:
+        mem_paths = [verilog_path.with_name(f"{verilog_path.stem}_bank{idx}.mem") for idx in range(len(banks))]
+        params = [f"MEM_FILE_{idx}" for idx in range(len(banks))]
+
+    declarations = []
+    loads = []
+    for bank_idx, (bank, mem_path, param) in enumerate(zip(banks, mem_paths, params)):
+        mem_path.write_bytes(encode_rom_hex(bank))
+        declarations.append(f'parameter {param} = "../verilog/{mem_path.name}";')
+        loads.append(f"    $readmemh({param}, {_rom_bank_name(bank_idx, len(banks))});")
+    lines_out = _rom_module_header(len(rom), len(banks), declarations)
+    lines_out.extend(["initial begin", *loads, "end"])
+    lines_out.extend(_rom_module_footer(len(banks)))
+    verilog_path.write_text("\n".join(lines_out), encoding="utf-8")
+    return mem_paths
+
+
+# ==== 游程压缩 ROM（rle）====
+# 每条记录 {pattern[3:0], run_len - 1}：连续 run_len 个 tick 输出同一 4bit 字，
+# 空白段与长条段各压成一条记录，由 ROM_RLE_Decoder 随地址递增顺序解码。
+def _rom_runs(rom: bytearray) -> List[Tuple[int, int]]:
+    return [(val, sum(1 for _ in group)) for val, group in itertools.groupby(rom)]
+
+
+def _rle_record_count(runs: List[Tuple[int, int]], len_width: int) -> int:
+    # 超过 2^len_width 的游程需拆成多条记录
+    return sum(((run - 1) >> len_width) + 1 for _, run in runs)
+
+
+def encode_rom_rle(rom: bytearray, len_width: Optional[int] = None) -> Tuple[List[Tuple[int, int]], int]:
+    """将 ROM 编码为游程记录 [(pattern, run_len)]；len_width 为空时取总位数最小的长度位宽。"""
+    runs = _rom_runs(rom)
+    if len_width is None:
+        max_width = max(1, (len(rom) - 1).bit_length())
+        len_width = min(range(1, max_width + 1), key=lambda w: _rle_record_count(runs, w) * (w + 4))
+    limit = 1 << len_width
+    records = []
+    for val, run in runs:
+        while run > limit:
+            records.append((val, limit))
+            run -= limit
+        records.append((val, run))
+    return records, len_width
+
+
+def rom_compression_report(rom: bytearray, records: List[Tuple[int, int]], len_width: int) -> Dict[str, float]:
+    """原始 ROM 与游程记录的存储位数对比。"""
+    raw_bits = 4 * len(rom)
+    rle_bits = (len_width + 4) * len(records)
+    return {
+        "words": len(rom),
+        "raw_bits": raw_bits,
+        "records": len(records),
+        "record_bits": len_width + 4,
+        "rle_bits": rle_bits,
+        "ratio": raw_bits / rle_bits if rle_bits else 0.0,
+    }
+
+
+def write_rom_rle(rom: bytearray, verilog_path: Path, records: List[Tuple[int, int]], len_width: int):
+    addr_width = len(rom).bit_length() - 1
+    record_width = len_width + 4
+    index_width = max(1, (len(records) - 1).bit_length())
+    lines_out = [
+        "module ROM (",
+        "    input clk,",
+        "    input rst_n,",
+        f"    input [{addr_width - 1}:0] addr,",
+        "    output [1:0] noteup,",
+        "    output [1:0] notedown",
+        ");",
+        "",
+        f"reg [{record_width - 1}:0] RLE [0:{len(records) - 1}];",
+        f"wire [{index_width - 1}:0] index;",
+        "",
+        "initial begin",
+    ]
+    for idx, (val, run) in enumerate(records):
+        lines_out.append(f"\tRLE[{idx}] = {record_width}'b{(val << len_width) | (run - 1):0{record_width}b};")
+    lines_out.extend([
+        "end",
+        "",
+        "ROM_RLE_Decoder #(",
+        f"    .ADDR_WIDTH({addr_width}),",
+        f"    .LEN_WIDTH({len_width}),",
+        f"    .INDEX_WIDTH({index_width}),",
+        f"    .LAST_INDEX({len(records) - 1})",
+        ") decoder (",
+        "    .clk (clk),",
+        "    .rst_n (rst_n),",
+        "    .addr (addr),",
+        "    .cur_record (RLE[index]),",
+        "    .next_record (RLE[index + 1'b1]),",
+        "",
+        "    .index (index),",
+        "    .noteup (noteup),",
+        "    .notedown (notedown)",
+        ");",
+        "",
+        "endmodule",
+        "",
+    ])
+    verilog_path.write_text("\n".join(lines_out), encoding="utf-8")
+
+
+def _set_verilog_parameter(content: str, name: str, value: int) -> str:
+    """替换 Verilog 源码中 parameter <name> = <整数> 的默认值。"""
+    return re.sub(rf"(parameter\s+{name}\s*=\s*)\d+", f"\\g<1>{value}", content)
+
+
+def process_chart(chart_name: str, output_filename: str = "ROM.v", rom_format: str = "inline",
+                  rom_depth=None, bank_depth: int = ROM_BANK_DEPTH, chart: Optional[Chart] = None) -> bool:
+    """chart 为已解析并校验过的谱面（如 server 的内存缓存），为空时按 chart_name 读取并校验。"""
     base_dir = Path(__file__).resolve().parent.parent
-    chart_path = _resolve_chart_path(chart_name, None)
-    if not chart_path.exists():
-        print(f"[process_chart] 文件不存在: {chart_path}")
+    if rom_format not in ROM_FORMATS:
+        print(f"[process_chart] 未知的 ROM 输出格式: {rom_format}（可选 {', '.join(ROM_FORMATS)}）")
         return False
-
-    if not chart_check(chart_name, chart_path):
+    if bank_depth < 2 or bank_depth & (bank_depth - 1):
+        print(f"[process_chart] bank 深度必须为 2 的幂: {bank_depth}")
         return False
-
-    pattern = re.compile(r"^\(\s*([^,]+)\s*,\s*([^,]+)\s*,\s*([^)]+)\s*\)$")
-    try:
-        lines = chart_path.read_text(encoding="utf-8").splitlines()
-    except Exception as exc:
-        print(f"[process_chart] 读取文件失败: {exc}")
+    if chart is None:
+        chart = load_checked_chart(chart_name, tag="process_chart")
+    if chart is None:
         return False
 
-    # 3.1. 解析第一行获取 BPM 并更新 MuseDash.v 的 div_cnt
-    if not lines:
-        print(f"[process_chart] 文件为空")
-        return False
-    bpm_line = lines[0].strip()
-    if not bpm_line.startswith("bpm="):
-        print(f"[process_chart] 第一行格式错误，应为 bpm=xxx: {bpm_line}")
+    # 3.1. 根据 BPM 更新 MuseDash.v 的 div_cnt
+    bpm = float(chart.bpm)
+    if bpm <= 0:
+        print(f"[process_chart] BPM 值无效: {bpm}")
         return False
-    try:
-        bpm = float(bpm_line[4:])  # 跳过 "bpm="
-        if bpm <= 0:
-            print(f"[process_chart] BPM 值无效: {bpm}")
-            return False
-        div_cnt = int(375000000 / bpm)
-    except (ValueError, ZeroDivisionError) as exc:
-        print(f"[process_chart] 解析 BPM 失败: {exc}")
+    div_cnt = int(375000000 / bpm)
+
+    # ROM 深度需覆盖到 max_time，地址位宽随深度写入 MuseDash.v / Address_Generator.v
+    rom_len = resolve_rom_depth(chart.duration, rom_depth)
+    if rom_len is None:
         return False
+    addr_width = rom_len.bit_length() - 1
 
-    # 更新 MuseDash.v 的 div_cnt
+    # 更新 MuseDash.v 的 div_cnt；addr_width / rom_rle 与 Address_Generator.v 的 ADDR_WIDTH
+    # 描述的是 MuseDash.v 例化的 ROM.v，只有输出覆盖 ROM.v 时才同步，避免与现有 ROM.v 不一致
+    verilog_path = base_dir / "verilog" / output_filename
     musedash_path = base_dir / "verilog" / "MuseDash.v"
+    address_gen_path = base_dir / "verilog" / "Address_Generator.v"
+    replaces_rom = verilog_path.resolve() == (base_dir / "verilog" / "ROM.v").resolve()
     try:
         musedash_content = musedash_path.read_text(encoding="utf-8")
-        # 使用正则表达式替换 div_cnt 的值
-        div_cnt_pattern = r"(parameter\s+div_cnt\s*=\s*)\d+"
-        replacement = f"\\g<1>{div_cnt}"
-        musedash_content = re.sub(
-            div_cnt_pattern, replacement, musedash_content)
+        musedash_content = _set_verilog_parameter(musedash_content, "div_cnt", div_cnt)
+        if replaces_rom:
+            musedash_content = _set_verilog_parameter(musedash_content, "addr_width", addr_width)
+            musedash_content = _set_verilog_parameter(musedash_content, "rom_rle", int(rom_format == "rle"))
         musedash_path.write_text(musedash_content, encoding="utf-8")
-        print(
-            f"[process_chart] 已更新 MuseDash.v 的 div_cnt = {div_cnt} (BPM = {bpm})")
+        if replaces_rom:
+            address_gen_content = address_gen_path.read_text(encoding="utf-8")
+            address_gen_path.write_text(
+                _set_verilog_parameter(address_gen_content, "ADDR_WIDTH", addr_width), encoding="utf-8")
+            print(
+                f"[process_chart] 已更新 MuseDash.v 的 div_cnt = {div_cnt} (BPM = {bpm}), addr_width = {addr_width}")
+        else:
+            print(
+                f"[process_chart] 已更新 MuseDash.v 的 div_cnt = {div_cnt} (BPM = {bpm})；"
+                f"{output_filename} 不是 MuseDash.v 例化的 ROM.v，未修改 addr_width / rom_rle")
     except Exception as exc:
         print(f"[process_chart] 更新 MuseDash.v 失败: {exc}")
         return False
 
-    events = []
-    max_time = 0
-    for raw_line in lines[1:]:
-        line = raw_line.strip()
-        if not line:
-            break
-        match = pattern.match(line)
-        if not match:
-            print(f"[process_chart] 行格式错误: {line}")
-            return False
-        time_str, evt_type, trace_str = match.groups()
-        time_val = int(time_str.strip())
-        evt_type = evt_type.strip()
-        trace_str = trace_str.strip()
-        max_time = max(max_time, time_val)
-        events.append((time_val, evt_type, trace_str))
-
-    # 计算 ROM 长度：覆盖到 max_time，最小 1，最大 4096
-    max_len = max(1 << max(max_time.bit_length(), 0), 1)
-    if max_len > 4096:
-        print(f"[process_chart] 谱面时间超过可支持范围: max_time={max_time}")
+    rom = build_rom(chart, rom_len)
+    if rom is None:
         return False
-    rom_len = 4096
 
-    rom = [0] * rom_len
-    type_to_val = {"tap": 0b01, "hold_start": 0b10, "hold_mid": 0b11}
-    for time_val, evt_type, trace_str in events:
-        val = type_to_val[evt_type]
-        if time_val >= rom_len:
+    bank_count = max(1, rom_len // bank_depth)
+    try:
+        if rom_format == "readmemh":
+            mem_paths = write_rom_readmemh(rom, verilog_path, bank_depth)
+            mem_names = ", ".join(path.name for path in mem_paths)
+            print(f"[process_chart] 已写出 {verilog_path.name} + {mem_names}（$readmemh）")
+        elif rom_format == "rle":
+            records, len_width = encode_rom_rle(rom)
+            write_rom_rle(rom, verilog_path, records, len_width)
+            report = rom_compression_report(rom, records, len_width)
             print(
-                f"[process_chart] time 索引越界: time={time_val}, rom_len={rom_len}")
-            return False
-        if trace_str == "1":
-            rom[time_val] = (rom[time_val] & 0b0011) | (val << 2)
+                f"[process_chart] RLE 压缩: {report['words']} 字 x 4bit = {report['raw_bits']} bit -> "
+                f"{report['records']} 条记录 x {report['record_bits']}bit = {report['rle_bits']} bit"
+                f"（压缩比 {report['ratio']:.2f}x）")
+            bank_count = 1
         else:
-            rom[time_val] = (rom[time_val] & 0b1100) | val
-
-    verilog_path = base_dir / "verilog" / output_filename
-    try:
-        lines_out = [
-            "module ROM (",
-            "    input [11:0] addr,",
-            "    output reg [1:0] noteup,",
-            "    output reg [1:0] notedown",
-            ");",
-            "",
-            f"reg [3:0] ROM [0:{rom_len - 1}];",
-            "",
-            "initial begin",
-        ]
-        for idx, val in enumerate(rom):
-            lines_out.append(f"\tROM[{idx}] = 4'b{val:04b};")
-        lines_out.extend(
-            [
-                "end",
-                "",
-                "always @(*) begin",
-                "    {noteup, notedown} = ROM[addr];",
-                "end",
-                "",
-                "endmodule",
-                "",
-            ]
-        )
-        verilog_path.write_text("\n".join(lines_out), encoding="utf-8")
+            write_rom_inline(rom, verilog_path, bank_depth)
+        if bank_count > 1:
+            print(f"[process_chart] ROM 深度 {rom_len} 切分为 {bank_count} 个 bank（每个 {bank_depth}）")
     except Exception as exc:
         print(f"[process_chart] 写入 ROM 失败: {exc}")
         return False
@@ -367,7 +721,78 @@ def process_chart(chart_name: str, output_filename: str = "ROM.v") -> bool:
     return True
 
 
-def main():
+def run_batch(args) -> int:
+    """命令行批量模式：生成 args.batch 张谱面并打印每张的校验与统计。"""
+    generator_kwargs = {}
+    if args.bpm_range:
+        generator_kwargs["bpm_range"] = tuple(args.bpm_range)
+    if args.length_range:
+        generator_kwargs["length_range"] = tuple(args.length_range)
+    if args.note_range:
+        if args.generator == "difficulty":
+            print("[generate_random_charts] --note-range 不适用于 --generator difficulty（物量由难度目标决定）")
+            return 2
+        generator_kwargs["note_range"] = tuple(args.note_range)
+    if args.notes is not None or args.density:
+        if args.generator != "numpy":
+            print("[generate_random_charts] --notes / --density 需配合 --generator numpy 使用")
+            return 2
+        if args.notes is not None:
+            generator_kwargs["notes"] = args.notes
+        if args.density:
+            generator_kwargs["density_profile"] = args.density
+    if args.like or args.ramp or args.tolerance is not None:
+        if args.generator != "difficulty":
+            print("[generate_random_charts] --like / --ramp / --tolerance 需配合 --generator difficulty 使用")
+            return 2
+        if args.like:
+            generator_kwargs["like"] = args.like
+        if args.ramp:
+            generator_kwargs["ramp"] = tuple(args.ramp)
+        if args.tolerance is not None:
+            generator_kwargs["tolerance"] = args.tolerance
+
+    def report(done: int, total: int, entry: Dict[str, object]):
+        if entry["valid"]:
+            detail = f"bpm={entry['bpm']} notes={entry['notes']} {entry['duration_seconds']}s"
+        else:
+            detail = f"失败: {entry.get('message', '')}"
+        print(f"[generate_random_charts] {done}/{total} {entry['name']} seed={entry['seed']} {detail}")
+
+    manifest = generate_random_charts(
+        args.batch, args.out, seed=args.seed, jobs=args.jobs, prefix=args.prefix,
+        output_format=args.format, generator=args.generator, progress=report, **generator_kwargs)
+    print(
+        f"[generate_random_charts] {manifest['valid']}/{manifest['count']} 张通过校验，"
+        f"base_seed={manifest['base_seed']}，耗时 {manifest['elapsed_seconds']}s，"
+        f"清单: {Path(args.out) / BATCH_MANIFEST_NAME}")
+    return 0 if manifest["valid"] == manifest["count"] else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="谱面引擎：默认运行随机谱面 + ROM 生成演示，--batch 批量生成随机谱面")
+    parser.add_argument("--batch", type=int, metavar="N", help="批量生成 N 张随机谱面")
+    parser.add_argument("--seed", type=int, help="批量模式的总种子（默认 time.time_ns()）")
+    parser.add_argument("--out", type=Path, default=Path(__file__).resolve().parent / "outputs" / "random_batch",
+                        help="批量模式输出目录，每张谱面位于 <out>/<name>/，清单为 <out>/manifest.json")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="并行进程数，0 表示使用全部 CPU 核心")
+    parser.add_argument("--prefix", default="Random", help="批量谱面名前缀")
+    parser.add_argument("--format", choices=RANDOM_CHART_OUTPUTS, default="txt", help="谱面输出格式")
+    parser.add_argument("--bpm-range", type=int, nargs=2, metavar=("MIN", "MAX"))
+    parser.add_argument("--length-range", type=int, nargs=2, metavar=("MIN", "MAX"), help="时长范围（秒）")
+    parser.add_argument("--note-range", type=int, nargs=2, metavar=("MIN", "MAX"), help="目标物量范围")
+    parser.add_argument("--generator", choices=RANDOM_CHART_GENERATORS, default="classic",
+                        help="classic 逐事件生成；numpy 向量化生成（random_np.py）；difficulty 按难度曲线合成（difficulty.py）")
+    parser.add_argument("--notes", type=int, help="精确物量（numpy）")
+    parser.add_argument("--density", type=float, nargs="+", metavar="W",
+                        help="各段相对密度，谱面按段数等分（numpy）")
+    parser.add_argument("--like", help="复制该谱面的难度曲线、时长与 bpm（difficulty）")
+    parser.add_argument("--ramp", type=float, nargs=2, metavar=("START", "END"), help="线性目标难度曲线（difficulty）")
+    parser.add_argument("--tolerance", type=float, help="窗口难度允许误差占目标峰值的比例（difficulty，默认 0.1）")
+    args = parser.parse_args(argv)
+    if args.batch is not None:
+        return run_batch(args)
+
     base_dir = Path(__file__).resolve().parent.parent
     chart_name = "Random"
     chart_dir = base_dir / "charts" / chart_name
@@ -402,4 +827,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
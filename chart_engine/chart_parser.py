@@ -0,0 +1,280 @@
+"""
+谱面解析：chart_engine / chart_analysis / music_sync 共用的单次解析入口。
+
+谱面只读取并匹配一次，结果保存为按列存储的 Chart 对象：
+times / types / tracks 为三条平行的 array 列，不再构造 (time, type, track) 元组列表。
+
+解析结果会写入同目录的 .chartbin 旁路缓存（列式二进制），缓存比 TXT 新时直接 mmap 读取。
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+_EVENT_PATTERN = re.compile(r"^\(\s*([^,]+)\s*,\s*([^,]+)\s*,\s*([^)]+)\s*\)$")
+
+# 类型编码与 ROM 中的 2bit 编码一致：tap=01, hold_start=10, hold_mid=11
+TYPE_TAP = 1
+TYPE_HOLD_START = 2
+TYPE_HOLD_MID = 3
+NOTE_TYPES = {"tap": TYPE_TAP, "hold_start": TYPE_HOLD_START, "hold_mid": TYPE_HOLD_MID}
+NOTE_TYPE_NAMES = {code: name for name, code in NOTE_TYPES.items()}
+_TRACKS = {"0": 0, "1": 1}
+
+
+class ChartFormatError(ValueError):
+    """谱面文本不符合 bpm=<整数> + (time,type,trace) 的基础格式。"""
+
+
+class Chart:
+    """解析后的谱面：bpm + 三条平行列（int32 time / uint8 type / uint8 track）。"""
+
+    __slots__ = ("bpm", "times", "types", "tracks", "path")
+
+    def __init__(self, bpm: int, times=None, types=None, tracks=None, path: Optional[Path] = None):
+        self.bpm = bpm
+        self.times = times if times is not None else array("i")
+        self.types = types if types is not None else array("B")
+        self.tracks = tracks if tracks is not None else array("B")
+        self.path = path
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def duration(self) -> int:
+        """谱面时长（tick），即最大事件时间；空谱面为 0。"""
+        return max(self.times, default=0)
+
+    def count(self, note_type: str) -> int:
+        """统计某一类型的事件数量。"""
+        return self.types.tobytes().count(bytes((NOTE_TYPES[note_type],)))
+
+    def events(self) -> Iterator[Tuple[int, str, int]]:
+        """按文件顺序逐个给出 (time, type, track)，仅用于需要逐事件处理的场景。"""
+        for time_val, code, track in zip(self.times, self.types, self.tracks):
+            yield time_val, NOTE_TYPE_NAMES[code], track
+
+
+def parse_chart_lines(lines: Iterable[str], path: Optional[Path] = None) -> Chart:
+    """解析谱面文本行，格式错误时抛出 ChartFormatError（信息中含行号）。"""
+    it = iter(lines)
+    header = next(it, None)
+    if header is None:
+        raise ChartFormatError("文件为空")
+    header = header.strip()
+    if not header.startswith("bpm="):
+        raise ChartFormatError("第一行必须为 bpm=<整数>")
+    bpm_value = header.split("=", 1)[1]
+    if not bpm_value.isdigit():
+        raise ChartFormatError("BPM 必须为整数")
+
+    chart = Chart(int(bpm_value), path=path)
+    times, types, tracks = chart.times, chart.types, chart.tracks
+    match_event = _EVENT_PATTERN.match
+    for idx, raw_line in enumerate(it, start=2):
+        line = raw_line.strip()
+        if not line:
+            break
+
+        match = match_event(line)
+        if not match:
+            raise ChartFormatError(f"第 {idx} 行格式错误，应为 (time,type,trace): {line}")
+
+        time_str, evt_type, trace_str = match.groups()
+        time_str = time_str.strip()
+        evt_type = evt_type.strip()
+        trace_str = trace_str.strip()
+
+        code = NOTE_TYPES.get(evt_type)
+        if code is None:
+            raise ChartFormatError(f"第 {idx} 行 type 非法: {evt_type}")
+
+        track = _TRACKS.get(trace_str)
+        if track is None:
+            raise ChartFormatError(f"第 {idx} 行 trace 仅允许 0/1: {trace_str}")
+
+        if not time_str.lstrip("-").isdigit():
+            raise ChartFormatError(f"第 {idx} 行 time 必须为整数: {time_str}")
+
+        time_val = int(time_str)
+        if time_val < 0:
+            raise ChartFormatError(f"第 {idx} 行 time 不得为负: {time_val}")
+
+        times.append(time_val)
+        types.append(code)
+        tracks.append(track)
+
+    return chart
+
+
+def parse_chart(chart_path: Union[str, Path]) -> Chart:
+    """读取并解析谱面 TXT。读取失败抛出 OSError，格式错误抛出 ChartFormatError。"""
+    path = Path(chart_path)
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_chart_lines(f, path=path)
+
+
+# ==== .chartbin 列式缓存 ====
+# 布局（小端）：16 字节头 [magic 4s][version u16][reserved u16][bpm u32][count u32]，
+# 随后依次为 int32 time * count、uint8 type * count、uint8 track * count。
+CHARTBIN_SUFFIX = ".chartbin"
+_CHARTBIN_MAGIC = b"MDCB"
+_CHARTBIN_VERSION = 1
+_CHARTBIN_HEADER = struct.Struct("<4sHHII")
+
+
+def chart_cache_path(chart_path: Union[str, Path]) -> Path:
+    """谱面 TXT 对应的缓存路径：charts/<name>/<name>.chartbin。"""
+    return Path(chart_path).with_suffix(CHARTBIN_SUFFIX)
+
+
+def write_chart_cache(chart: Chart, cache_path: Union[str, Path]) -> bool:
+    """将 Chart 写入 .chartbin（先写临时文件再替换），失败返回 False。"""
+    cache_path = Path(cache_path)
+    times = array("i", chart.times)
+    if sys.byteorder != "little":
+        times.byteswap()
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(_CHARTBIN_HEADER.pack(_CHARTBIN_MAGIC, _CHARTBIN_VERSION, 0, chart.bpm, len(times)))
+            f.write(times.tobytes())
+            f.write(bytes(chart.types))
+            f.write(bytes(chart.tracks))
+        os.replace(tmp_path, cache_path)
+        return True
+    except OSError:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        return False
+
+
+class ChartCacheWriter:
+    """流式写出 .chartbin：time 列直接写入目标文件，type/track 列先落到临时文件，
+    关闭时依次拼接并回填头部的物量，内存占用只取决于缓冲块大小。"""
+
+    def __init__(self, cache_path: Union[str, Path], bpm: int, chunk_size: int = 1 << 16):
+        self.cache_path = Path(cache_path)
+        self.bpm = bpm
+        self.count = 0
+        self._chunk_size = chunk_size
+        self._tmp_path = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(_CHARTBIN_HEADER.pack(_CHARTBIN_MAGIC, _CHARTBIN_VERSION, 0, bpm, 0))
+        self._type_spill = tempfile.TemporaryFile()
+        self._track_spill = tempfile.TemporaryFile()
+        self._times = array("i")
+        self._types = bytearray()
+        self._tracks = bytearray()
+
+    def append(self, time_val: int, note_type: int, track: int):
+        self._times.append(time_val)
+        self._types.append(note_type)
+        self._tracks.append(track)
+        if len(self._times) >= self._chunk_size:
+            self._flush()
+
+    def _flush(self):
+        self.count += len(self._times)
+        if sys.byteorder != "little":
+            self._times.byteswap()
+        self._file.write(self._times.tobytes())
+        self._type_spill.write(self._types)
+        self._track_spill.write(self._tracks)
+        self._times = array("i")
+        self._types.clear()
+        self._tracks.clear()
+
+    def close(self) -> int:
+        """写完剩余数据并替换为正式缓存文件，返回事件数。"""
+        try:
+            self._flush()
+            for spill in (self._type_spill, self._track_spill):
+                spill.seek(0)
+                shutil.copyfileobj(spill, self._file)
+            self._file.seek(0)
+            self._file.write(_CHARTBIN_HEADER.pack(_CHARTBIN_MAGIC, _CHARTBIN_VERSION, 0, self.bpm, self.count))
+        finally:
+            self._file.close()
+            self._type_spill.close()
+            self._track_spill.close()
+        os.replace(self._tmp_path, self.cache_path)
+        return self.count
+
+    def discard(self):
+        self._file.close()
+        self._type_spill.close()
+        self._track_spill.close()
+        try:
+            self._tmp_path.unlink()
+        except OSError:
+            pass
+
+    def __enter__(self) -> "ChartCacheWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def read_chart_cache(cache_path: Union[str, Path], source_path: Optional[Path] = None) -> Optional[Chart]:
+    """mmap 读取 .chartbin，列为指向映射内存的 memoryview；文件损坏或版本不符返回 None。"""
+    try:
+        with open(cache_path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mapped) < _CHARTBIN_HEADER.size:
+        mapped.close()
+        return None
+    magic, version, _, bpm, count = _CHARTBIN_HEADER.unpack_from(mapped)
+    times_end = _CHARTBIN_HEADER.size + 4 * count
+    if magic != _CHARTBIN_MAGIC or version != _CHARTBIN_VERSION or len(mapped) != times_end + 2 * count:
+        mapped.close()
+        return None
+
+    view = memoryview(mapped)
+    if sys.byteorder == "little":
+        times = view[_CHARTBIN_HEADER.size:times_end].cast("i")
+    else:
+        times = array("i", view[_CHARTBIN_HEADER.size:times_end].tobytes())
+        times.byteswap()
+    types = view[times_end:times_end + count]
+    tracks = view[times_end + count:times_end + 2 * count]
+    return Chart(bpm, times, types, tracks, path=source_path)
+
+
+def load_chart(chart_path: Union[str, Path], use_cache: bool = True) -> Chart:
+    """读取谱面：.chartbin 比 TXT 新时直接 mmap，否则解析 TXT 并刷新缓存。"""
+    path = Path(chart_path)
+    if not use_cache:
+        return parse_chart(path)
+
+    cache_path = chart_cache_path(path)
+    try:
+        source_mtime = path.stat().st_mtime_ns
+        cache_mtime = cache_path.stat().st_mtime_ns
+    except OSError:
+        cache_mtime = None
+    if cache_mtime is not None and cache_mtime >= source_mtime:
+        chart = read_chart_cache(cache_path, source_path=path)
+        if chart is not None:
+            return chart
+
+    chart = parse_chart(path)
+    write_chart_cache(chart, cache_path)
+    return chart
@@ -0,0 +1,415 @@
+"""
+谱面难度模型与按目标难度曲线合成谱面。
+
+难度模型与 chart_analysis.ChartAnalyzer 共用：谱面按固定 tick 窗口切分，每个窗口的难度为
+    加权和（tap=1, hold_start=1.5, hold_mid=0.3） * 轨道复杂度（1 + 0.2*(轨道数-1)） * 密度因子（1 + 0.1*(音符数-1)）
+无音符的窗口为 0。
+
+合成（DifficultySynthesizer）：每个窗口维护音符数 / 加权和 / 各轨音符数，一次增删只重算它跨越的
+1~2 个窗口，按平方误差的增量贪心选取；每次处理误差最大的窗口，直至全部窗口落入容差或无改进可做。
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from chart_engine.chart_engine import (
+        RANDOM_CHART_OUTPUTS,
+        TICKS_PER_BEAT,
+        check_chart,
+        load_checked_chart,
+    )
+    from chart_engine.chart_parser import (
+        NOTE_TYPE_NAMES,
+        NOTE_TYPES,
+        TYPE_HOLD_MID,
+        TYPE_HOLD_START,
+        TYPE_TAP,
+        Chart,
+        chart_cache_path,
+        write_chart_cache,
+    )
+    from chart_engine.random_np import write_chart_text
+except ImportError:  # 直接以脚本运行 chart_engine/difficulty.py
+    from chart_engine import RANDOM_CHART_OUTPUTS, TICKS_PER_BEAT, check_chart, load_checked_chart
+    from chart_parser import (
+        NOTE_TYPE_NAMES,
+        NOTE_TYPES,
+        TYPE_HOLD_MID,
+        TYPE_HOLD_START,
+        TYPE_TAP,
+        Chart,
+        chart_cache_path,
+        write_chart_cache,
+    )
+    from random_np import write_chart_text
+
+# 难度模型中的音符类型权重（按类型编码索引）：tap=1, hold_start=1.5, hold_mid=0.3
+DIFFICULTY_TYPE_WEIGHTS = np.ones(max(NOTE_TYPE_NAMES) + 1)
+DIFFICULTY_TYPE_WEIGHTS[NOTE_TYPES['hold_start']] = 1.5
+DIFFICULTY_TYPE_WEIGHTS[NOTE_TYPES['hold_mid']] = 0.3
+_TYPE_WEIGHTS = [float(weight) for weight in DIFFICULTY_TYPE_WEIGHTS]
+
+DIFFICULTY_WINDOW_MIN = 100
+
+
+def difficulty_window_size(duration: int) -> int:
+    """与 ChartAnalyzer.analyze 相同的窗口大小：至少 100 tick，约 100 个窗口覆盖全曲。"""
+    return max(DIFFICULTY_WINDOW_MIN, duration // 100)
+
+
+def window_difficulty(count, weighted_sum, track_count):
+    """单个（或成组）窗口的难度；标量与 NumPy 数组均可。"""
+    # 轨道复杂度：多轨道同时出现增加难度
+    track_complexity = 1.0 + 0.2 * (track_count - 1)
+    # 密度因子：音符越多，难度增长越快（非线性）
+    density_factor = 1.0 + 0.1 * (count - 1)
+    # 最终难度 = 加权和 * 轨道复杂度 * 密度因子
+    return np.where(count > 0, weighted_sum * track_complexity * density_factor, 0.0)
+
+
+def difficulty_curve(times: np.ndarray, types: np.ndarray, tracks: np.ndarray,
+                     duration: int, window_size: int) -> np.ndarray:
+    """计算难度曲线：综合考虑密度、音符类型复杂度、轨道分布；无音符的窗口为 0"""
+    num_windows = duration // window_size + 1
+    windows = times // window_size
+
+    count = np.bincount(windows, minlength=num_windows)
+    weighted_sum = np.bincount(windows, weights=DIFFICULTY_TYPE_WEIGHTS[types], minlength=num_windows)
+
+    # 每个窗口出现过的轨道位掩码（bit k 表示轨道 k），按窗口分段做按位或
+    track_mask = np.zeros(num_windows, dtype=np.uint8)
+    if windows.size:
+        order = np.argsort(windows, kind='stable')
+        sorted_windows = windows[order]
+        starts = np.flatnonzero(np.r_[True, sorted_windows[1:] != sorted_windows[:-1]])
+        bits = np.left_shift(1, tracks[order]).astype(np.uint8)
+        track_mask[sorted_windows[starts]] = np.bitwise_or.reduceat(bits, starts)
+    track_count = np.unpackbits(track_mask[:, None], axis=1).sum(axis=1)
+    return window_difficulty(count, weighted_sum, track_count)
+
+
+def chart_difficulty_curve(chart: Chart) -> np.ndarray:
+    """按 ChartAnalyzer 的窗口划分计算整张谱面的难度曲线。"""
+    duration = chart.duration
+    return difficulty_curve(
+        np.frombuffer(chart.times, dtype=np.int32),
+        np.frombuffer(chart.types, dtype=np.uint8),
+        np.frombuffer(chart.tracks, dtype=np.uint8),
+        duration, difficulty_window_size(duration))
+
+
+def resample_curve(curve: Sequence[float], num_windows: int) -> np.ndarray:
+    """把任意长度的目标曲线线性重采样到 num_windows 个窗口。"""
+    curve = np.asarray(curve, dtype=np.float64)
+    if curve.size == 1:
+        return np.full(num_windows, float(curve[0]))
+    return np.interp(np.linspace(0, curve.size - 1, num_windows), np.arange(curve.size), curve)
+
+
+class DifficultySynthesizer:
+    """在固定时长上逐个增删物件（tap 或长条），使窗口难度逼近目标曲线。"""
+
+    def __init__(self, target: Sequence[float], duration: int, rng: random.Random,
+                 hold_range: Tuple[int, int] = (2, 8), hold_ratio: float = 0.3, candidates: int = 12):
+        self.duration = duration
+        self.window_size = difficulty_window_size(duration)
+        self.num_windows = duration // self.window_size + 1
+        self.target = resample_curve(target, self.num_windows)
+        self.rng = rng
+        self.hold_range = hold_range
+        self.hold_ratio = hold_ratio
+        self.candidates = candidates
+
+        self.occupied = [bytearray(duration + 1), bytearray(duration + 1)]
+        self.count = [0] * self.num_windows
+        self.weighted = [0.0] * self.num_windows
+        self.per_track = [[0, 0] for _ in range(self.num_windows)]
+        self.current = np.zeros(self.num_windows)
+        # 物件 id -> (起点, 长度, 轨道)；按起点窗口索引可删除的物件
+        self.objects: Dict[int, Tuple[int, int, int]] = {}
+        self.by_window: List[set] = [set() for _ in range(self.num_windows)]
+        self._next_id = 0
+        self.iterations = 0
+
+        # 末尾固定一个 tap，使谱面时长（最大 time）恰为 duration，窗口划分与分析一致
+        self._apply(duration, 1, 0, +1)
+        self.occupied[0][duration] = 1
+
+    # ---- 增量计分 ----
+    def _object_windows(self, start: int, length: int) -> Dict[int, Tuple[int, float]]:
+        """物件在各窗口贡献的 (音符数, 加权和)。"""
+        size = self.window_size
+        contrib: Dict[int, Tuple[int, float]] = {}
+        for tick in range(start, start + length):
+            code = TYPE_TAP if length == 1 else (TYPE_HOLD_START if tick == start else TYPE_HOLD_MID)
+            window = tick // size
+            count, weighted = contrib.get(window, (0, 0.0))
+            contrib[window] = (count + 1, weighted + _TYPE_WEIGHTS[code])
+        return contrib
+
+    def _window_value(self, count: int, weighted: float, per_track: Sequence[int]) -> float:
+        if count <= 0:
+            return 0.0
+        track_count = (per_track[0] > 0) + (per_track[1] > 0)
+        return weighted * (1.0 + 0.2 * (track_count - 1)) * (1.0 + 0.1 * (count - 1))
+
+    def _delta(self, start: int, length: int, track: int, sign: int) -> float:
+        """增（sign=+1）或删（-1）一个物件后平方误差的变化量，只重算该物件跨越的窗口。"""
+        delta = 0.0
+        for window, (count, weighted) in self._object_windows(start, length).items():
+            per_track = list(self.per_track[window])
+            per_track[track] += sign * count
+            value = self._window_value(self.count[window] + sign * count,
+                                       self.weighted[window] + sign * weighted, per_track)
+            target = self.target[window]
+            delta += (value - target) ** 2 - (self.current[window] - target) ** 2
+        return delta
+
+    def _apply(self, start: int, length: int, track: int, sign: int):
+        for window, (count, weighted) in self._object_windows(start, length).items():
+            self.count[window] += sign * count
+            self.weighted[window] += sign * weighted
+            self.per_track[window][track] += sign * count
+            self.current[window] = self._window_value(
+                self.count[window], self.weighted[window], self.per_track[window])
+
+    # ---- 增删操作 ----
+    def _random_object(self, window: int) -> Optional[Tuple[int, int, int]]:
+        """在窗口内随机挑一个同轨空闲的起点；长条截断到下一个已占用的 tick（不足 2 tick 时退化为 tap）。"""
+        lo = window * self.window_size
+        hi = min(lo + self.window_size, self.duration)
+        if hi <= lo:
+            return None
+        track = self.rng.randrange(2)
+        occupied = self.occupied[track]
+        pivot = self.rng.randrange(lo, hi)
+        start = occupied.find(0, pivot, hi)
+        if start < 0:
+            start = occupied.find(0, lo, pivot)
+            if start < 0:
+                return None
+        length = 1
+        if self.rng.random() < self.hold_ratio:
+            length = min(self.rng.randint(*self.hold_range), self.duration - start)
+            blocked = occupied.find(1, start, start + length)
+            if blocked >= 0:
+                length = blocked - start
+        return start, length, track
+
+    def _best_addition(self, window: int):
+        best = None
+        for _ in range(self.candidates):
+            obj = self._random_object(window)
+            if obj is None:
+                continue
+            delta = self._delta(*obj, +1)
+            if best is None or delta < best[0]:
+                best = (delta, obj)
+        return best
+
+    def _sample_objects(self, window: int) -> List[int]:
+        ids = self.by_window[window]
+        if len(ids) > self.candidates:
+            return self.rng.sample(sorted(ids), self.candidates)
+        return list(ids)
+
+    def _best_removal(self, window: int):
+        best = None
+        for obj_id in self._sample_objects(window):
+            delta = self._delta(*self.objects[obj_id], -1)
+            if best is None or delta < best[0]:
+                best = (delta, obj_id)
+        return best
+
+    def _best_swap(self, window: int):
+        """删一个物件再在同一窗口加一个：单次增删的步长越过目标时用于细调。"""
+        best = None
+        for obj_id in self._sample_objects(window):
+            start, length, track = obj = self.objects[obj_id]
+            removal = self._delta(*obj, -1)
+            self._apply(*obj, -1)
+            self.occupied[track][start:start + length] = bytes(length)
+            addition = self._best_addition(window)
+            self._apply(*obj, +1)
+            self.occupied[track][start:start + length] = b"\x01" * length
+            if addition is not None and (best is None or removal + addition[0] < best[0]):
+                best = (removal + addition[0], obj_id, addition[1])
+        return best
+
+    def add(self, start: int, length: int, track: int):
+        self._apply(start, length, track, +1)
+        self.occupied[track][start:start + length] = b"\x01" * length
+        obj_id = self._next_id
+        self._next_id += 1
+        self.objects[obj_id] = (start, length, track)
+        self.by_window[start // self.window_size].add(obj_id)
+
+    def remove(self, obj_id: int):
+        start, length, track = self.objects.pop(obj_id)
+        self._apply(start, length, track, -1)
+        self.occupied[track][start:start + length] = bytes(length)
+        self.by_window[start // self.window_size].discard(obj_id)
+
+    def run(self, tolerance: float, max_iterations: Optional[int] = None) -> float:
+        """迭代至所有窗口误差不超过 tolerance * 目标峰值，返回最终的最大绝对误差。"""
+        limit = tolerance * max(float(self.target.max()), 1e-9)
+        if max_iterations is None:
+            max_iterations = 50 * self.num_windows + 20 * int(self.target.sum())
+        stuck = np.zeros(self.num_windows, dtype=bool)
+        while self.iterations < max_iterations:
+            error = self.current - self.target
+            open_error = np.where(stuck, 0.0, np.abs(error))
+            window = int(open_error.argmax())
+            if open_error[window] <= limit:
+                break
+            self.iterations += 1
+            if error[window] < 0:
+                best = self._best_addition(window)
+                if best is not None and best[0] < 0:
+                    self.add(*best[1])
+                    stuck[max(window - 1, 0):window + 2] = False
+                    continue
+            else:
+                best = self._best_removal(window)
+                if best is not None and best[0] < 0:
+                    self.remove(best[1])
+                    stuck[max(window - 1, 0):window + 2] = False
+                    continue
+            swap = self._best_swap(window)
+            if swap is not None and swap[0] < 0:
+                self.remove(swap[1])
+                self.add(*swap[2])
+                stuck[max(window - 1, 0):window + 2] = False
+                continue
+            stuck[window] = True
+        return float(np.abs(self.current - self.target).max())
+
+    def to_chart(self, bpm: int) -> Chart:
+        """把物件展开为事件，按 (time, track) 排序输出 Chart。"""
+        objects = [(self.duration, 1, 0)] + list(self.objects.values())
+        starts, lengths, tracks = (np.array(column, dtype=np.int32) for column in zip(*objects))
+        owner = np.repeat(np.arange(len(objects), dtype=np.int32), lengths)
+        offsets = np.arange(len(owner), dtype=np.int32) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        times = starts[owner] + offsets
+        types = np.where(lengths[owner] == 1, TYPE_TAP, np.where(offsets == 0, TYPE_HOLD_START, TYPE_HOLD_MID))
+        event_tracks = tracks[owner]
+        order = np.lexsort((event_tracks, times))
+
+        chart = Chart(int(bpm))
+        chart.times.frombytes(times[order].astype(np.int32).tobytes())
+        chart.types.frombytes(types[order].astype(np.uint8).tobytes())
+        chart.tracks.frombytes(event_tracks[order].astype(np.uint8).tobytes())
+        return chart
+
+
+def reference_target(chart_name: str) -> Optional[Tuple[np.ndarray, int, int]]:
+    """以已有谱面的难度曲线为目标，返回 (曲线, 时长 tick, bpm)。"""
+    chart = load_checked_chart(chart_name, tag="generate_difficulty_chart")
+    if chart is None:
+        return None
+    return chart_difficulty_curve(chart), chart.duration, chart.bpm
+
+
+def generate_difficulty_chart(
+    output_dir,
+    name="Random",
+    seed=None,
+    target=None,
+    like=None,
+    ramp=(20.0, 400.0),
+    bpm=None,
+    length_seconds=None,
+    bpm_range=(150, 250),
+    length_range=(120, 180),
+    tolerance=0.1,
+    output_format="txt",
+):
+    """按目标难度曲线合成谱面：like 为参考谱面名（复制其曲线、时长与 bpm），
+    否则 target 为任意长度的曲线（重采样到窗口数），都为空时使用 ramp=(起点, 终点) 的线性曲线。
+
+    谱面未能在 tolerance * 目标峰值内贴合目标时打印原因并返回 None。
+    """
+    if output_format not in RANDOM_CHART_OUTPUTS:
+        print(f"错误：未知的输出格式 {output_format}（可选 {', '.join(RANDOM_CHART_OUTPUTS)}）")
+        return None
+    rng = random.Random(seed)
+    if like is not None:
+        reference = reference_target(like)
+        if reference is None:
+            return None
+        curve, duration, output_bpm = reference
+        output_bpm = bpm if bpm is not None else output_bpm
+    else:
+        output_bpm = bpm if bpm is not None else rng.randint(*bpm_range)
+        output_len = length_seconds if length_seconds is not None else rng.randint(*length_range)
+        duration = int(output_bpm * output_len * TICKS_PER_BEAT / 60)
+        # 补齐最后一个窗口（至多 100 tick，窗口大小不变），避免末窗口只有固定的末尾 tap 而无法贴合
+        duration = duration // difficulty_window_size(duration) * difficulty_window_size(duration) + DIFFICULTY_WINDOW_MIN - 1
+        curve = target if target is not None else np.linspace(ramp[0], ramp[1], 101)
+    if duration <= 0 or np.min(curve) < 0:
+        print("错误：目标时长须为正，难度曲线不得为负")
+        return None
+
+    synth = DifficultySynthesizer(curve, duration, rng)
+    start = time.perf_counter()
+    max_error = synth.run(tolerance)
+    elapsed = time.perf_counter() - start
+    peak = float(synth.target.max())
+    print(
+        f"[generate_difficulty_chart] bpm={output_bpm}, ticks={duration}, windows={synth.num_windows}, "
+        f"objects={len(synth.objects) + 1}, iterations={synth.iterations}, "
+        f"max_err={max_error:.2f}/{peak:.2f}, {elapsed:.2f}s")
+    if max_error > tolerance * max(peak, 1e-9):
+        print(f"错误：难度曲线未在容差 {tolerance:.0%} 内贴合目标（最大误差 {max_error:.2f}）")
+        return None
+
+    chart = synth.to_chart(output_bpm)
+    if not check_chart(chart, tag="generate_difficulty_chart"):
+        return None
+    output_path = Path(output_dir) / f"{name}.txt"
+    cache_path = chart_cache_path(output_path)
+    try:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        if output_format != "chartbin":
+            write_chart_text(chart, output_path)
+        if output_format != "txt" and not write_chart_cache(chart, cache_path):
+            raise OSError(f"无法写入 {cache_path}")
+    except Exception as exc:
+        print(f"错误：无法写入文件 {output_path}: {exc}")
+        return None
+    return cache_path if output_format == "chartbin" else output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按目标难度曲线合成谱面（难度模型与 chart_analysis 一致）")
+    parser.add_argument("--like", help="复制该谱面的难度曲线、时长与 bpm（如 Cthugha）")
+    parser.add_argument("--ramp", type=float, nargs=2, metavar=("START", "END"), default=(20.0, 400.0),
+                        help="线性难度曲线的起点与终点（未给 --like 时使用）")
+    parser.add_argument("--bpm", type=int)
+    parser.add_argument("--length", type=int, help="时长（秒），未给 --like 时使用")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="允许的最大窗口误差（占目标峰值的比例）")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--name", default="Difficulty")
+    parser.add_argument("--out", type=Path, default=Path(__file__).resolve().parent.parent / "charts" / "Difficulty")
+    parser.add_argument("--format", choices=RANDOM_CHART_OUTPUTS, default="txt")
+    args = parser.parse_args(argv)
+
+    path = generate_difficulty_chart(
+        args.out, name=args.name, seed=args.seed, like=args.like, ramp=tuple(args.ramp), bpm=args.bpm,
+        length_seconds=args.length, tolerance=args.tolerance, output_format=args.format)
+    if path is None:
+        return 1
+    print(f"[generate_difficulty_chart] 已生成: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+HDL 批量回归：随机谱面 + 随机按键轨迹驱动 testbench/Regression_tb.v，与 hdl_model 的结果逐条比对。
+
+流程：
+1. 按设计参数（div_cnt / 时隙数 / 地址位宽）用 Icarus Verilog 或 Verilator 只编译一次；
+2. 各谱面分片到进程池：generate_random_chart 生成谱面，build_rom 编码 ROM（与 process_chart 相同，
+   但写入工作目录而不改动 verilog/ 与 MuseDash.v），生成随机按键轨迹；
+3. 每条轨迹用 +rom / +presses / +ticks 运行已编译的仿真，解析 RESULT 行，与
+   JudgementModel.replay_batch 的总分和判定计数比对；
+4. 汇总每个谱面的通过情况与得分，打印表格并写出 results.json，报告 tick/s 吞吐。
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    from chart_engine.chart_engine import (
+        build_rom,
+        derive_chart_seed,
+        encode_rom_hex,
+        generate_random_chart,
+        load_checked_chart,
+    )
+    from chart_engine.hdl_model import JudgementModel
+except ImportError:  # 直接以脚本运行 chart_engine/hdl_regression.py
+    from chart_engine import build_rom, derive_chart_seed, encode_rom_hex, generate_random_chart, load_checked_chart
+    from hdl_model import JudgementModel
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_WORK_DIR = Path(__file__).resolve().parent / "outputs" / "regression"
+TESTBENCH = BASE_DIR / "testbench" / "Regression_tb.v"
+TOP_MODULE = "Regression_tb"
+HDL_SOURCES = [
+    BASE_DIR / "verilog" / name
+    for name in (
+        "Clk_Div.v",
+        "Address_Generator.v",
+        "Queue.v",
+        "LFSR.v",
+        "Judgement.v",
+        "ScoreConversion.v",
+        "BCD_Adder.v",
+        "Accumulator.v",
+    )
+]
+SIMULATORS = ("iverilog", "verilator")
+SIM_TIMEOUT_SECONDS = 600
+_RESULT_PATTERN = re.compile(r"RESULT score=([0-9a-fA-Fx]+) up=([\d,]+) down=([\d,]+)")
+
+
+def find_simulator(preferred: Optional[str] = None) -> Optional[str]:
+    """返回可用的仿真器名：优先使用指定项，否则按 SIMULATORS 顺序查找。"""
+    candidates = [preferred] if preferred else list(SIMULATORS)
+    for name in candidates:
+        if shutil.which(name) and (name != "iverilog" or shutil.which("vvp")):
+            return name
+    return None
+
+
+def compile_design(simulator: str, build_dir: Path, div_cnt: int, slots: int, addr_width: int) -> List[str]:
+    """编译一次回归设计，返回运行仿真的命令前缀（之后只追加 plusargs）。"""
+    build_dir.mkdir(parents=True, exist_ok=True)
+    params = {"DIV_CNT": div_cnt, "SLOTS": slots, "ADDR_WIDTH": addr_width}
+    sources = [str(path) for path in HDL_SOURCES + [TESTBENCH]]
+    if simulator == "iverilog":
+        vvp_path = build_dir / f"{TOP_MODULE}.vvp"
+        cmd = ["iverilog", "-g2012", "-s", TOP_MODULE, "-o", str(vvp_path)]
+        cmd += [f"-P{TOP_MODULE}.{key}={val}" for key, val in params.items()]
+        run_cmd = ["vvp", "-n", str(vvp_path)]
+    elif simulator == "verilator":
+        obj_dir = build_dir / "obj_dir"
+        cmd = [
+            "verilator", "--binary", "--timing", "-Wno-fatal", "-Wno-lint", "-Wno-style",
+            "--top-module", TOP_MODULE, "--Mdir", str(obj_dir), "-o", TOP_MODULE,
+        ]
+        cmd += [f"-G{key}={val}" for key, val in params.items()]
+        run_cmd = [str(obj_dir / TOP_MODULE)]
+    else:
+        raise ValueError(f"未知的仿真器: {simulator}")
+
+    proc = subprocess.run(cmd + sources, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{simulator} 编译失败:\n{proc.stdout}{proc.stderr}")
+    return run_cmd
+
+
+def write_presses_hex(presses: np.ndarray, path: Path):
+    """单条轨迹 (2, n_ticks, slots) 写成 $readmemh 文件：每行一个 tick，低位为 notedown。"""
+    slots = presses.shape[2]
+    weights = 1 << np.arange(2 * slots)
+    words = presses.transpose(1, 0, 2).reshape(presses.shape[1], 2 * slots).astype(np.int64) @ weights
+    digits = max(1, (2 * slots + 3) // 4)
+    path.write_text("".join(f"{int(word):0{digits}x}\n" for word in words), encoding="utf-8")
+
+
+def parse_result(output: str) -> Optional[Dict[str, object]]:
+    """解析 Regression_tb 的 RESULT 行；缺失或含 x/z 时返回 None。"""
+    match = _RESULT_PATTERN.search(output)
+    if not match or not match.group(1).isdigit():
+        return None
+    up = [int(val) for val in match.group(2).split(",")]
+    down = [int(val) for val in match.group(3).split(",")]
+    return {"score": int(match.group(1)), "counts": np.array([down, up], dtype=np.int64)}
+
+
+def run_chart(task: Dict[str, object]) -> Dict[str, object]:
+    """进程池任务：生成一张随机谱面并跑完它的全部轨迹。"""
+    name = task["name"]
+    chart_dir = Path(task["work_dir"]) / name
+    row: Dict[str, object] = {"index": task["index"], "name": name, "seed": task["seed"], "status": "fail", "ticks": 0,
+                              "traces": task["traces"], "passed": 0, "notes": 0}
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        chart_path = generate_random_chart(chart_dir, name=name, seed=task["seed"])
+        chart = load_checked_chart(name, chart_path) if chart_path is not None else None
+        rom = build_rom(chart, 1 << task["addr_width"]) if chart is not None else None
+    if rom is None:
+        row["message"] = log.getvalue().strip().splitlines()[-1:] or ["谱面生成失败"]
+        return row
+
+    model = JudgementModel(rom, div_cnt=task["div_cnt"], slots_per_tick=task["slots"])
+    rng = np.random.default_rng(task["seed"])
+    presses = model.random_presses(rng, task["traces"], task["press_prob"])
+    expected = model.replay_batch(presses)
+    row["notes"] = len(chart)
+    row["ticks"] = model.n_ticks
+
+    rom_path = chart_dir / f"{name}.mem"
+    rom_path.write_bytes(encode_rom_hex(rom))
+    hdl_scores = []
+    failures = []
+    for idx in range(task["traces"]):
+        press_path = chart_dir / f"presses_{idx}.hex"
+        write_presses_hex(presses[idx], press_path)
+        cmd = list(task["run_cmd"]) + [f"+rom={rom_path}", f"+presses={press_path}", f"+ticks={model.n_ticks}"]
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=SIM_TIMEOUT_SECONDS)
+            result = parse_result(proc.stdout)
+        except subprocess.TimeoutExpired:
+            result = None
+        if result is None:
+            failures.append(f"trace {idx}: 仿真无 RESULT 输出")
+            continue
+        hdl_scores.append(result["score"])
+        if result["score"] != int(expected["score"][idx]) or not np.array_equal(result["counts"], expected["counts"][idx]):
+            failures.append(f"trace {idx}: HDL {result['score']} / model {int(expected['score'][idx])}")
+            continue
+        row["passed"] += 1
+
+    if not task["keep"]:
+        shutil.rmtree(chart_dir, ignore_errors=True)
+    row["status"] = "pass" if row["passed"] == task["traces"] else "fail"
+    row["model_score_mean"] = float(expected["score"].mean())
+    row["hdl_score_mean"] = float(np.mean(hdl_scores)) if hdl_scores else None
+    if failures:
+        row["message"] = failures[:5]
+    return row
+
+
+def run_regression(charts: int, traces: int, jobs: int = 0, simulator: Optional[str] = None, seed: int = 0,
+                   work_dir: Path = DEFAULT_WORK_DIR, div_cnt: int = 8, slots: int = 4, addr_width: int = 12,
+                   press_prob: float = 0.3, keep: bool = False) -> Optional[List[Dict[str, object]]]:
+    sim = find_simulator(simulator)
+    if sim is None:
+        print(f"[hdl_regression] 未找到可用的仿真器（需要 {simulator or ' 或 '.join(SIMULATORS)}）")
+        return None
+    work_dir = Path(work_dir)
+    build_dir = work_dir / f"build_{sim}_d{div_cnt}_s{slots}_a{addr_width}"
+    print(f"[hdl_regression] 使用 {sim} 编译设计 -> {build_dir}")
+    try:
+        run_cmd = compile_design(sim, build_dir, div_cnt, slots, addr_width)
+    except (OSError, RuntimeError) as exc:
+        print(f"[hdl_regression] {exc}")
+        return None
+
+    tasks = [
+        {
+            "index": idx,
+            "name": f"Regress_{seed}_{idx}",
+            # 每张谱面的种子由总种子派生，结果可单独复现
+            "seed": derive_chart_seed(seed, idx),
+            "work_dir": str(work_dir / "charts"),
+            "run_cmd": run_cmd,
+            "traces": traces,
+            "div_cnt": div_cnt,
+            "slots": slots,
+            "addr_width": addr_width,
+            "press_prob": press_prob,
+            "keep": keep,
+        }
+        for idx in range(charts)
+    ]
+    workers = jobs if jobs > 0 else (os.cpu_count() or 1)
+    rows: List[Dict[str, object]] = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(workers, max(1, charts))) as pool:
+        futures = [pool.submit(run_chart, task) for task in tasks]
+        for future in as_completed(futures):
+            try:
+                row = future.result()
+            except Exception as exc:
+                row = {"name": "?", "status": "error", "message": [str(exc)], "ticks": 0, "traces": 0, "passed": 0}
+            rows.append(row)
+            print(f"[hdl_regression] {row['name']}: {row['status']} ({row['passed']}/{row['traces']})")
+    elapsed = time.perf_counter() - start
+
+    rows.sort(key=lambda row: row.get("index", -1))
+    print_table(rows)
+    simulated_ticks = sum(row["ticks"] * row["passed"] for row in rows)
+    failed = sum(1 for row in rows if row["status"] != "pass")
+    print(
+        f"[hdl_regression] {len(rows) - failed}/{len(rows)} 张谱面通过，耗时 {elapsed:.1f}s，"
+        f"{simulated_ticks / elapsed if elapsed else 0:.0f} tick/s（{workers} 进程）")
+
+    work_dir.mkdir(parents=True, exist_ok=True)
+    summary = {
+        "simulator": sim,
+        "seed": seed,
+        "div_cnt": div_cnt,
+        "slots": slots,
+        "addr_width": addr_width,
+        "elapsed_seconds": elapsed,
+        "ticks_per_second": simulated_ticks / elapsed if elapsed else 0,
+        "charts": rows,
+    }
+    (work_dir / "results.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    return rows
+
+
+def print_table(rows: List[Dict[str, object]]):
+    header = f"{'chart':<24} {'status':<6} {'notes':>6} {'ticks':>6} {'pass':>9} {'model':>8} {'hdl':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        model_score = row.get("model_score_mean")
+        hdl_score = row.get("hdl_score_mean")
+        print(
+            f"{row['name']:<24} {row['status']:<6} {row.get('notes', 0):>6} {row['ticks']:>6} "
+            f"{row['passed']:>4}/{row['traces']:<4} "
+            f"{'-' if model_score is None else f'{model_score:.1f}':>8} "
+            f"{'-' if hdl_score is None else f'{hdl_score:.1f}':>8}")
+        for message in row.get("message", []):
+            print(f"    {message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="随机谱面 + 随机按键轨迹的 HDL 批量回归")
+    parser.add_argument("--charts", type=int, default=10, help="随机谱面数量")
+    parser.add_argument("--traces", type=int, default=4, help="每张谱面的按键轨迹数")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="并行进程数，0 表示使用全部 CPU 核心")
+    parser.add_argument("--simulator", choices=SIMULATORS, help="默认自动查找 iverilog / verilator")
+    parser.add_argument("--seed", type=int, default=0, help="总种子，每张谱面的种子由它派生")
+    parser.add_argument("--work-dir", type=Path, default=DEFAULT_WORK_DIR)
+    parser.add_argument("--div-cnt", type=int, default=8, help="仿真中 clk_div 半周期的 clk 数")
+    parser.add_argument("--slots", type=int, default=4, help="每个 tick 的按键时隙数")
+    parser.add_argument("--addr-width", type=int, default=12, help="ROM 地址位宽")
+    parser.add_argument("--press-prob", type=float, default=0.3, help="每个时隙按下的概率")
+    parser.add_argument("--keep", action="store_true", help="保留每张谱面的 ROM 与轨迹文件")
+    args = parser.parse_args(argv)
+
+    rows = run_regression(
+        args.charts, args.traces, jobs=args.jobs, simulator=args.simulator, seed=args.seed,
+        work_dir=args.work_dir, div_cnt=args.div_cnt, slots=args.slots, addr_width=args.addr_width,
+        press_prob=args.press_prob, keep=args.keep)
+    if rows is None:
+        return 1
+    return 0 if all(row["status"] == "pass" for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
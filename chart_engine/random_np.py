@@ -0,0 +1,202 @@
+"""
+NumPy 向量化随机谱面生成：一次性抽取全部物件的类型、轨道、长条长度与位置，不逐个 random.randint。
+
+物件为单点（tap）或长条（hold_start + 连续 hold_mid），落在轨道 0、轨道 1 或双轨。
+- 物量：按物件累计物量截断，尾部用 tap 补齐，精确命中目标物量；
+- 密度：物件位置按物量累计比例经密度曲线（分段常数，各段等长）的逆 CDF 映射到时间轴；
+- 冲突修正：物件按时间串行排布，重叠的物件围绕原位置向两侧展开（前缀最大值与后缀最小值取平均），
+  再压回 [1, total_ticks]，保证同轨时间严格递增、长条之间不插入其他物件、谱面不超过指定时长，
+  输出满足 chart_check 的全部规则；物量无法容纳时抛出 ValueError。
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from chart_engine.chart_engine import RANDOM_CHART_OUTPUTS, TICKS_PER_BEAT, check_chart
+    from chart_engine.chart_parser import (
+        NOTE_TYPE_NAMES,
+        TYPE_HOLD_MID,
+        TYPE_HOLD_START,
+        TYPE_TAP,
+        Chart,
+        chart_cache_path,
+        write_chart_cache,
+    )
+except ImportError:  # 直接以脚本运行 chart_engine/ 下的模块
+    from chart_engine import RANDOM_CHART_OUTPUTS, TICKS_PER_BEAT, check_chart
+    from chart_parser import (
+        NOTE_TYPE_NAMES,
+        TYPE_HOLD_MID,
+        TYPE_HOLD_START,
+        TYPE_TAP,
+        Chart,
+        chart_cache_path,
+        write_chart_cache,
+    )
+
+# 轨道模式：0 / 1 为单轨，2 为双轨（与原生成器 trace 1/2/3 各占 1/3 一致）
+_BOTH_TRACKS = 2
+_WRITE_CHUNK = 1 << 16
+
+
+def _draw_objects(rng: np.random.Generator, count: int, tap_ratio: float,
+                  hold_range: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """抽取 count 个物件，返回 (跨度 tick 数, 轨道模式)；跨度为 1 的是 tap。"""
+    spans = np.where(rng.random(count) < tap_ratio, 1, rng.integers(hold_range[0], hold_range[1] + 1, count, dtype=np.int32))
+    lanes = rng.integers(0, 3, count, dtype=np.int32)
+    return spans, lanes
+
+
+def _exact_objects(rng: np.random.Generator, notes: int, tap_ratio: float,
+                   hold_range: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """抽取物件直到累计物量不少于 notes，截掉最后一个不完整的物件后用 tap 补齐剩余物量。"""
+    mean_notes = (tap_ratio + (1 - tap_ratio) * sum(hold_range) / 2) * 4 / 3
+    spans = np.empty(0, dtype=np.int32)
+    lanes = np.empty(0, dtype=np.int32)
+    total = 0
+    while total < notes:
+        batch = int((notes - total) / mean_notes * 1.1) + 16
+        new_spans, new_lanes = _draw_objects(rng, batch, tap_ratio, hold_range)
+        spans = np.concatenate([spans, new_spans])
+        lanes = np.concatenate([lanes, new_lanes])
+        total = int((spans * np.where(lanes == _BOTH_TRACKS, 2, 1)).sum())
+
+    cum = np.cumsum(spans * np.where(lanes == _BOTH_TRACKS, 2, 1))
+    keep = int(np.searchsorted(cum, notes, side="right"))
+    remain = notes - (int(cum[keep - 1]) if keep else 0)
+    # 剩余物量：双押 tap 每个 2，奇数时再补一个单轨 tap
+    fill_lanes = [_BOTH_TRACKS] * (remain // 2) + [int(rng.integers(0, 2))] * (remain % 2)
+    spans = np.concatenate([spans[:keep], np.ones(len(fill_lanes), dtype=np.int32)])
+    lanes = np.concatenate([lanes[:keep], np.array(fill_lanes, dtype=np.int32)])
+    return spans, lanes
+
+
+def _place_objects(rng: np.random.Generator, spans: np.ndarray, lanes: np.ndarray, total_ticks: int,
+                   density_profile: Optional[Sequence[float]]) -> np.ndarray:
+    """按密度曲线给出各物件起点，并整体后移消除重叠。"""
+    weights = np.where(lanes == _BOTH_TRACKS, 2, 1) * spans
+    cum_before = np.cumsum(weights) - weights
+    # 物件在物量空间中的位置（含随机抖动），严格递增
+    positions = (cum_before + rng.random(len(spans)) * weights) / max(int(weights.sum()), 1)
+
+    profile = np.asarray(density_profile if density_profile is not None else [1.0], dtype=np.float64)
+    if profile.ndim != 1 or not len(profile) or (profile < 0).any() or profile.sum() <= 0:
+        raise ValueError("density_profile 须为非负且总和大于 0 的一维序列")
+    cdf = np.concatenate([[0.0], np.cumsum(profile) / profile.sum()])
+    section_edges = np.linspace(1.0, max(total_ticks, 2), len(profile) + 1)
+    # 逆 CDF：side="right" 会跳过密度为 0 的段，段内线性插值
+    section = np.clip(np.searchsorted(cdf, positions, side="right") - 1, 0, len(profile) - 1)
+    width = cdf[section + 1] - cdf[section]
+    frac = np.divide(positions - cdf[section], width, out=np.zeros_like(positions), where=width > 0)
+    ideal = (section_edges[section] + frac * (section_edges[section + 1] - section_edges[section])).astype(np.int64)
+
+    # 约束 start[i] >= start[i-1] + span[i-1]：减去跨度前缀和后序列须单调不减。
+    # 前缀最大值（整体后移）与后缀最小值（整体前移）取平均，重叠的物件围绕原位置向两侧展开，
+    # 饱和段溢出的物件不会全部挤进下一段；再裁剪到 [1, total_ticks + 1 - 总跨度]，
+    # 保证首个物件不早于 tick 1、最后一个物件的末尾不晚于 total_ticks（裁剪不破坏单调性）。
+    span_before = np.cumsum(spans) - spans
+    upper = total_ticks + 1 - int(spans.sum())
+    if upper < 1:
+        raise ValueError(f"物件总跨度 {int(spans.sum())} tick 超过谱面长度 {total_ticks} tick，无法容纳该物量")
+    shifted = ideal - span_before
+    later = np.maximum.accumulate(shifted)
+    earlier = np.minimum.accumulate(shifted[::-1])[::-1]
+    return span_before + np.clip((later + earlier) // 2, 1, upper)
+
+
+def build_random_chart_np(bpm: int, total_ticks: int, notes: int, rng: np.random.Generator,
+                          density_profile: Optional[Sequence[float]] = None, tap_ratio: float = 0.8,
+                          hold_range: Tuple[int, int] = (3, 8)) -> Chart:
+    """在内存中生成恰好 notes 个音符的随机谱面。"""
+    if hold_range[0] < 2 or hold_range[1] < hold_range[0]:
+        raise ValueError("hold_range 下限至少为 2（hold_start + hold_mid）")
+    spans, lanes = _exact_objects(rng, notes, tap_ratio, hold_range)
+    starts = _place_objects(rng, spans, lanes, total_ticks, density_profile)
+
+    # 一次 repeat 展开为事件：物件内第 j 个事件，双轨为 (tick j//2, 轨道 j%2)，单轨为 (tick j, 本轨)
+    per_object = (spans << (lanes == _BOTH_TRACKS)).astype(np.int32)
+    owner = np.repeat(np.arange(len(spans), dtype=np.int32), per_object)
+    within = np.arange(len(owner), dtype=np.int32) - np.repeat(np.cumsum(per_object) - per_object, per_object)
+    owner_lanes = lanes[owner]
+    both = owner_lanes == _BOTH_TRACKS
+    offsets = np.where(both, within >> 1, within)
+    times = starts[owner] + offsets
+    types = np.where(spans[owner] == 1, TYPE_TAP, np.where(offsets == 0, TYPE_HOLD_START, TYPE_HOLD_MID))
+    tracks = np.where(both, within & 1, owner_lanes)
+
+    chart = Chart(int(bpm))
+    chart.times.frombytes(times.astype(np.int32).tobytes())
+    chart.types.frombytes(types.astype(np.uint8).tobytes())
+    chart.tracks.frombytes(tracks.astype(np.uint8).tobytes())
+    return chart
+
+
+def write_chart_text(chart: Chart, output_path: Path):
+    """分块格式化并写出谱面 TXT。"""
+    names = [NOTE_TYPE_NAMES.get(code, "") for code in range(4)]
+    times, types, tracks = chart.times, chart.types, chart.tracks
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(f"bpm={chart.bpm}\n")
+        for start in range(0, len(times), _WRITE_CHUNK):
+            end = start + _WRITE_CHUNK
+            f.write("".join(
+                f"({time_val},{names[code]},{track})\n"
+                for time_val, code, track in zip(times[start:end], types[start:end], tracks[start:end])
+            ))
+
+
+def generate_random_chart_np(
+    output_dir,
+    name="Random",
+    bpm=None,
+    length_seconds=None,
+    seed=None,
+    notes=None,
+    density_profile=None,
+    bpm_range=(150, 250),
+    length_range=(120, 180),
+    note_range=(1000, 1500),
+    tap_ratio=0.8,
+    hold_range=(3, 8),
+    output_format="txt",
+    check=False,
+):
+    """generate_random_chart 的向量化版本：notes 指定精确物量，density_profile 为各段相对密度。"""
+    if output_format not in RANDOM_CHART_OUTPUTS:
+        print(f"错误：未知的输出格式 {output_format}（可选 {', '.join(RANDOM_CHART_OUTPUTS)}）")
+        return None
+    rng = np.random.default_rng(seed)
+    output_bpm = bpm if bpm is not None else int(rng.integers(bpm_range[0], bpm_range[1] + 1))
+    output_len = length_seconds if length_seconds is not None else int(rng.integers(length_range[0], length_range[1] + 1))
+    target_notes = notes if notes is not None else int(rng.integers(note_range[0], note_range[1] + 1))
+    total_ticks = int(output_bpm * output_len * TICKS_PER_BEAT / 60)
+
+    try:
+        chart = build_random_chart_np(output_bpm, total_ticks, target_notes, rng, density_profile, tap_ratio, hold_range)
+    except ValueError as exc:
+        print(f"错误：{exc}")
+        return None
+    if check and not check_chart(chart, tag="generate_random_chart_np"):
+        return None
+
+    output_path = Path(output_dir) / f"{name}.txt"
+    cache_path = chart_cache_path(output_path)
+    try:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        if output_format != "chartbin":
+            write_chart_text(chart, output_path)
+        # 缓存在 TXT 之后写出，保证不比 TXT 旧
+        if output_format != "txt" and not write_chart_cache(chart, cache_path):
+            raise OSError(f"无法写入 {cache_path}")
+    except Exception as exc:
+        print(f"错误：无法写入文件 {output_path}: {exc}")
+        return None
+
+    print(
+        f"[generate_random_chart_np] bpm={output_bpm}, len={output_len}s, notes={len(chart)}, "
+        f"ticks={chart.duration}/{total_ticks}")
+    return cache_path if output_format == "chartbin" else output_path
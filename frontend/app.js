@@ -13,6 +13,10 @@ const state = {
 const BASE_PATH = detectBasePath();
 const PROTOCOL_URL = `${BASE_PATH}chart_analysis/outputs/protocol.json`;
 const ANALYSIS_ENDPOINT = `${BASE_PATH}chart_analysis/run`;
+const JOBS_ENDPOINT = `${BASE_PATH}jobs`;
+const EVENTS_URL = `${BASE_PATH}events`;
+const JOB_POLL_INTERVAL_MS = 500;
+const JOB_SSE_RECHECK_MS = 5000;
 const RANDOM_COVER = `${BASE_PATH}charts/Random/Random.png`;
 let chartAnalysisPromise = null;
 
@@ -143,8 +147,8 @@ async function fetchChartsFromBackend() {
       bpm: c.bpm || "?",
       duration: c.duration || "--:--",
       folder: ensureChartsFolder(c.folder, c.name),
-      analysisImages: (c.files || []).map((f) => `${BASE_PATH}chart_analysis/outputs/${f}`),
-      analysisSummary: c.summary ? `${BASE_PATH}chart_analysis/outputs/${c.summary}` : null,
+      analysisImages: (c.files || []).map((f) => analysisOutputUrl(c, f)),
+      analysisSummary: c.summary ? analysisOutputUrl(c, c.summary) : null,
       audio: normalizeAudioPath(c),
     }));
   } catch (err) {
@@ -158,6 +162,65 @@ async function fetchChartsFromBackend() {
   }
 }
 
+// 服务端事件流（SSE）：任务状态、分析/写入 ROM/播放器事件由后端推送，无需轮询
+let serverEvents = null;
+// protocol.json 中的 versions 为输出文件的内容哈希：带 ?v= 的请求由后端返回长期缓存头
+function analysisOutputUrl(entry, file, fallbackVersion) {
+  const version = entry.versions?.[file] ?? fallbackVersion;
+  const url = `${BASE_PATH}chart_analysis/outputs/${file}`;
+  return version ? `${url}?v=${encodeURIComponent(version)}` : url;
+}
+
+const jobWaiters = new Map(); // job id -> [resolve]
+
+function ensureServerEvents() {
+  if (serverEvents || typeof EventSource === "undefined") return serverEvents;
+  serverEvents = new EventSource(EVENTS_URL);
+  serverEvents.addEventListener("job", (e) => {
+    const job = JSON.parse(e.data);
+    if (job.status !== "done" && job.status !== "failed") return;
+    const waiters = jobWaiters.get(job.id) || [];
+    jobWaiters.delete(job.id);
+    waiters.forEach((resolve) => resolve(job));
+  });
+  ["chart_analyzed", "protocol_updated", "rom_written", "player_started", "player_playing", "player_stopped"].forEach((name) => {
+    serverEvents.addEventListener(name, (e) => console.log(`[frontend] event ${name}`, JSON.parse(e.data)));
+  });
+  return serverEvents;
+}
+
+function sleep(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+// 后台长任务（chart_analysis / chart_engine）提交后立即返回 job_id：
+// 优先等待 SSE 推送的 job 结束事件，偶尔查询一次 /jobs/<id> 兜底；不支持 SSE 时退回轮询
+async function waitForJob(data) {
+  if (!data || !data.job_id) return data;
+  const jobId = String(data.job_id);
+  const url = `${JOBS_ENDPOINT}/${encodeURIComponent(jobId)}`;
+  const finished = (job) => ({ success: job.success, message: job.message, job });
+  const sse = ensureServerEvents();
+  const pushed = sse
+    ? new Promise((resolve) => jobWaiters.set(jobId, [...(jobWaiters.get(jobId) || []), resolve]))
+    : null;
+  for (;;) {
+    const res = await fetch(url, { cache: "no-store" });
+    if (!res.ok) throw new Error(`job ${jobId} poll failed: ${res.status}`);
+    const { job } = await res.json();
+    if (job.status === "done" || job.status === "failed") {
+      jobWaiters.delete(jobId);
+      return finished(job);
+    }
+    if (pushed) {
+      const pushedJob = await Promise.race([pushed, sleep(JOB_SSE_RECHECK_MS).then(() => null)]);
+      if (pushedJob) return finished(pushedJob);
+    } else {
+      await sleep(JOB_POLL_INTERVAL_MS);
+    }
+  }
+}
+
 function triggerAnalysisForAllCharts() {
   return triggerChartAnalysisRun();
 }
@@ -176,7 +239,7 @@ function triggerChartAnalysisRun(statusEl = els.normalStatus) {
       if (!res.ok) {
         throw new Error(`chart_analysis run failed: ${res.status}`);
       }
-      const data = await res.json().catch(() => ({}));
+      const data = await waitForJob(await res.json().catch(() => ({})));
       if (data.success !== true) {
         throw new Error(data.message || "chart_analysis 返回失败");
       }
@@ -412,7 +475,7 @@ async function runChartEngine(chartName) {
   try {
     const res = await fetch(url, { method: "POST" });
     if (!res.ok) throw new Error(`process failed: ${res.status}`);
-    const data = await res.json().catch(() => ({}));
+    const data = await waitForJob(await res.json().catch(() => ({})));
     return data.success === true;
   } catch (err) {
     console.warn("runChartEngine failed", err);
@@ -518,13 +581,10 @@ function playMusicSync(chartName) {
     showToast("缺少曲目名称");
     return;
   }
-  // backend player: ensure单实例，先请求 stop 再启动
-  const url = `${BASE_PATH}music_sync/play?name=${encodeURIComponent(chartName)}`;
+  // backend player 常驻于服务进程：play 会替换当前播放，arm=1 表示等待空格开始
+  const url = `${BASE_PATH}music_sync/play?name=${encodeURIComponent(chartName)}&arm=1`;
   (async () => {
     try {
-      // 先尝试停止已有的任务（若无则忽略）
-      await fetch(`${BASE_PATH}music_sync/stop`, { method: "POST" }).catch(() => {});
-
       const res = await fetch(url, { method: "POST" });
       const data = await res.json().catch(() => ({}));
       if (!res.ok || data.success !== true) {
@@ -559,12 +619,8 @@ async function loadRandomPreview() {
     const entry = protocol.charts?.find((c) => c.name === "Random");
     if (!entry) throw new Error("no Random entry in protocol");
     const cacheBust = Date.now();
-    const images = (entry.files || []).map(
-      (f) => `${BASE_PATH}chart_analysis/outputs/${f}?t=${cacheBust}`
-    );
-    const summaryUrl = entry.summary
-      ? `${BASE_PATH}chart_analysis/outputs/${entry.summary}?t=${cacheBust}`
-      : null;
+    const images = (entry.files || []).map((f) => analysisOutputUrl(entry, f, cacheBust));
+    const summaryUrl = entry.summary ? analysisOutputUrl(entry, entry.summary, cacheBust) : null;
     renderPreviewImages(images, els.randomPreview);
     renderSummary(summaryUrl, els.randomData);
     if (els.randomMeta) {
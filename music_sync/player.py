@@ -2,14 +2,20 @@
 主要接口：listen_and_play(chart_name_or_path)
 - 有音频：播放对应 mp3；
 - 无音频：解析谱面 txt，以谱面时间线做节拍（含 hold/tap），不再回退固定节拍；
-- 再次按空格可结束监听并停止当前播放。
+- 再次按空格可结束监听并停止当前播放；
+- 离线渲染：把谱面节拍整体混成一段 PCM 写入 WAV（--render），或播放渲染结果代替实时触发（--offline）；
+- PlaybackController：常驻进程内的 play / stop / seek 控制，供 server.py 直接调用。
 """
+import json
 import os
 import sys
 import time
 import math
+import queue
 import threading
-from array import array
+import wave
+from collections import OrderedDict
+import numpy as np
 import pygame
 import keyboard
 
@@ -21,8 +27,34 @@ except Exception:  # pragma: no cover - 非 Windows 环境
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TICKS_PER_BEAT = 4
 
+# 与 chart_engine / chart_analysis 共用同一个谱面解析器
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+from chart_engine.chart_parser import TYPE_HOLD_MID, TYPE_HOLD_START, TYPE_TAP, ChartFormatError, load_chart
+
 pygame_inited = False
-CLICK_SOUND = None
+CLICK_SOUNDS = {}  # 音色组合 ((类型, 轨道), ...) → 预混好的 pygame Sound
+CLICK_SAMPLE_RATE = 44100
+# 音色：类型 → (基频 Hz, 时长 s, 音量, 衰减时间常数 s)；轨道 1 在基频上升高纯五度
+CLICK_VOICES = {
+    TYPE_TAP: (880.0, 0.06, 0.4, 0.02),
+    TYPE_HOLD_START: (660.0, 0.09, 0.4, 0.04),
+    TYPE_HOLD_MID: (440.0, 0.03, 0.15, 0.01),
+}
+TRACK_PITCH = (1.0, 1.5)
+DEFAULT_VOICE = (TYPE_TAP, 0)
+SAMPLE_BANK_DIR = os.path.join(BASE_DIR, "assets")
+_SAMPLE_BANK_VERSION = 1
+_SAMPLE_BANKS = {}
+REPORT_SYNC = False  # --report-sync：输出 [SYNC] 状态行，供 server.py 转为 SSE 事件
+SPIN_MARGIN = 0.002  # 节拍调度：触发前最后 2ms 自旋等待
+SPIN_MARGIN_MAX = 0.02
+DEBOUNCE_SECONDS = 0.05  # 两次有效按下的最小间隔，滤除按键抖动
+
+
+def _report_sync(event, **data):
+    """输出一行机器可读的播放状态（JSON），仅在 --report-sync 时启用。"""
+    if REPORT_SYNC:
+        print("[SYNC] " + json.dumps({"event": event, **data}, ensure_ascii=False), flush=True)
 
 
 def _init_pygame():
@@ -37,7 +69,16 @@ def _init_pygame():
             pygame_inited = False
 
 
-def _play_async(path):
+def _log_start_latency(mode, pressed_at):
+    """记录按键（钩子捕获时刻）到实际开始播放的延迟。"""
+    if pressed_at is None:
+        return
+    latency_ms = round((time.time() - pressed_at) * 1000, 3)
+    print(f"[INFO] 按键→开始播放延迟：{latency_ms}ms（{mode}）")
+    _report_sync("start_latency", mode=mode, latency_ms=latency_ms)
+
+
+def _play_async(path, pressed_at=None):
     """后台播放 MP3，避免阻塞键盘监听。"""
     if not os.path.exists(path):
         print(f"[ERROR] 音频文件不存在：{path}")
@@ -48,6 +89,7 @@ def _play_async(path):
         try:
             pygame.mixer.music.load(path)
             pygame.mixer.music.play()
+            _log_start_latency("audio", pressed_at)
         except Exception as e:
             print(f"[ERROR] 播放失败：{e}")
 
@@ -68,46 +110,30 @@ def _tick_to_seconds(tick, bpm):
 
 
 def _parse_chart(chart_path):
-    """解析谱面，返回 bpm 和所有事件时间（tick）。"""
+    """解析谱面，返回 bpm、按时间排序的事件时间（tick）及对应音色 (类型, 轨道)。"""
     if not os.path.exists(chart_path):
-        return None, []
+        return None, [], []
     try:
-        with open(chart_path, "r", encoding="utf-8") as f:
-            lines = [ln.strip() for ln in f.readlines() if ln.strip()]
+        chart = load_chart(chart_path)
+    except ChartFormatError as exc:
+        print(f"[WARN] 谱面格式错误: {exc}")
+        return None, [], []
     except Exception as exc:
         print(f"[WARN] 读取谱面失败: {exc}")
-        return None, []
-    if not lines or not lines[0].startswith("bpm="):
-        print("[WARN] 谱面缺少 bpm= 头部")
-        return None, []
-    try:
-        bpm = float(lines[0].split("=", 1)[1])
-        if bpm <= 0:
-            raise ValueError("bpm <= 0")
-    except Exception as exc:
-        print(f"[WARN] 解析 BPM 失败: {exc}")
-        bpm = None
-
-    events = []
-    for ln in lines[1:]:
-        if not (ln.startswith("(") and ln.endswith(")")):
-            continue
-        body = ln[1:-1]
-        parts = [p.strip() for p in body.split(",")]
-        if len(parts) != 3:
-            continue
-        try:
-            tick = int(parts[0])
-        except Exception:
-            continue
-        events.append(tick)
-    events.sort()
-    return bpm, events
-
-
-def _beep():
-    """简易节拍提示音，优先用 pygame click，其次 winsound，再退控制台铃声。"""
-    snd = _get_click_sound()
+        return None, [], []
+    bpm = float(chart.bpm) if chart.bpm > 0 else None
+    if bpm is None:
+        print("[WARN] 解析 BPM 失败: bpm <= 0")
+    times = np.asarray(chart.times, dtype=np.int64)
+    order = np.argsort(times, kind="stable")
+    types = np.asarray(chart.types, dtype=np.int64)[order]
+    tracks = np.asarray(chart.tracks, dtype=np.int64)[order]
+    return bpm, times[order].tolist(), list(zip(types.tolist(), tracks.tolist()))
+
+
+def _beep(voices=(DEFAULT_VOICE,)):
+    """简易节拍提示音，优先用 pygame click（按音色组合预混），其次 winsound，再退控制台铃声。"""
+    snd = _get_click_sound(voices)
     if snd is not None:
         try:
             snd.play()
@@ -125,64 +151,278 @@ def _beep():
     sys.stdout.flush()
 
 
-def _get_click_sound():
-    """生成/缓存一个短促的点击音，用于无 mp3 的节拍提示。"""
-    global CLICK_SOUND
-    if CLICK_SOUND is not None:
-        return CLICK_SOUND
+def _synthesize_click(freq, duration, volume, decay, sample_rate):
+    """指数衰减的正弦点击音，int16 PCM。"""
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    return (volume * 32767 * np.sin(2 * np.pi * freq * t) * np.exp(-t / decay)).astype(np.int16)
+
+
+def _sample_bank_spec(sample_rate):
+    """音色参数的规范化描述，磁盘缓存与之不一致时重新合成。"""
+    return json.dumps(
+        {"version": _SAMPLE_BANK_VERSION, "rate": sample_rate, "voices": sorted(CLICK_VOICES.items()),
+         "pitch": TRACK_PITCH},
+        sort_keys=True,
+    )
+
+
+def _read_sample_bank(path, spec):
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["spec"]) != spec:
+                return None
+            return {(code, track): data[f"{code}_{track}"] for code in CLICK_VOICES for track in range(len(TRACK_PITCH))}
+    except Exception:
+        return None
+
+
+def _write_sample_bank(path, spec, bank):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, spec=np.array(spec), **{f"{code}_{track}": pcm for (code, track), pcm in bank.items()})
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        print(f"[WARN] 音色库缓存写入失败：{exc}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def load_sample_bank(sample_rate=CLICK_SAMPLE_RATE):
+    """(类型, 轨道) → int16 PCM 的音色库。
+
+    每个采样率只构建一次：优先读取 assets/click_bank_<rate>.npz，参数不符或不存在时合成并写回。
+    """
+    bank = _SAMPLE_BANKS.get(sample_rate)
+    if bank is not None:
+        return bank
+    path = os.path.join(SAMPLE_BANK_DIR, f"click_bank_{sample_rate}.npz")
+    spec = _sample_bank_spec(sample_rate)
+    bank = _read_sample_bank(path, spec)
+    if bank is None:
+        bank = {
+            (code, track): _synthesize_click(freq * pitch, duration, volume, decay, sample_rate)
+            for code, (freq, duration, volume, decay) in CLICK_VOICES.items()
+            for track, pitch in enumerate(TRACK_PITCH)
+        }
+        _write_sample_bank(path, spec, bank)
+    _SAMPLE_BANKS[sample_rate] = bank
+    return bank
+
+
+def _mix_voices(voices, sample_rate):
+    """把同一时刻的多个音色叠加为一段 int16 PCM。"""
+    bank = load_sample_bank(sample_rate)
+    parts = [bank.get(voice, bank[DEFAULT_VOICE]) for voice in voices]
+    mix = np.zeros(max(len(part) for part in parts), dtype=np.int32)
+    for part in parts:
+        mix[:len(part)] += part
+    return np.clip(mix, -32768, 32767).astype(np.int16)
+
+
+def _get_click_sound(voices=(DEFAULT_VOICE,)):
+    """取出/生成某个音色组合的预混点击音（按 mixer 的采样率与声道数）。"""
+    snd = CLICK_SOUNDS.get(voices)
+    if snd is not None:
+        return snd
     _init_pygame()
     if not pygame_inited:
         return None
     try:
-        sample_rate = 44100
-        duration = 0.06  # 秒
-        freq = 880
-        volume = 0.4
-        total_samples = int(sample_rate * duration)
-        samples = array("h")
-        for n in range(total_samples):
-            val = int(volume * 32767 * math.sin(2 * math.pi * freq * n / sample_rate))
-            samples.append(val)
-        snd = pygame.mixer.Sound(buffer=samples.tobytes())
-        CLICK_SOUND = snd
+        sample_rate, _size, channels = pygame.mixer.get_init()
+        pcm = np.repeat(_mix_voices(voices, sample_rate), channels)  # 单声道复制为交错多声道
+        snd = pygame.mixer.Sound(buffer=pcm.tobytes())
+        CLICK_SOUNDS[voices] = snd
         return snd
     except Exception as exc:
         print(f"[WARN] 生成点击音失败：{exc}")
         return None
 
 
-def _play_timeline(chart_name, bpm, ticks, stop_evt):
-    """根据谱面时间线输出节拍，支持空格停止。"""
+def _group_ticks(ticks, voices):
+    """将已排序的事件合并为 [(tick, 音色组合)]，同一 tick 的多个事件预混为一次触发。"""
+    groups = []
+    for tick, voice in zip(ticks, voices):
+        if groups and groups[-1][0] == tick:
+            groups[-1][1].append(voice)
+        else:
+            groups.append((tick, [voice]))
+    return [(tick, tuple(sorted(group))) for tick, group in groups]
+
+
+class _TimerResolution:
+    """Windows 下把系统定时器精度提到 1ms（timeBeginPeriod），退出时恢复；其他平台无操作。"""
+
+    def __enter__(self):
+        self._winmm = None
+        if sys.platform.startswith("win"):
+            try:
+                import ctypes
+                self._winmm = ctypes.WinDLL("winmm")
+                self._winmm.timeBeginPeriod(1)
+            except Exception:
+                self._winmm = None
+        return self
+
+    def __exit__(self, *exc):
+        if self._winmm is not None:
+            self._winmm.timeEndPeriod(1)
+
+
+def _wait_until(deadline, stop_evt, margin):
+    """先阻塞睡眠到 deadline - margin，再自旋到 deadline；返回 (是否被停止, 睡眠超时量秒)。"""
+    clock = time.perf_counter
+    oversleep = 0.0
+    remaining = deadline - clock()
+    if remaining > margin:
+        wake_at = deadline - margin
+        if stop_evt.wait(remaining - margin):
+            return True, 0.0
+        oversleep = max(clock() - wake_at, 0.0)
+    while clock() < deadline:
+        pass
+    return stop_evt.is_set(), oversleep
+
+
+def _jitter_stats(errors):
+    """触发误差（实际 - 计划，秒）的统计，单位毫秒。"""
+    if not errors:
+        return {"events": 0}
+    ordered = sorted(abs(err) for err in errors)
+    mean = sum(errors) / len(errors)
+    std = math.sqrt(sum((err - mean) ** 2 for err in errors) / len(errors))
+
+    def pct(q):
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000
+
+    return {
+        "events": len(errors),
+        "mean_ms": round(mean * 1000, 4),
+        "std_ms": round(std * 1000, 4),
+        "p50_ms": round(pct(0.5), 4),
+        "p99_ms": round(pct(0.99), 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+    }
+
+
+def _play_timeline(chart_name, bpm, ticks, voices, stop_evt, pressed_at=None):
+    """根据谱面时间线输出节拍，支持空格停止。
+
+    调度：各触发点按起始时刻的绝对时间计算（误差不累积）；每次先睡眠到触发前 margin，
+    再自旋到触发时刻。margin 初始为 SPIN_MARGIN，睡眠实际超时较大时（如粗粒度系统定时器）自动放宽。
+    同一 tick 的事件预混为一次触发，结束时输出触发抖动统计。
+    """
     if not ticks:
         print("[INFO] 谱面无事件，使用均匀节拍。")
         ticks = list(range(0, 64 * TICKS_PER_BEAT, TICKS_PER_BEAT))
+        voices = [DEFAULT_VOICE] * len(ticks)
     use_bpm = bpm if bpm and bpm > 0 else 120.0
-    start = time.monotonic()
-    for tick in ticks:
-        if stop_evt.is_set():
-            break
-        target = _tick_to_seconds(tick, use_bpm)
-        # 睡眠到事件时间
-        while True:
-            if stop_evt.is_set():
-                break
-            now = time.monotonic() - start
-            delta = target - now
-            if delta <= 0:
+    groups = _group_ticks(ticks, voices)
+    # 预先生成全部音色组合，避免触发点承担合成开销
+    for combo in set(combo for _, combo in groups):
+        _get_click_sound(combo)
+    margin = SPIN_MARGIN
+    errors = []
+    last_beat = None
+    with _TimerResolution():
+        start = time.perf_counter()
+        _log_start_latency("timeline", pressed_at)
+        for tick, combo in groups:
+            target = _tick_to_seconds(tick, use_bpm)
+            stopped, oversleep = _wait_until(start + target, stop_evt, margin)
+            if stopped:
                 break
-            time.sleep(min(delta, 0.01))
-        if stop_evt.is_set():
-            break
-        _beep()
+            fired = time.perf_counter()
+            _beep(combo)
+            errors.append(fired - start - target)
+            margin = min(max(margin, oversleep * 1.5), SPIN_MARGIN_MAX)
+            beat = tick // TICKS_PER_BEAT
+            if beat != last_beat:
+                last_beat = beat
+                _report_sync("beat", beat=beat, tick=tick, seconds=round(target, 4))
+    stats = _jitter_stats(errors)
+    stats["spin_margin_ms"] = round(margin * 1000, 3)
     print(f"[INFO] 谱面节拍结束：{chart_name}")
+    print(f"[INFO] 触发抖动：{stats}")
+    _report_sync("timeline_end", jitter=stats)
 
 
-def listen_and_play(chart_name):
-    """
-    监听键盘：
-      - 第一次按空格：若有音频则播放音频，否则解析谱面按节拍播放；
-      - 再按空格：停止当前播放并退出监听。
+def render_timeline(bpm, ticks, sample_rate=CLICK_SAMPLE_RATE, voices=None):
+    """把整条谱面节拍混成一段单声道 int16 PCM。
+
+    每个事件的起点按 _tick_to_seconds 换算为精确的采样偏移，按音色（类型, 轨道）分别混入；
+    同一 tick 的事件叠加。混音按点击音的采样下标逐列累加，每次处理该音色的全部触发点，
+    内存只随 PCM 长度增长。
     """
+    use_bpm = bpm if bpm and bpm > 0 else 120.0
+    if not len(ticks):
+        return np.zeros(0, dtype=np.int16)
+    bank = load_sample_bank(sample_rate)
+    seconds = np.asarray(ticks, dtype=np.float64) / TICKS_PER_BEAT * (60.0 / use_bpm)
+    all_offsets = np.rint(seconds * sample_rate).astype(np.int64)
+    if voices is None:
+        voices = [DEFAULT_VOICE] * len(ticks)
+    voice_ids = np.array([code * 2 + track for code, track in voices], dtype=np.int64)
+    mix = np.zeros(int(all_offsets.max()) + max(len(pcm) for pcm in bank.values()), dtype=np.float32)
+    for voice_id in np.unique(voice_ids):
+        voice = (int(voice_id) >> 1, int(voice_id) & 1)
+        click = bank.get(voice, bank[DEFAULT_VOICE]).astype(np.float32)
+        offsets, counts = np.unique(all_offsets[voice_ids == voice_id], return_counts=True)
+        weights = counts.astype(np.float32)
+        # offsets 互不相同，同一列内的花式索引累加不会冲突
+        for j, value in enumerate(click):
+            mix[offsets + j] += weights * value
+    return np.clip(mix, -32768, 32767).astype(np.int16)
+
+
+def write_wav(path, pcm, sample_rate=CLICK_SAMPLE_RATE):
+    """写出单声道 16bit WAV。"""
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.astype("<i2").tobytes())
+
+
+def render_chart_wav(chart_path, output_path=None, sample_rate=None):
+    """离线渲染谱面节拍到 WAV（默认 <谱面>.click.wav），返回输出路径；谱面无效返回 None。"""
+    bpm, ticks, voices = _parse_chart(chart_path)
+    if bpm is None:
+        return None
+    if sample_rate is None:
+        # 与 mixer 采样率一致时 pygame 载入无需重采样
+        mixer_init = pygame.mixer.get_init() if pygame_inited else None
+        sample_rate = mixer_init[0] if mixer_init else CLICK_SAMPLE_RATE
+    output_path = output_path or os.path.splitext(chart_path)[0] + ".click.wav"
+    start = time.perf_counter()
+    pcm = render_timeline(bpm, ticks, sample_rate, voices)
+    write_wav(output_path, pcm, sample_rate)
+    print(
+        f"[INFO] 离线渲染：{len(ticks)} 个事件，{len(pcm) / sample_rate:.2f}s @ {sample_rate}Hz，"
+        f"耗时 {(time.perf_counter() - start) * 1000:.1f}ms → {output_path}"
+    )
+    return output_path
+
+
+def _load_rendered_sound(chart_path):
+    """渲染谱面节拍并载入为单个 pygame Sound（由 pygame 转换为 mixer 的声道/格式）。"""
+    _init_pygame()
+    if not pygame_inited:
+        return None
+    wav_path = render_chart_wav(chart_path)
+    if wav_path is None:
+        return None
+    try:
+        return pygame.mixer.Sound(wav_path)
+    except Exception as exc:
+        print(f"[WARN] 载入渲染结果失败：{exc}")
+        return None
+
+
+def _resolve_inputs(chart_name):
+    """曲目名或路径 → (音频路径, 谱面路径)，均可能为 None。"""
     audio_path = None
     chart_path = None
 
@@ -204,9 +444,97 @@ def listen_and_play(chart_name):
             print(f"[INFO] 未找到音频，改用谱面节拍：{chart_path}")
         else:
             print(f"[WARN] 未找到音频或谱面，使用默认节拍（120 BPM）。")
+    return audio_path, chart_path
+
 
+class SpaceInput:
+    """事件驱动的空格输入：键盘钩子（keyboard.on_press_key / on_release_key）把按下/松开送入去抖状态机，
+    有效按下以捕获时间戳放入队列，主循环阻塞在队列上，不再轮询。
+
+    状态机：IDLE --按下--> HELD（输出一次按下）--松开--> IDLE；HELD 期间的自动重复按下、
+    以及距上次有效按下不足 DEBOUNCE_SECONDS 的抖动都被丢弃。
+    无法挂载键盘钩子时（如 Linux 非 root）改为读取标准输入，每行回车视为一次按下并松开。
+    """
+
+    def __init__(self):
+        self.source = None
+        self._presses = queue.Queue()
+        self._lock = threading.Lock()
+        self._held = False
+        self._last_accept = float("-inf")
+        self._hooks = []
+
+    def start(self):
+        try:
+            self._hooks = [
+                keyboard.on_press_key("space", self._on_key),
+                keyboard.on_release_key("space", self._on_key),
+            ]
+            self.source = "keyboard"
+        except Exception as exc:
+            print(f"[WARN] 无法挂载键盘钩子（{exc}），改用标准输入：回车代替空格")
+            threading.Thread(target=self._read_stdin, name="music-sync-stdin", daemon=True).start()
+            self.source = "stdin"
+        return self.source
+
+    def stop(self):
+        for hook in self._hooks:
+            try:
+                keyboard.unhook(hook)
+            except Exception:
+                pass
+        self._hooks = []
+
+    def get(self, timeout=None):
+        """等待下一次有效按下，返回其捕获时间戳（time.time），超时返回 None。"""
+        try:
+            return self._presses.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _on_key(self, event):
+        # 运行在 keyboard 的监听线程：只更新状态，不做其他工作
+        self._feed(event.event_type == keyboard.KEY_DOWN, event.time or time.time())
+
+    def _read_stdin(self):
+        for _line in sys.stdin:
+            stamp = time.time()
+            self._feed(True, stamp)
+            self._feed(False, stamp)
+
+    def _feed(self, down, stamp):
+        with self._lock:
+            if not down:
+                self._held = False
+                return
+            if self._held or stamp - self._last_accept < DEBOUNCE_SECONDS:
+                return
+            self._held = True
+            self._last_accept = stamp
+        self._presses.put(stamp)
+
+
+def listen_and_play(chart_name, offline=False):
+    """
+    监听键盘：
+      - 第一次按空格：若有音频则播放音频，否则解析谱面按节拍播放；
+      - 再按空格：停止当前播放并退出监听。
+    offline=True 时谱面节拍在监听前整体渲染为一个 Sound，按空格直接播放，时序不受 Python 调度影响。
+    """
+    audio_path, chart_path = _resolve_inputs(chart_name)
+    rendered = _load_rendered_sound(chart_path) if offline and chart_path and not audio_path else None
+    timeline = None
+    if not audio_path and rendered is None:
+        # 谱面与音色库在监听前准备好，按下空格时不再解析/合成
+        timeline = _parse_chart(chart_path) if chart_path else (None, [], [])
+        _init_pygame()
+        if pygame_inited:
+            load_sample_bank(pygame.mixer.get_init()[0])
+
+    space = SpaceInput()
+    key_name = "回车" if space.start() == "stdin" else "空格"
     print("\n=== Music Sync Start ===")
-    print("首次空格：播放；再次空格：停止并退出；Ctrl+C 强退\n")
+    print(f"首次{key_name}：播放；再次{key_name}：停止并退出；Ctrl+C 强退\n")
 
     playing = False
     stop_evt = threading.Event()
@@ -214,47 +542,272 @@ def listen_and_play(chart_name):
 
     try:
         while True:
-            if keyboard.is_pressed("space"):
-                if not playing:
-                    print("[EVENT] SPACE → 开始播放")
-                    playing = True
-                    stop_evt.clear()
-                    if audio_path:
-                        _play_async(audio_path)
-                    else:
-                        bpm, ticks = _parse_chart(chart_path) if chart_path else (None, [])
-                        timeline_thread = threading.Thread(
-                            target=_play_timeline,
-                            args=(chart_name, bpm, ticks, stop_evt),
-                            daemon=True,
-                        )
-                        timeline_thread.start()
+            # 带超时等待，保证 Windows 下 Ctrl+C 能及时生效
+            pressed_at = space.get(timeout=0.5)
+            if pressed_at is None:
+                continue
+            if not playing:
+                print("[EVENT] SPACE → 开始播放")
+                playing = True
+                stop_evt.clear()
+                if audio_path:
+                    _report_sync("playing", mode="audio", audio=os.path.basename(audio_path))
+                    _play_async(audio_path, pressed_at)
+                elif rendered is not None:
+                    rendered.play()
+                    _log_start_latency("offline", pressed_at)
+                    _report_sync("playing", mode="offline", seconds=round(rendered.get_length(), 3))
                 else:
-                    print("[EVENT] SPACE → 停止并退出")
-                    stop_evt.set()
-                    _stop_music()
-                    if timeline_thread and timeline_thread.is_alive():
-                        timeline_thread.join(timeout=1.0)
-                    break
-                time.sleep(0.35)  # 去抖动
-            time.sleep(0.01)
+                    bpm, ticks, voices = timeline
+                    _report_sync("playing", mode="timeline", bpm=bpm, events=len(ticks))
+                    timeline_thread = threading.Thread(
+                        target=_play_timeline,
+                        args=(chart_name, bpm, ticks, voices, stop_evt, pressed_at),
+                        daemon=True,
+                    )
+                    timeline_thread.start()
+            else:
+                print("[EVENT] SPACE → 停止并退出")
+                _report_sync("stopping")
+                stop_evt.set()
+                _stop_music()
+                if rendered is not None:
+                    rendered.stop()
+                if timeline_thread and timeline_thread.is_alive():
+                    timeline_thread.join(timeout=1.0)
+                break
     except KeyboardInterrupt:
         stop_evt.set()
         _stop_music()
+        if rendered is not None:
+            rendered.stop()
         if timeline_thread and timeline_thread.is_alive():
             timeline_thread.join(timeout=1.0)
         print("\n退出监听。")
+    finally:
+        space.stop()
+
+
+class PlaybackController:
+    """常驻的播放控制，供 server.py 在进程内调用，替代每次播放都启动 player.py 子进程。
+
+    mixer 只初始化一次；曲目音频保持在 mixer.music 中，谱面节拍离线渲染为 mixer 格式的 PCM，
+    按 (路径, mtime) 做 LRU 缓存，play / seek / stop 都只是 mixer 调用。arm=True 时等待下一次
+    空格（SpaceInput）才开始播放、再按一次停止，与命令行流程一致。
+    状态变化通过 on_event(event, data) 上报，事件名与 --report-sync 的 [SYNC] 行一致。
+    """
+
+    def __init__(self, on_event=None, cache_size=4):
+        self.on_event = on_event or (lambda event, data: None)
+        self._lock = threading.RLock()
+        self._rendered = OrderedDict()
+        self._cache_size = cache_size
+        self._mixer = None
+        self._loaded_music = None
+        self._space = None
+        self._session = 0
+        self._state = "idle"  # idle / armed / playing
+        self._source = None
+        self._offset = 0.0  # 当前播放段在曲目中的起点（秒）
+        self._started_at = None
+        self._sound = None
+
+    def warmup(self):
+        """初始化 mixer 并按 mixer 采样率准备音色库；mixer 不可用时抛出 RuntimeError。"""
+        _init_pygame()
+        if not pygame_inited:
+            raise RuntimeError("pygame mixer 初始化失败")
+        self._mixer = pygame.mixer.get_init()
+        load_sample_bank(self._mixer[0])
+
+    def _emit(self, event, **data):
+        self.on_event(event, {"name": (self._source or {}).get("name"), **data})
+
+    def _timeline_buffer(self, chart_path):
+        """渲染（或从缓存取出）谱面节拍，返回交错为 mixer 声道数的 int16 PCM 及其时长。"""
+        rate, _size, channels = self._mixer
+        key = (chart_path, os.stat(chart_path).st_mtime_ns, rate, channels)
+        entry = self._rendered.get(key)
+        if entry is not None:
+            self._rendered.move_to_end(key)
+            return entry
+        bpm, ticks, voices = _parse_chart(chart_path)
+        if bpm is None:
+            raise ValueError(f"谱面无效：{chart_path}")
+        pcm = render_timeline(bpm, ticks, rate, voices)
+        entry = {"pcm": np.repeat(pcm, channels), "bpm": bpm, "duration": len(pcm) / rate}
+        self._rendered[key] = entry
+        while len(self._rendered) > self._cache_size:
+            self._rendered.popitem(last=False)
+        return entry
+
+    def play(self, chart_name, position=0.0, arm=False):
+        """切换到 chart_name 并从 position 秒开始播放（arm=True 时等待空格），返回状态。"""
+        if self._mixer is None:
+            self.warmup()
+        audio_path, chart_path = _resolve_inputs(chart_name)
+        if audio_path is None and chart_path is None:
+            raise FileNotFoundError(f"未找到 {chart_name} 的音频或谱面")
+        with self._lock:
+            self._stop_locked("replaced")
+            if audio_path:
+                if self._loaded_music != audio_path:
+                    pygame.mixer.music.load(audio_path)
+                    self._loaded_music = audio_path
+                source = {"name": chart_name, "mode": "audio", "path": audio_path, "duration": None}
+            else:
+                buffer = self._timeline_buffer(chart_path)
+                source = {"name": chart_name, "mode": "timeline", "path": chart_path, **buffer}
+            source["armed"] = arm
+            self._source = source
+            self._offset = max(float(position), 0.0)
+            self._emit("started", mode=source["mode"], armed=arm)
+            if arm:
+                self._state = "armed"
+                self._ensure_space_input()
+                self._emit("armed", key=self._space.source)
+            else:
+                self._begin_locked()
+            return self.status()
+
+    def seek(self, position):
+        """跳转到 position 秒；未开始（armed）时只修改起点。"""
+        with self._lock:
+            if self._state == "idle":
+                raise RuntimeError("当前没有播放")
+            position = max(float(position), 0.0)
+            duration = self._source["duration"]
+            if duration is not None and position >= duration:
+                raise ValueError(f"位置超出时长 {duration:.3f}s")
+            self._offset = position
+            if self._state == "playing":
+                self._begin_locked(restart=True)
+            self._emit("seek", position=round(position, 4))
+            return self.status()
+
+    def stop(self):
+        """停止当前播放，返回是否有正在进行的播放。"""
+        with self._lock:
+            return self._stop_locked("stopped")
+
+    def status(self):
+        with self._lock:
+            source = self._source or {}
+            return {
+                "state": self._state,
+                "name": source.get("name"),
+                "mode": source.get("mode"),
+                "armed": source.get("armed", False),
+                "position": round(self._position_locked(), 4),
+                "duration": source.get("duration"),
+            }
+
+    def _position_locked(self):
+        if self._state != "playing":
+            return self._offset
+        return self._offset + time.perf_counter() - self._started_at
+
+    def _begin_locked(self, pressed_at=None, restart=False):
+        source = self._source
+        if source["mode"] == "audio":
+            pygame.mixer.music.play(start=self._offset)
+        else:
+            if self._sound is not None:
+                self._sound.stop()
+            rate, _size, channels = self._mixer
+            # Sound 复制缓冲区，切片本身不复制
+            self._sound = pygame.mixer.Sound(buffer=source["pcm"][int(self._offset * rate) * channels:])
+            self._sound.play()
+        self._started_at = time.perf_counter()
+        if restart:
+            return
+        self._state = "playing"
+        if pressed_at is not None:
+            latency_ms = round((time.time() - pressed_at) * 1000, 3)
+            print(f"[INFO] 按键→开始播放延迟：{latency_ms}ms（{source['mode']}）")
+            self._emit("start_latency", mode=source["mode"], latency_ms=latency_ms)
+        self._emit("playing", mode=source["mode"], position=round(self._offset, 4), duration=source["duration"])
+        threading.Thread(target=self._monitor, args=(self._session,), name="music-sync-monitor", daemon=True).start()
+
+    def _stop_locked(self, reason):
+        if self._state == "idle":
+            return False
+        if self._sound is not None:
+            self._sound.stop()
+            self._sound = None
+        _stop_music()
+        duration = self._source["duration"]
+        position = self._position_locked()
+        self._offset = min(position, duration) if duration is not None else position
+        self._state = "idle"
+        self._session += 1  # 让旧的监视线程退出
+        self._emit("stopped", reason=reason)
+        return True
+
+    def _monitor(self, session):
+        """播放期间按拍上报 beat，播放结束时转为 idle。"""
+        last_beat = None
+        while True:
+            with self._lock:
+                if self._session != session:
+                    return
+                source = self._source
+                position = self._position_locked()
+                if source["mode"] == "audio":
+                    finished = not pygame.mixer.music.get_busy()
+                else:
+                    finished = position >= source["duration"]
+                if finished:
+                    if source["mode"] == "timeline":
+                        self._emit("timeline_end")
+                    self._stop_locked("finished")
+                    return
+            wait = 0.25
+            if source["mode"] == "timeline":
+                beat_seconds = 60.0 / source["bpm"]
+                beat = int(position / beat_seconds)
+                if beat != last_beat:
+                    last_beat = beat
+                    self._emit("beat", beat=beat, tick=beat * TICKS_PER_BEAT, seconds=round(position, 4))
+                wait = min((beat + 1) * beat_seconds - position, wait)
+            time.sleep(max(wait, 0.001))
+
+    def _ensure_space_input(self):
+        if self._space is None:
+            self._space = SpaceInput()
+            self._space.start()
+            threading.Thread(target=self._key_loop, name="music-sync-keys", daemon=True).start()
+
+    def _key_loop(self):
+        while True:
+            pressed_at = self._space.get()
+            with self._lock:
+                if self._state == "armed":
+                    self._begin_locked(pressed_at)
+                elif self._state == "playing" and self._source.get("armed"):
+                    self._stop_locked("key")
 
 
 def main():
     """
     调试入口：python music_sync/player.py songName
     例如：python music_sync/player.py Cthugha
+    --offline：播放离线渲染的节拍；--render[=out.wav]：只渲染 WAV 后退出。
     """
-    if len(sys.argv) < 2:
-        print("用法：python player.py <曲目名或路径>")
+    global REPORT_SYNC
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    REPORT_SYNC = "--report-sync" in flags
+    if not args:
+        print("用法：python player.py <曲目名或路径> [--report-sync] [--offline] [--render[=out.wav]]")
+        return
+    render = next((flag for flag in flags if flag == "--render" or flag.startswith("--render=")), None)
+    if render is not None:
+        _, chart_path = _resolve_inputs(args[0])
+        if chart_path is None or render_chart_wav(chart_path, render.partition("=")[2] or None) is None:
+            print("[ERROR] 离线渲染需要有效的谱面")
         return
-    listen_and_play(sys.argv[1])
+    listen_and_play(args[0], offline="--offline" in flags)
 
 
 if __name__ == "__main__":
@@ -2,24 +2,36 @@
 """Lightweight dev server for the MuseDash frontend with basic API hooks."""
 
 import argparse
+import asyncio
+import email.utils
+import gzip
+import hashlib
+import html
+import http.client
+import importlib
+import io
+import inspect
+import itertools
 import json
+import mimetypes
+import multiprocessing
 import os
+import posixpath
+import queue
 import subprocess
 import sys
 import time
 import urllib.parse
-from functools import partial
-from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
 from pathlib import Path
-from threading import Lock
+from collections import OrderedDict, deque
+from threading import Event, Lock, Thread
 
 ROOT = Path(__file__).resolve().parent
 QUARTUS_QSF = ROOT / "quartus" / "MuseDash.qsf"
 CHART_ANALYSIS_SCRIPT = ROOT / "chart_analysis" / "chart_analysis.py"
-MUSIC_SYNC_SCRIPT = ROOT / "music_sync" / "player.py"
-ANALYSIS_LOCK = Lock()
 MUSIC_SYNC_LOCK = Lock()
-MUSIC_SYNC_PROC = None
 
 
 def _open_with_system(path: Path):
@@ -38,194 +50,1085 @@ def _open_with_system(path: Path):
         return False, str(exc)
 
 
-class FrontendHandler(SimpleHTTPRequestHandler):
-    def do_POST(self):
-        parsed = urllib.parse.urlparse(self.path)
-        if parsed.path == "/quartus/open":
-            self._handle_open_quartus()
-            return
-        if parsed.path == "/chart_engine/process":
-            self._handle_chart_process(parsed)
-            return
-        if parsed.path == "/chart_engine/generate_random":
-            self._handle_generate_random()
-            return
-        if parsed.path == "/chart_analysis/run":
-            self._handle_chart_analysis_run()
-            return
-        if parsed.path == "/music_sync/play":
-            self._handle_music_sync(parsed)
-            return
-        if parsed.path == "/music_sync/stop":
-            self._handle_music_sync_stop()
-            return
-        self.send_error(404, "Unknown POST endpoint")
-
-    def _handle_open_quartus(self):
-        ok, msg = _open_with_system(QUARTUS_QSF)
-        status = 200 if ok else 500
-        self._respond_json({"success": ok, "message": msg}, status=status)
-
-    def _respond_json(self, payload, status=200):
-        data = json.dumps(payload).encode("utf-8")
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
-
-    def _handle_chart_analysis_run(self):
-        if not CHART_ANALYSIS_SCRIPT.exists():
-            self._respond_json({"success": False, "message": f"{CHART_ANALYSIS_SCRIPT.name} not found"}, status=500)
-            return
-        if not ANALYSIS_LOCK.acquire(blocking=False):
-            self._respond_json({"success": False, "message": "chart_analysis already running"}, status=409)
-            return
+class Request:
+    """A parsed HTTP/1.x request; ``headers`` is case-insensitive (``http.client.HTTPMessage``)."""
+
+    __slots__ = ("method", "target", "version", "path", "query", "qs", "headers", "body", "client")
+
+    def __init__(self, method: str, target: str, version: str, headers, client):
+        self.method = method
+        self.target = target
+        self.version = version
+        parts = urllib.parse.urlsplit(target)
+        self.path = parts.path
+        self.query = parts.query
+        self.qs = urllib.parse.parse_qs(parts.query)
+        self.headers = headers
+        self.body = b""
+        self.client = client
+
+
+class Response:
+    """Status and headers with a bytes body, a file body (sent with ``loop.sendfile``) or an async ``stream(writer)``."""
+
+    __slots__ = ("status", "headers", "body", "stream")
+
+    def __init__(self, status: int = 200, headers=(), body=b"", stream=None):
+        self.status = status
+        self.headers = list(headers)
+        self.body = body
+        self.stream = stream
+
+
+def json_response(payload, status: int = 200) -> Response:
+    return Response(status, [("Content-Type", "application/json")], json.dumps(payload).encode("utf-8"))
+
+
+def error_response(status: int, message: str) -> Response:
+    phrase = HTTPStatus(status).phrase
+    page = f"<html><head><title>{status} {phrase}</title></head><body><h1>{status} {phrase}</h1><p>{html.escape(message)}</p></body></html>"
+    return Response(status, [("Content-Type", "text/html; charset=utf-8")], page.encode("utf-8"))
+
+
+# ---- API endpoints: coroutines run on the event loop, plain functions run on BLOCKING_EXECUTOR ----
+
+def _handle_open_quartus(request: Request) -> Response:
+    ok, msg = _open_with_system(QUARTUS_QSF)
+    return json_response({"success": ok, "message": msg}, status=200 if ok else 500)
+
+
+async def _respond_job(job, coalesced: bool, wait: bool) -> Response:
+    """Reply 202 with the job id, or wait for the job (without holding a thread) when ?wait=1."""
+    if wait:
+        await job.wait_async()
+        status = 200 if job.success else 500
+        return json_response({"success": job.success, "message": job.message, "job": job.to_dict()}, status=status)
+    message = f"{job.kind} job {job.id} {'already ' if coalesced else ''}{job.status}"
+    return json_response(
+        {"success": True, "message": message, "job_id": job.id, "coalesced": coalesced, "job": job.to_dict()},
+        status=202,
+    )
+
+
+async def _handle_events(request: Request) -> Response:
+    """Server-sent events stream of EVENTS; honours Last-Event-ID so reconnects replay missed events."""
+    last_id = request.headers.get("Last-Event-ID")
+
+    async def stream(writer):
+        subscriber, backlog = EVENTS.subscribe(
+            asyncio.get_running_loop(),
+            int(last_id) if last_id and last_id.isdigit() else None,
+            on_overflow=writer.transport.abort,
+        )
         try:
-            print(f"[server] chart_analysis requested from {self.client_address}")
-            success, message = run_chart_analysis_script()
-            status = 200 if success else 500
-            self._respond_json({"success": success, "message": message}, status=status)
+            for event in backlog:
+                writer.write(event.encode())
+            await writer.drain()
+            while True:
+                try:
+                    chunk = (await asyncio.wait_for(subscriber.queue.get(), EVENT_KEEPALIVE_SECONDS)).encode()
+                except asyncio.TimeoutError:
+                    chunk = b": keepalive\n\n"
+                writer.write(chunk)
+                await writer.drain()
+        except ConnectionError:
+            pass
         finally:
-            ANALYSIS_LOCK.release()
+            EVENTS.unsubscribe(subscriber)
 
-    def _handle_generate_random(self):
-        try:
-            from chart_engine.chart_engine import generate_random_chart
-        except Exception as exc:
-            self._respond_json({"success": False, "message": f"import chart_engine failed: {exc}"}, status=500)
-            return
+    headers = [("Content-Type", "text/event-stream"), ("Cache-Control", "no-cache"), ("X-Accel-Buffering", "no")]
+    return Response(200, headers, stream=stream)
 
-        seed = time.time_ns()
-        charts_dir = ROOT / "charts" / "Random"
-        try:
-            output = generate_random_chart(
-                charts_dir,
-                name="Random",
-                bpm=None,
-                length_seconds=None,
-                seed=seed,
-            )
-        except Exception as exc:
-            self._respond_json({"success": False, "message": f"generate_random exception: {exc}"}, status=500)
-            return
-
-        if output is None:
-            self._respond_json({"success": False, "message": "generate_random failed (None)"}, status=500)
-            return
-
-        self._respond_json(
-            {
-                "success": True,
-                "message": f"generated {output.name} with seed={seed}",
-                "path": str(output),
-                "seed": seed,
-            }
-        )
 
-    def _handle_chart_process(self, parsed):
-        try:
-            from chart_engine.chart_engine import process_chart
-        except Exception as exc:
-            self._respond_json({"success": False, "message": f"import chart_engine failed: {exc}"}, status=500)
-            return
-
-        qs = urllib.parse.parse_qs(parsed.query)
-        chart_name = qs.get("name", [None])[0]
-        output_name = qs.get("output", ["ROM.v"])[0]
-        if not chart_name:
-            self._respond_json({"success": False, "message": "missing chart name"}, status=400)
-            return
+async def _handle_jobs(request: Request) -> Response:
+    job_id = request.path[len("/jobs"):].strip("/")
+    if not job_id:
+        return json_response({"success": True, "jobs": [job.to_dict() for job in JOBS.list()]})
+    job = JOBS.get(job_id)
+    if job is None:
+        return json_response({"success": False, "message": f"unknown job {job_id}"}, status=404)
+    return json_response({"success": True, "job": job.to_dict()})
 
-        try:
-            ok = process_chart(chart_name, output_filename=output_name)
-        except Exception as exc:
-            self._respond_json({"success": False, "message": f"process_chart exception: {exc}"}, status=500)
-            return
 
-        if not ok:
-            self._respond_json({"success": False, "message": f"process_chart failed for {chart_name}"}, status=500)
-            return
+async def _handle_chart_cache(request: Request) -> Response:
+    return json_response({"success": True, "cache": CHART_CACHE.stats()})
+
 
-        self._respond_json(
-            {"success": True, "message": f"processed {chart_name} -> verilog/{output_name}"}
+async def _handle_chart_cache_clear(request: Request) -> Response:
+    CHART_CACHE.clear()
+    return json_response({"success": True, "cache": CHART_CACHE.stats()})
+
+
+def _handle_chart_summary(request: Request) -> Response:
+    chart_name = request.qs.get("name", [None])[0]
+    if not chart_name:
+        return json_response({"success": False, "message": "missing chart name"}, status=400)
+    chart, summary, hit = CHART_CACHE.get(chart_name)
+    if chart is None:
+        return _chart_missing_response(chart_name)
+    return json_response({"success": True, "name": chart_name, "summary": summary, "cached": hit})
+
+
+def _chart_missing_response(chart_name: str) -> Response:
+    if CHART_CACHE.chart_path(chart_name).exists():
+        return json_response({"success": False, "message": f"chart {chart_name} failed chart_check"}, status=422)
+    return json_response({"success": False, "message": f"chart {chart_name} not found"}, status=404)
+
+
+async def _handle_chart_analysis_run(request: Request) -> Response:
+    if not CHART_ANALYSIS_SCRIPT.exists():
+        return json_response({"success": False, "message": f"{CHART_ANALYSIS_SCRIPT.name} not found"}, status=500)
+    qs = request.qs
+    chart_name = qs.get("name", [None])[0]
+    force = _query_flag(qs, "force")
+    print(f"[server] chart_analysis requested from {request.client} (chart={chart_name or '*'})")
+    key = f"{chart_name or '*'}{':force' if force else ''}"
+    job, coalesced = JOBS.submit(
+        "chart_analysis",
+        key,
+        {"name": chart_name, "force": force},
+        ANALYSIS_WORKER,
+        # a queued full run will also cover this chart
+        absorb_keys=("*:force",) if force else ("*", "*:force"),
+    )
+    return await _respond_job(job, coalesced, _query_flag(qs, "wait"))
+
+
+def _handle_generate_random(request: Request) -> Response:
+    try:
+        from chart_engine.chart_engine import generate_random_chart
+    except Exception as exc:
+        return json_response({"success": False, "message": f"import chart_engine failed: {exc}"}, status=500)
+
+    seed = time.time_ns()
+    charts_dir = ROOT / "charts" / "Random"
+    try:
+        output = generate_random_chart(
+            charts_dir,
+            name="Random",
+            bpm=None,
+            length_seconds=None,
+            seed=seed,
         )
+    except Exception as exc:
+        return json_response({"success": False, "message": f"generate_random exception: {exc}"}, status=500)
+
+    if output is None:
+        return json_response({"success": False, "message": "generate_random failed (None)"}, status=500)
+
+    return json_response(
+        {
+            "success": True,
+            "message": f"generated {output.name} with seed={seed}",
+            "path": str(output),
+            "seed": seed,
+        }
+    )
+
+
+async def _handle_chart_process(request: Request) -> Response:
+    qs = request.qs
+    chart_name = qs.get("name", [None])[0]
+    output_name = qs.get("output", ["ROM.v"])[0]
+    rom_format = qs.get("format", ["inline"])[0]
+    # depth: power-of-two ROM depth or "auto"; bank: per-bank depth for multi-bank output
+    rom_depth = qs.get("depth", [None])[0]
+    bank_depth = qs.get("bank", [None])[0]
+    if not chart_name:
+        return json_response({"success": False, "message": "missing chart name"}, status=400)
+    if bank_depth is not None and not bank_depth.isdigit():
+        return json_response({"success": False, "message": "bank must be an integer"}, status=400)
+    if rom_depth is not None and rom_depth != "auto":
+        # same rule as chart_engine.resolve_rom_depth, checked before a job is queued
+        if not rom_depth.isdigit() or int(rom_depth) < 2 or int(rom_depth) & (int(rom_depth) - 1):
+            return json_response({"success": False, "message": "depth must be 'auto' or a power of two"}, status=400)
+        rom_depth = str(int(rom_depth))
+
+    job, coalesced = JOBS.submit(
+        "chart_engine",
+        f"{chart_name}->{output_name}:{rom_format}:{rom_depth or ''}:{bank_depth or ''}",
+        {
+            "name": chart_name,
+            "output": output_name,
+            "format": rom_format,
+            "depth": rom_depth,
+            "bank": int(bank_depth) if bank_depth is not None else None,
+        },
+        CHART_ENGINE_WORKER,
+    )
+    return await _respond_job(job, coalesced, _query_flag(qs, "wait"))
+
+
+def _query_seconds(qs, key: str):
+    """Parse a non-negative seconds value from the query string; None when absent."""
+    value = qs.get(key, [None])[0]
+    if value is None:
+        return None
+    seconds = float(value)
+    if not seconds >= 0:
+        raise ValueError(f"{key} must be a non-negative number")
+    return seconds
+
+
+def _music_sync_controller():
+    """Return ``(controller, None)`` or ``(None, error_response)`` when the player cannot be loaded."""
+    try:
+        return _load_music_sync(), None
+    except Exception as exc:
+        return None, json_response({"success": False, "message": f"music_sync unavailable: {exc}"}, status=500)
+
 
-    def _handle_music_sync(self, parsed):
-        if not MUSIC_SYNC_SCRIPT.exists():
-            self._respond_json({"success": False, "message": f"{MUSIC_SYNC_SCRIPT.name} not found"}, status=500)
-            return
-        qs = urllib.parse.parse_qs(parsed.query)
-        chart_name = qs.get("name", [None])[0]
-        if not chart_name:
-            self._respond_json({"success": False, "message": "missing chart name"}, status=400)
-            return
-        ok, msg = launch_music_sync(chart_name)
-        status = 200 if ok else 500
-        self._respond_json({"success": ok, "message": msg}, status=status)
-
-    def _handle_music_sync_stop(self):
-        stopped, msg = stop_music_sync()
-        status = 200 if stopped else 500
-        self._respond_json({"success": stopped, "message": msg}, status=status)
-
-
-def run_chart_analysis_script():
-    python_exe = sys.executable or "python"
-    cmd = [python_exe, str(CHART_ANALYSIS_SCRIPT)]
-    try:
-        print(f"[server] running: {' '.join(cmd)}")
-        proc = subprocess.run(cmd, cwd=str(ROOT), capture_output=True, text=True)
+def _handle_music_sync(request: Request) -> Response:
+    qs = request.qs
+    chart_name = qs.get("name", [None])[0]
+    if not chart_name:
+        return json_response({"success": False, "message": "missing chart name"}, status=400)
+    try:
+        position = _query_seconds(qs, "position") or 0.0
+    except ValueError as exc:
+        return json_response({"success": False, "message": str(exc)}, status=400)
+    # validate through the cache so a bad name fails here instead of in the player
+    chart, summary, _ = CHART_CACHE.get(chart_name)
+    if chart is None:
+        return _chart_missing_response(chart_name)
+    controller, error = _music_sync_controller()
+    if error is not None:
+        return error
+    arm = _query_flag(qs, "arm")
+    try:
+        status = controller.play(chart_name, position=position, arm=arm)
     except Exception as exc:
-        print(f"[server] failed to spawn chart_analysis: {exc}")
-        return False, f"failed to spawn chart_analysis: {exc}"
-    output = (proc.stdout or proc.stderr or "").strip()
-    message = output if output else f"chart_analysis exited with {proc.returncode}"
-    print(f"[server] chart_analysis finished rc={proc.returncode}")
-    return proc.returncode == 0, message
+        return json_response({"success": False, "message": f"music_sync play failed: {exc}"}, status=500)
+    message = f"{chart_name} armed, press space to start" if arm else f"playing {chart_name}"
+    return json_response({"success": True, "message": message, "summary": summary, "player": status})
+
+
+def _handle_music_sync_seek(request: Request) -> Response:
+    try:
+        position = _query_seconds(request.qs, "position")
+    except ValueError as exc:
+        return json_response({"success": False, "message": str(exc)}, status=400)
+    if position is None:
+        return json_response({"success": False, "message": "missing position"}, status=400)
+    controller, error = _music_sync_controller()
+    if error is not None:
+        return error
+    try:
+        status = controller.seek(position)
+    except RuntimeError as exc:
+        return json_response({"success": False, "message": str(exc)}, status=409)
+    except ValueError as exc:
+        return json_response({"success": False, "message": str(exc)}, status=400)
+    return json_response({"success": True, "message": f"seeked to {position:.3f}s", "player": status})
+
 
+def _handle_music_sync_stop(request: Request) -> Response:
+    controller, error = _music_sync_controller()
+    if error is not None:
+        return error
+    stopped = controller.stop()
+    message = "stopped music_sync" if stopped else "music_sync not playing"
+    return json_response({"success": True, "message": message, "player": controller.status()})
 
-def stop_music_sync():
-    """Stop existing music_sync process if running."""
-    global MUSIC_SYNC_PROC
+
+def _handle_music_sync_status(request: Request) -> Response:
     with MUSIC_SYNC_LOCK:
-        proc = MUSIC_SYNC_PROC
-        MUSIC_SYNC_PROC = None
-    if proc is None:
-        return True, "no music_sync process"
-    if proc.poll() is None:
+        controller = _MUSIC_SYNC
+    status = controller.status() if controller is not None else {"state": "unloaded"}
+    return json_response({"success": True, "player": status})
+
+
+GET_ROUTES = {
+    "/events": _handle_events,
+    "/charts/cache": _handle_chart_cache,
+    "/charts/summary": _handle_chart_summary,
+    "/music_sync/status": _handle_music_sync_status,
+}
+POST_ROUTES = {
+    "/quartus/open": _handle_open_quartus,
+    "/chart_engine/process": _handle_chart_process,
+    "/chart_engine/generate_random": _handle_generate_random,
+    "/chart_analysis/run": _handle_chart_analysis_run,
+    "/music_sync/play": _handle_music_sync,
+    "/music_sync/stop": _handle_music_sync_stop,
+    "/music_sync/seek": _handle_music_sync_seek,
+    "/charts/cache/clear": _handle_chart_cache_clear,
+}
+
+
+# ---- static files under ROOT ----
+_ARCHIVE_TYPES = {".gz": "application/gzip", ".Z": "application/octet-stream",
+                  ".bz2": "application/x-bzip2", ".xz": "application/x-xz"}
+
+
+def _translate_path(url_path: str) -> str:
+    """Map a URL path onto ROOT, dropping '.', '..' and drive components (as SimpleHTTPRequestHandler does)."""
+    path = urllib.parse.unquote(url_path, errors="surrogatepass")
+    trailing_slash = path.rstrip().endswith("/")
+    words = [word for word in posixpath.normpath(path).split("/") if word]
+    result = str(ROOT)
+    for word in words:
+        if os.path.dirname(word) or word in (os.curdir, os.pardir):
+            continue
+        result = os.path.join(result, word)
+    return result + "/" if trailing_slash else result
+
+
+def _guess_type(path: str) -> str:
+    ext = os.path.splitext(path)[1]
+    if ext in _ARCHIVE_TYPES:
+        return _ARCHIVE_TYPES[ext]
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def _list_directory(path: str, url_path: str) -> Response:
+    try:
+        names = sorted(os.listdir(path), key=str.lower)
+    except OSError:
+        return error_response(404, "No permission to list directory")
+    title = html.escape(urllib.parse.unquote(url_path, errors="surrogatepass"))
+    items = []
+    for name in names:
+        link = name + ("/" if os.path.isdir(os.path.join(path, name)) else "")
+        items.append(f'<li><a href="{urllib.parse.quote(link, errors="surrogatepass")}">{html.escape(link)}</a></li>')
+    page = (f"<!DOCTYPE HTML><html><head><meta charset=\"utf-8\"><title>Directory listing for {title}</title></head>"
+            f"<body><h1>Directory listing for {title}</h1><hr><ul>{''.join(items)}</ul><hr></body></html>")
+    return Response(200, [("Content-Type", "text/html; charset=utf-8")], page.encode("utf-8", "surrogateescape"))
+
+
+def _serve_static(request: Request) -> Response:
+    path = _translate_path(request.path)
+    if os.path.isdir(path):
+        if not request.path.endswith("/"):
+            location = request.path + "/" + (f"?{request.query}" if request.query else "")
+            return Response(301, [("Location", location)])
+        for index in ("index.html", "index.htm"):
+            if os.path.isfile(os.path.join(path, index)):
+                path = os.path.join(path, index)
+                break
+        else:
+            return _list_directory(path, request.path)
+    if path.endswith("/") or not os.path.isfile(path):
+        return error_response(404, "File not found")
+    try:
+        status, headers, body = STATIC_FILES.respond(path, request.query, request.headers, _guess_type(path))
+    except OSError:
+        return error_response(404, "File not found")
+    return Response(status, headers, body)
+
+
+class StaticFiles:
+    """Conditional, compressed static responses shared by the HTTP front ends.
+
+    * ETag (mtime + size) and Last-Modified validators; If-None-Match / If-Modified-Since give 304s.
+    * Text types (JSON, JS, CSS, HTML, SVG) are gzipped when the client accepts it: a fresh
+      ``<file>.gz`` next to the file is served as is, otherwise the file is compressed once and kept
+      in a small byte-bounded LRU.
+    * A request carrying ``?v=<hash>`` that matches the file's content hash (the ``versions`` map in
+      chart_analysis' protocol.json) is cached for a year as immutable; everything else is
+      ``no-cache`` so browsers revalidate and get a 304 when nothing changed.
+    """
+
+    COMPRESSIBLE_TYPES = {"application/json", "application/javascript", "text/javascript", "image/svg+xml"}
+    MIN_GZIP_SIZE = 512
+    IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+    REVALIDATE_CACHE = "no-cache"
+
+    def __init__(self, max_gzip_bytes: int = 16 << 20):
+        self._lock = Lock()
+        self._gzip = OrderedDict()  # (path, mtime_ns, size) -> bytes
+        self._gzip_bytes = 0
+        self._max_gzip_bytes = max_gzip_bytes
+        self._hashes = {}  # path -> (mtime_ns, size, hash)
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()[:12]
+
+    def _file_hash(self, path: str, st) -> str:
+        cached = self._hashes.get(path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = self.content_hash(f.read())
+        self._hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def _compressed(self, path: str, st) -> bytes:
+        key = (path, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            data = self._gzip.get(key)
+            if data is not None:
+                self._gzip.move_to_end(key)
+                return data
+        with open(path, "rb") as f:
+            data = gzip.compress(f.read(), compresslevel=6, mtime=0)
+        with self._lock:
+            if key not in self._gzip:
+                self._gzip[key] = data
+                self._gzip_bytes += len(data)
+            while self._gzip_bytes > self._max_gzip_bytes and len(self._gzip) > 1:
+                self._gzip_bytes -= len(self._gzip.popitem(last=False)[1])
+        return data
+
+    @staticmethod
+    def _not_modified(headers, etag: str, mtime: float) -> bool:
+        if_none_match = headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+        if_modified_since = headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            return int(mtime) <= since
+        return False
+
+    def respond(self, path: str, query: str, headers, content_type: str):
+        """Return ``(status, response headers, body)`` for a regular file; body is None for 304,
+        a file object for identity responses and a BytesIO for gzip."""
+        st = os.stat(path)
+        version = urllib.parse.parse_qs(query).get("v", [None])[0]
+        cache_control = self.REVALIDATE_CACHE
+        if version and version == self._file_hash(path, st):
+            cache_control = self.IMMUTABLE_CACHE
+
+        base_type = content_type.split(";")[0].strip()
+        compressible = (base_type.startswith("text/") or base_type in self.COMPRESSIBLE_TYPES)
+        use_gzip = (compressible and st.st_size >= self.MIN_GZIP_SIZE
+                    and "gzip" in headers.get("Accept-Encoding", "").lower())
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}{"-gz" if use_gzip else ""}"'
+        response_headers = [
+            ("ETag", etag),
+            ("Last-Modified", email.utils.formatdate(st.st_mtime, usegmt=True)),
+            ("Cache-Control", cache_control),
+        ]
+        if compressible:
+            response_headers.append(("Vary", "Accept-Encoding"))
+        if self._not_modified(headers, etag, st.st_mtime):
+            return 304, response_headers, None
+
+        response_headers.append(("Content-Type", content_type))
+        if use_gzip:
+            precompressed = path + ".gz"
+            try:
+                fresh = os.stat(precompressed).st_mtime_ns >= st.st_mtime_ns
+            except OSError:
+                fresh = False
+            if fresh:
+                body = open(precompressed, "rb")
+                length = os.fstat(body.fileno()).st_size
+            else:
+                data = self._compressed(path, st)
+                body, length = io.BytesIO(data), len(data)
+            response_headers += [("Content-Encoding", "gzip"), ("Content-Length", str(length))]
+            return 200, response_headers, body
+        response_headers.append(("Content-Length", str(st.st_size)))
+        return 200, response_headers, open(path, "rb")
+
+
+STATIC_FILES = StaticFiles()
+# some Windows registries map .js to text/plain, which browsers refuse for module scripts
+mimetypes.add_type("application/javascript", ".js")
+
+
+def _query_flag(qs, name: str) -> bool:
+    return qs.get(name, ["0"])[0].lower() in {"1", "true", "yes"}
+
+
+class EventHub:
+    """Fan-out of server events to SSE subscribers, with a short replay buffer for reconnects."""
+
+    def __init__(self, history: int = 200, subscriber_queue: int = 1000):
+        self._lock = Lock()
+        self._next_id = 1
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._subscriber_queue = subscriber_queue
+
+    def publish(self, event: str, data: dict):
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            payload = json.dumps({"event": event, "time": time.time(), **data}, ensure_ascii=False)
+            message = f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+            self._history.append((event_id, message))
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.offer(message)
+
+    def subscribe(self, loop, last_event_id=None, on_overflow=None):
+        """Return ``(subscriber, backlog)``; backlog holds buffered events newer than ``last_event_id``."""
+        subscriber = EventSubscriber(self, loop, self._subscriber_queue, on_overflow)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            backlog = [] if last_event_id is None else [m for i, m in self._history if i > last_event_id]
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+
+class EventSubscriber:
+    """One SSE client: an asyncio.Queue on the server loop, fed from any thread via ``offer``."""
+
+    def __init__(self, hub: EventHub, loop, maxsize: int, on_overflow=None):
+        self.hub = hub
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.on_overflow = on_overflow
+
+    def offer(self, message: str):
         try:
-            proc.terminate()
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:  # loop already closed
+            self.hub.unsubscribe(self)
+
+    def _put(self, message: str):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:  # stalled client: drop it, the browser will reconnect
+            self.hub.unsubscribe(self)
+            if self.on_overflow is not None:
+                self.on_overflow()
+
+
+EVENTS = EventHub()
+EVENT_KEEPALIVE_SECONDS = 15
+_JOB_PROGRESS_EVENTS = {
+    ("chart_analysis", "chart"): "chart_analyzed",
+    ("chart_analysis", "protocol"): "protocol_updated",
+    ("chart_engine", "rom_written"): "rom_written",
+}
+
+
+class Job:
+    """A long-running operation (chart analysis, ROM generation) tracked under an id."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, kind: str, key: str, params: dict):
+        self.id = str(next(self._ids))
+        self.kind = kind
+        self.key = key
+        self.params = params
+        self.status = "queued"
+        self.progress = []
+        self.success = False
+        self.message = ""
+        self.result = None
+        self.requests = 1
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._done = Event()
+        self._lock = Lock()
+        self._callbacks = []
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def report(self, event: str, data: dict):
+        self.progress.append({"event": event, **data})
+        print(f"[server] {self.kind} job {self.id}: {event} {data}")
+        EVENTS.publish(_JOB_PROGRESS_EVENTS.get((self.kind, event), f"{self.kind}_{event}"), {"job_id": self.id, **data})
+
+    def start(self):
+        self.status = "running"
+        self.started_at = time.time()
+        self._publish()
+
+    def _publish(self):
+        EVENTS.publish("job", {key: value for key, value in self.to_dict().items() if key != "progress"})
+
+    def finish(self, success: bool, message: str, result=None):
+        self.success = success
+        self.message = message
+        self.result = result
+        self.finished_at = time.time()
+        self.status = "done" if success else "failed"
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+        self._publish()
+
+    def wait(self, timeout=None) -> bool:
+        return self._done.wait(timeout)
+
+    async def wait_async(self):
+        """Wait on the server loop without tying up a thread; woken from the worker thread by ``finish``."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._callbacks.append(wake)
+        await future
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "success": self.success,
+            "message": self.message,
+            "result": self.result,
+            "progress": list(self.progress),
+            "requests": self.requests,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobWorker:
+    """Long-lived thread that runs queued jobs one at a time with ``runner(job) -> (success, message, result)``.
+
+    ``warmup`` runs once on the worker thread before the first job, e.g. to import chart_analysis
+    (numpy/matplotlib) ahead of the first request.
+    """
+
+    def __init__(self, name: str, runner, warmup=None):
+        self.name = name
+        self._runner = runner
+        self._warmup = warmup
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def put(self, job: Job):
+        self.start()
+        self._queue.put(job)
+
+    def _run(self):
+        if self._warmup is not None:
+            try:
+                self._warmup()
+            except Exception as exc:
+                print(f"[server] {self.name} warmup failed: {exc}")
+        while True:
+            job = self._queue.get()
+            job.start()
             try:
-                proc.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                proc.kill()
-            return True, "stopped previous music_sync"
-        except Exception as exc:
-            return False, f"failed to stop music_sync: {exc}"
-    return True, "music_sync already exited"
-
-
-def launch_music_sync(chart_name: str):
-    """Launch player.py, stopping any previous instance."""
-    stop_music_sync()
-    python_exe = sys.executable or "python"
-    cmd = [python_exe, str(MUSIC_SYNC_SCRIPT), chart_name]
-    try:
-        proc = subprocess.Popen(cmd, cwd=str(ROOT))
-        with MUSIC_SYNC_LOCK:
-            global MUSIC_SYNC_PROC
-            MUSIC_SYNC_PROC = proc
-        return True, f"player started for {chart_name}"
+                success, message, result = self._runner(job)
+            except Exception as exc:
+                print(f"[server] {job.kind} job {job.id} failed: {exc}")
+                success, message, result = False, f"{job.kind} exception: {exc}", None
+            job.finish(success, message, result)
+
+
+class JobRegistry:
+    """Job lookup by id, with duplicate requests coalesced onto a queued job for the same key.
+
+    A job that is already running never absorbs new requests: it may have read its inputs already,
+    so a request arriving after it started gets one follow-up job, which later duplicates join.
+    """
+
+    def __init__(self, max_finished: int = 200):
+        self._lock = Lock()
+        self._jobs = {}
+        self._max_finished = max_finished
+
+    def submit(self, kind: str, key: str, params: dict, worker: JobWorker, absorb_keys=()):
+        """Return ``(job, coalesced)``. ``absorb_keys`` name broader queued jobs that also cover this one."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.kind != kind or job.status != "queued":
+                    continue
+                if job.key == key or job.key in absorb_keys:
+                    job.requests += 1
+                    return job, True
+            job = Job(kind, key, params)
+            self._jobs[job.id] = job
+            self._prune()
+        worker.put(job)
+        return job, False
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - self._max_finished)]:
+            del self._jobs[job_id]
+
+
+class ChartCache:
+    """Process-wide LRU of validated charts and their summaries, keyed by chart path and mtime.
+
+    Entries are bounded by count and by column bytes. A chart whose file has a newer mtime
+    is reloaded. Columns are copied off the .chartbin mmap, so a cached chart never pins a file
+    that a generator or ``load_chart`` later replaces.
+    """
+
+    def __init__(self, max_entries: int = 32, max_bytes: int = 64 << 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        self._entries = OrderedDict()  # path -> (mtime_ns, chart, summary, nbytes)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def chart_path(chart_name: str) -> Path:
+        return ROOT / "charts" / chart_name / f"{chart_name}.txt"
+
+    def get(self, chart_name: str):
+        """Return ``(chart, summary, hit)``; chart is None when the file is missing or fails chart_check."""
+        path = self.chart_path(chart_name)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            return None, None, False
+        key = str(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2], True
+            self.misses += 1
+            if entry is not None:
+                self._drop(key)
+                self.invalidations += 1
+
+        chart, summary = self._load(chart_name, path)
+        if chart is None:
+            return None, None, False
+        nbytes = 6 * len(chart)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (mtime, chart, summary, nbytes)
+            self._bytes += nbytes
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return chart, summary, False
+
+    @staticmethod
+    def _load(chart_name: str, path: Path):
+        from array import array
+
+        from chart_engine.chart_engine import Chart, load_checked_chart, summarize_chart
+
+        chart = load_checked_chart(chart_name, path, tag="chart_cache")
+        if chart is None:
+            return None, None
+        chart = Chart(chart.bpm, array("i", chart.times), array("B", chart.types), array("B", chart.tracks), path=path)
+        return chart, summarize_chart(chart)
+
+    def _drop(self, key: str):
+        self._bytes -= self._entries.pop(key)[3]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "charts": [
+                    {"path": os.path.relpath(key, ROOT), "mtime_ns": mtime, "bytes": nbytes, "notes": summary["notes"]}
+                    for key, (mtime, _, summary, nbytes) in reversed(self._entries.items())
+                ],
+            }
+
+
+CHART_CACHE = ChartCache()
+_CHART_ANALYSIS = None
+
+
+def _load_chart_analysis():
+    """Import chart_analysis once; later jobs reuse the warm module."""
+    global _CHART_ANALYSIS
+    if _CHART_ANALYSIS is None:
+        started = time.monotonic()
+        _CHART_ANALYSIS = importlib.import_module("chart_analysis.chart_analysis")
+        print(f"[server] chart_analysis loaded in {time.monotonic() - started:.2f}s")
+    return _CHART_ANALYSIS
+
+
+def _run_chart_analysis_job(job: Job):
+    module = _load_chart_analysis()
+    chart_name = job.params.get("name")
+    success_count, total = module.run_analysis(
+        force=job.params.get("force", False),
+        only=[chart_name] if chart_name else None,
+        progress=job.report,
+        jobs=ANALYSIS_PROCESSES,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    if chart_name and total == 0:
+        return False, f"chart {chart_name} not found", None
+    return (
+        True,
+        f"chart_analysis finished: {success_count}/{total} charts succeeded",
+        {"succeeded": success_count, "total": total},
+    )
+
+
+def _run_chart_engine_job(job: Job):
+    from chart_engine.chart_engine import ROM_BANK_DEPTH, process_chart
+
+    chart_name = job.params["name"]
+    output_name = job.params["output"]
+    chart, _, _ = CHART_CACHE.get(chart_name)
+    if chart is None:
+        return False, f"chart {chart_name} not found or failed chart_check", None
+    if not process_chart(
+        chart_name,
+        output_filename=output_name,
+        rom_format=job.params.get("format", "inline"),
+        rom_depth=job.params.get("depth"),
+        bank_depth=job.params.get("bank") or ROM_BANK_DEPTH,
+        chart=chart,
+    ):
+        return False, f"process_chart failed for {chart_name}", None
+    job.report("rom_written", {"name": chart_name, "output": f"verilog/{output_name}"})
+    return True, f"processed {chart_name} -> verilog/{output_name}", {"output": f"verilog/{output_name}"}
+
+
+JOBS = JobRegistry()
+# Analysis jobs run one at a time because each run rewrites manifest.json and protocol.json.
+# Within a run, charts are analysed in parallel in a spawn-based process pool: pyplot is not
+# thread-safe, and forking this multi-threaded server could copy held locks into the children.
+ANALYSIS_PROCESSES = min(4, os.cpu_count() or 1)
+ANALYSIS_WORKER = JobWorker("chart-analysis-worker", _run_chart_analysis_job, warmup=_load_chart_analysis)
+# process_chart rewrites the shared verilog/MuseDash.v, so ROM jobs are serialized on their own thread.
+CHART_ENGINE_WORKER = JobWorker("chart-engine-worker", _run_chart_engine_job)
+
+
+_MUSIC_SYNC = None
+
+
+def _publish_player_event(event: str, data: dict):
+    """Forward PlaybackController events as player_* / timeline SSE events."""
+    EVENTS.publish("timeline" if event == "beat" else f"player_{event}", data)
+
+
+def _load_music_sync():
+    """Import music_sync.player once and keep one PlaybackController with a warm mixer."""
+    global _MUSIC_SYNC
+    with MUSIC_SYNC_LOCK:
+        if _MUSIC_SYNC is None:
+            started = time.monotonic()
+            # SDL would otherwise install its own SIGINT/SIGTERM handlers and the server could not be stopped
+            os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+            module = importlib.import_module("music_sync.player")
+            controller = module.PlaybackController(on_event=_publish_player_event)
+            controller.warmup()
+            _MUSIC_SYNC = controller
+            print(f"[server] music_sync loaded in {time.monotonic() - started:.2f}s")
+        return _MUSIC_SYNC
+
+
+def _warm_music_sync():
+    try:
+        _load_music_sync()
     except Exception as exc:
-        return False, f"launch player failed: {exc}"
+        print(f"[server] music_sync warm-up failed: {exc}")
 
 
-def run_server(host: str, port: int):
-    handler_cls = partial(FrontendHandler, directory=str(ROOT))
-    httpd = ThreadingHTTPServer((host, port), handler_cls)
+# ---- asyncio HTTP/1.1 core ----
+MAX_REQUEST_HEAD = 64 * 1024
+MAX_REQUEST_BODY = 1024 * 1024
+KEEPALIVE_TIMEOUT = 30
+SERVER_NAME = "MuseDashDev/1.0"
+# sync endpoint handlers (subprocess launches, chart parsing, file stats/gzip) run here, off the event loop
+BLOCKING_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="server-blocking")
+
+
+async def _dispatch(request: Request) -> Response:
+    if request.method == "GET":
+        handler = GET_ROUTES.get(request.path)
+        if handler is None and (request.path == "/jobs" or request.path.startswith("/jobs/")):
+            handler = _handle_jobs
+        handler = handler or _serve_static
+    elif request.method == "HEAD":
+        handler = _serve_static
+    elif request.method == "POST":
+        handler = POST_ROUTES.get(request.path)
+        if handler is None:
+            return error_response(404, "Unknown POST endpoint")
+    else:
+        return error_response(501, f"Unsupported method ({request.method!r})")
+
+    if inspect.iscoroutinefunction(handler):
+        return await handler(request)
+    return await asyncio.get_running_loop().run_in_executor(BLOCKING_EXECUTOR, handler, request)
+
+
+def _wants_keepalive(request: Request) -> bool:
+    connection = request.headers.get("Connection", "").lower()
+    if request.version == "HTTP/1.1":
+        return connection != "close"
+    return connection == "keep-alive"
+
+
+async def _write_response(writer, request: Request, response: Response, keep_alive: bool):
+    status = HTTPStatus(response.status)
+    headers = response.headers
+    names = {name.lower() for name, _ in headers}
+    body = response.body
+    if response.stream is None and "content-length" not in names:
+        if isinstance(body, (bytes, bytearray)):
+            headers.append(("Content-Length", str(len(body))))
+        elif body is None:
+            headers.append(("Content-Length", "0"))
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}",
+             f"Server: {SERVER_NAME}",
+             f"Date: {email.utils.formatdate(usegmt=True)}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    lines.extend(f"{name}: {value}" for name, value in headers)
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1", "strict"))
+
+    try:
+        if response.stream is not None:
+            await writer.drain()
+            await response.stream(writer)
+        elif request.method == "HEAD" or status.value == 304 or body is None:
+            pass
+        elif isinstance(body, (bytes, bytearray)):
+            writer.write(body)
+        elif isinstance(body, io.BytesIO):
+            writer.write(body.getbuffer())
+        else:
+            await writer.drain()
+            await asyncio.get_running_loop().sendfile(writer.transport, body)
+        await writer.drain()
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+
+
+def _log_request(request: Request, status: int):
+    sys.stderr.write(
+        f"{request.client} - - [{time.strftime('%d/%b/%Y %H:%M:%S')}] "
+        f"\"{request.method} {request.target} {request.version}\" {status} -\n"
+    )
+
+
+async def _read_request(reader, client):
+    """Read one request; returns None on a clean close, or an int status for a malformed request."""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+    except asyncio.IncompleteReadError as exc:
+        return None if not exc.partial.strip() else 400
+    except asyncio.LimitOverrunError:
+        return 431
+    except (asyncio.TimeoutError, ConnectionError):
+        return None
+
+    request_line, _, header_block = head.partition(b"\r\n")
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+        if not version.startswith("HTTP/1."):
+            return 505
+        headers = http.client.parse_headers(io.BytesIO(header_block))
+    except (ValueError, http.client.HTTPException):
+        return 400
+    request = Request(method.upper(), target, version, headers, client)
+
+    if "Transfer-Encoding" in headers:
+        return 411
+    length = headers.get("Content-Length", "0")
+    if not length.isdigit():
+        return 400
+    if int(length) > MAX_REQUEST_BODY:
+        return 413
+    if int(length):
+        request.body = await reader.readexactly(int(length))
+    return request
+
+
+async def _handle_connection(reader, writer):
+    peer = writer.get_extra_info("peername")
+    client = peer[0] if isinstance(peer, tuple) else str(peer)
+    try:
+        while True:
+            request = await _read_request(reader, client)
+            if request is None:
+                break
+            if isinstance(request, int):
+                writer.write(f"HTTP/1.1 {request} {HTTPStatus(request).phrase}\r\n"
+                             f"Connection: close\r\nContent-Length: 0\r\n\r\n".encode("latin-1"))
+                await writer.drain()
+                break
+
+            try:
+                response = await _dispatch(request)
+            except Exception as exc:
+                print(f"[server] {request.method} {request.path} failed: {exc!r}")
+                response = json_response({"success": False, "message": f"internal error: {exc}"}, status=500)
+            keep_alive = response.stream is None and _wants_keepalive(request)
+            _log_request(request, response.status)
+            await _write_response(writer, request, response, keep_alive)
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+async def _serve(host: str, port: int):
+    server = await asyncio.start_server(_handle_connection, host, port, limit=MAX_REQUEST_HEAD, backlog=256)
     print(f"Serving {ROOT} on http://{host}:{port}")
-    httpd.serve_forever()
+    async with server:
+        await server.serve_forever()
+
+
+def run_server(host: str, port: int):
+    ANALYSIS_WORKER.start()
+    CHART_ENGINE_WORKER.start()
+    Thread(target=_warm_music_sync, name="music-sync-warmup", daemon=True).start()
+    try:
+        asyncio.run(_serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        BLOCKING_EXECUTOR.shutdown(wait=False)
 
 
 def main():
@@ -0,0 +1,175 @@
+`timescale 1ns/1ps
+
+// 回归测试平台：ROM 与按键轨迹均由 $readmemh 运行时读入，一次编译可反复运行
+//   +rom=<ROM .mem>  +presses=<按键 .hex>  +ticks=<tick 数>
+// presses 每行一个 tick：低 SLOTS 位为 notedown 各时隙，高 SLOTS 位为 noteup，1 = 按下
+// 结束时打印 RESULT 行（总分为 BCD，各轨为 PERFECT/GOOD/MISS/NO_NOTE 计数）
+module Regression_tb #(
+    parameter DIV_CNT = 8,
+    parameter SLOTS = 4,
+    parameter ADDR_WIDTH = 12
+) ();
+
+`define PUSHED 1'b0
+`define NOT_PUSHED 1'b1
+
+localparam DEPTH = 1 << ADDR_WIDTH;
+localparam MAX_TICKS = DEPTH + 64;
+localparam SLOT_LEN = 2 * DIV_CNT / SLOTS;
+
+reg                 clk;
+reg                 rst_n;
+reg                 clickup;
+reg                 clickdown;
+
+reg [3:0]           rom [0:DEPTH-1];
+reg [2*SLOTS-1:0]   presses [0:MAX_TICKS-1];
+reg [8*512-1:0]     rom_file;
+reg [8*512-1:0]     press_file;
+
+wire                clk_div;
+wire [ADDR_WIDTH-1:0] rom_addr;
+wire [3:0]          rom_word = rom[rom_addr];
+wire [15:0]         queue_noteup_bit0;
+wire [15:0]         queue_noteup_bit1;
+wire [15:0]         queue_notedown_bit0;
+wire [15:0]         queue_notedown_bit1;
+wire [1:0]          resultup;
+wire [1:0]          resultdown;
+wire                accum_now;
+wire [15:0]         cur_score;
+wire [15:0]         total_score;
+
+integer             ticks;
+integer             total_cycles;
+integer             cycles;
+integer             offset;
+integer             tick;
+integer             slot;
+integer             counts [0:7];
+integer             idx;
+reg                 accum_now_delay;
+
+Clk_Div #(
+    .div_cnt(DIV_CNT)
+) clock_divider (
+    .clk (clk),
+    .rst_n (rst_n),
+
+    .clk_div (clk_div)
+);
+
+Address_Generator #(
+    .ADDR_WIDTH(ADDR_WIDTH)
+) addr_gen (
+    .clk_div (clk_div),
+    .rst_n (rst_n),
+
+    .address (rom_addr)
+);
+
+Queue note_queue(
+    .clk_div (clk_div),
+    .noteup (rom_word[3:2]),
+    .notedown (rom_word[1:0]),
+    .rst_n (rst_n),
+
+    .noteup_bit0 (queue_noteup_bit0),
+    .noteup_bit1 (queue_noteup_bit1),
+    .notedown_bit0 (queue_notedown_bit0),
+    .notedown_bit1 (queue_notedown_bit1)
+);
+
+Judgement u_Judgement(
+    .clk (clk),
+    .clk_div (clk_div),
+    .rst_n (rst_n),
+    .clickup (clickup),
+    .clickdown (clickdown),
+    .left_noteup ({queue_noteup_bit1[0], queue_noteup_bit0[0]}),
+    .left_notedown ({queue_notedown_bit1[0], queue_notedown_bit0[0]}),
+    .right_noteup ({queue_noteup_bit1[1], queue_noteup_bit0[1]}),
+    .right_notedown ({queue_notedown_bit1[1], queue_notedown_bit0[1]}),
+
+    .resultup (resultup),
+    .resultdown (resultdown),
+    .accum_now (accum_now)
+);
+
+ScoreConversion u_ScoreConversion (
+    .judgement_up (resultup),
+    .judgement_down (resultdown),
+
+    .score (cur_score)
+);
+
+Accumulator u_Accumulator(
+    .clk (clk),
+    .rst_n (rst_n),
+    .accum_now (accum_now),
+    .score (cur_score),
+
+    .score_accum (total_score)
+);
+
+always #5 clk = ~clk;
+
+initial begin
+    clk = 1;
+    rst_n = 0;
+    clickup = `NOT_PUSHED;
+    clickdown = `NOT_PUSHED;
+    cycles = 0;
+    accum_now_delay = 1'b0;
+    for (idx = 0; idx < 8; idx = idx + 1)
+        counts[idx] = 0;
+
+    if (!$value$plusargs("rom=%s", rom_file) || !$value$plusargs("presses=%s", press_file)
+            || !$value$plusargs("ticks=%d", ticks)) begin
+        $display("ERROR usage: +rom=<file> +presses=<file> +ticks=<n>");
+        $finish;
+    end
+    $readmemh(rom_file, rom);
+    $readmemh(press_file, presses);
+    total_cycles = DIV_CNT + 2 * DIV_CNT * ticks;
+
+    // 在下降沿之间释放复位，随后第一个上升沿即模型中的第 0 个 clk 沿
+    #43
+    rst_n = 1;
+
+    wait (cycles == total_cycles);
+    #1
+    $display("RESULT score=%h up=%0d,%0d,%0d,%0d down=%0d,%0d,%0d,%0d", total_score,
+             counts[4], counts[5], counts[6], counts[7], counts[0], counts[1], counts[2], counts[3]);
+    $finish;
+end
+
+// 下降沿给出下一个上升沿采样的按键：第一个 clk_div 上升沿之前保持松开
+always @(negedge clk) begin
+    if (rst_n) begin
+        if (cycles < DIV_CNT) begin
+            clickup = `NOT_PUSHED;
+            clickdown = `NOT_PUSHED;
+        end else begin
+            offset = cycles - DIV_CNT;
+            tick = offset / (2 * DIV_CNT);
+            slot = (offset % (2 * DIV_CNT)) / SLOT_LEN;
+            clickdown = presses[tick][slot] ? `PUSHED : `NOT_PUSHED;
+            clickup = presses[tick][SLOTS + slot] ? `PUSHED : `NOT_PUSHED;
+        end
+    end
+end
+
+// accum_now 每次持续两拍，只在第一拍计入判定次数
+always @(posedge clk) begin
+    if (rst_n) begin
+        if (accum_now && !accum_now_delay) begin
+            counts[{1'b1, resultup}] = counts[{1'b1, resultup}] + 1;
+            counts[{1'b0, resultdown}] = counts[{1'b0, resultdown}] + 1;
+        end
+        accum_now_delay <= accum_now;
+        cycles <= cycles + 1;
+    end
+end
+
+endmodule
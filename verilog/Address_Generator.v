@@ -1,17 +1,19 @@
-module Address_Generator (
+module Address_Generator #(
+    parameter ADDR_WIDTH = 12
+) (
     input clk_div,
     input rst_n,
 
-    output reg [11:0] address
+    output reg [ADDR_WIDTH-1:0] address
 );
 
 always @(posedge clk_div or negedge rst_n) begin
     if(!rst_n) begin
-        address <= 12'd0;
-    end else if(address == 12'd4095) begin
+        address <= {ADDR_WIDTH{1'b0}};
+    end else if(address == {ADDR_WIDTH{1'b1}}) begin
         address <= address;
     end else begin
-        address <= address + 12'd1;
+        address <= address + 1'b1;
     end
 end
     
@@ -1,6 +1,10 @@
 module MuseDash #(
-    parameter div_cnt = 1875000 
+    parameter div_cnt = 1875000, 
     // div_cnt = 50,000,000 / (bpm * 4 / 60) / 2 = 375,000,000 / bpm;
+    parameter addr_width = 12,
+    // ROM 深度 = 2^addr_width，由 chart_engine 按谱面长度写入
+    parameter rom_rle = 0
+    // 1 时 ROM.v 为游程压缩格式，需要 clk/rst_n 驱动 ROM_RLE_Decoder
 ) (
     input           clk,
     input           rst_n,//rst_n要不用开关吧
@@ -59,7 +63,7 @@ wire [1:0] next_noteup;
 wire [1:0] next_notedown;
 wire [15:0] total_score;
 wire [15:0] cur_score;
-wire [11:0] rom_addr;
+wire [addr_width-1:0] rom_addr;
 
 //clk_div
 Clk_Div #(
@@ -72,7 +76,9 @@ Clk_Div #(
 );
 
 //address
-Address_Generator addr_gen(
+Address_Generator #(
+    .ADDR_WIDTH(addr_width)
+) addr_gen (
     .clk_div (clk_div),
     .rst_n (address_rst_n),
 
@@ -187,12 +193,25 @@ Queue note_queue(
 );
 
 //ROM
-ROM chart(
-    .addr (rom_addr),
-    
-    .noteup (rom_noteup),
-    .notedown (rom_notedown)
-);
+generate
+    if(rom_rle) begin : rom_rle_gen
+        ROM chart(
+            .clk (clk),
+            .rst_n (address_rst_n),
+            .addr (rom_addr),
+
+            .noteup (rom_noteup),
+            .notedown (rom_notedown)
+        );
+    end else begin : rom_gen
+        ROM chart(
+            .addr (rom_addr),
+            
+            .noteup (rom_noteup),
+            .notedown (rom_notedown)
+        );
+    end
+endgenerate
 
 // logic
 assign prev_noteup = {queue_noteup_bit1[0],queue_noteup_bit0[0]};
@@ -0,0 +1,44 @@
+module ROM_RLE_Decoder #(
+    parameter ADDR_WIDTH = 12,
+    parameter LEN_WIDTH = 8,
+    parameter INDEX_WIDTH = 10,
+    parameter LAST_INDEX = 0
+    // 游程记录格式 {pattern[3:0], run_len - 1}，pattern 高 2bit 为 noteup，低 2bit 为 notedown
+) (
+    input clk,
+    input rst_n,
+    input [ADDR_WIDTH-1:0] addr,
+    input [LEN_WIDTH+3:0] cur_record,
+    input [LEN_WIDTH+3:0] next_record,
+
+    output reg [INDEX_WIDTH-1:0] index,
+    output reg [1:0] noteup,
+    output reg [1:0] notedown
+);
+
+// 地址由 Address_Generator 在 clk_div 上逐一递增，解码器用快时钟 clk 跟随，每条记录最多落后一拍
+reg [ADDR_WIDTH:0] run_start;
+wire [ADDR_WIDTH:0] run_end = run_start + cur_record[LEN_WIDTH-1:0] + 1'b1;
+wire advance = (index != LAST_INDEX) && (addr >= run_end);
+
+always @(posedge clk or negedge rst_n) begin
+    if(!rst_n) begin
+        index <= 'd0;
+        run_start <= 'd0;
+    end else if(addr < run_start) begin
+        index <= 'd0;
+        run_start <= 'd0;
+    end else if(advance) begin
+        index <= index + 1'b1;
+        run_start <= run_end;
+    end
+end
+
+always @(*) begin
+    if(advance)
+        {noteup, notedown} = next_record[LEN_WIDTH+3:LEN_WIDTH];
+    else
+        {noteup, notedown} = cur_record[LEN_WIDTH+3:LEN_WIDTH];
+end
+
+endmodule